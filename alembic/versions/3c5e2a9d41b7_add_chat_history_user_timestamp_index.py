@@ -0,0 +1,43 @@
+"""add_chat_history_user_timestamp_index
+
+Revision ID: 3c5e2a9d41b7
+Revises: 71660021af76
+Create Date: 2026-10-17 10:12:41.208311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5e2a9d41b7'
+down_revision: Union[str, Sequence[str], None] = '71660021af76'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Backs keyset pagination of /api/chat/history: WHERE user_id = ?
+    # ORDER BY timestamp DESC, id DESC. Built concurrently so chat_history
+    # stays writable while the index is created.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chat_history_user_id_timestamp_id',
+            'chat_history',
+            ['user_id', sa.text('timestamp DESC'), sa.text('id DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_chat_history_user_id_timestamp_id',
+            table_name='chat_history',
+            postgresql_concurrently=True,
+        )
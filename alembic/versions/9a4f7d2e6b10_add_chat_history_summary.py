@@ -0,0 +1,28 @@
+"""add_chat_history_summary
+
+Revision ID: 9a4f7d2e6b10
+Revises: 3c5e2a9d41b7
+Create Date: 2026-10-17 11:03:27.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f7d2e6b10'
+down_revision: Union[str, Sequence[str], None] = '3c5e2a9d41b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_history', sa.Column('summary', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_history', 'summary')
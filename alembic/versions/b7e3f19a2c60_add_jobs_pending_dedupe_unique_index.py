@@ -0,0 +1,41 @@
+"""add_jobs_pending_dedupe_unique_index
+
+Revision ID: b7e3f19a2c60
+Revises: 5d2c8e0f7a94
+Create Date: 2026-10-17 18:20:11.503214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3f19a2c60'
+down_revision: Union[str, Sequence[str], None] = '5d2c8e0f7a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PENDING = sa.text("status IN ('queued', 'running')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Duplicates queued before the index existed: keep the oldest of each key
+    op.execute(
+        "UPDATE jobs SET status = 'failed', error = 'duplicate of an earlier pending job', "
+        "finished_at = CURRENT_TIMESTAMP, locked_by = NULL, locked_at = NULL "
+        "WHERE status IN ('queued', 'running') AND dedupe_key IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM jobs WHERE status IN ('queued', 'running') AND dedupe_key IS NOT NULL "
+        "GROUP BY dedupe_key)"
+    )
+    op.create_index(
+        'uq_jobs_pending_dedupe_key', 'jobs', ['dedupe_key'], unique=True,
+        postgresql_where=PENDING, sqlite_where=PENDING,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_jobs_pending_dedupe_key', table_name='jobs')
@@ -0,0 +1,30 @@
+"""add_feed_http_validators
+
+Revision ID: c81d3f5a7e22
+Revises: 9a4f7d2e6b10
+Create Date: 2026-10-17 12:41:09.318467
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d3f5a7e22'
+down_revision: Union[str, Sequence[str], None] = '9a4f7d2e6b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('feeds', sa.Column('etag', sa.String(), nullable=True))
+    op.add_column('feeds', sa.Column('last_modified', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('feeds', 'last_modified')
+    op.drop_column('feeds', 'etag')
@@ -0,0 +1,34 @@
+"""add_index_versions_table
+
+Revision ID: d2f6a8c41e95
+Revises: b7e3f19a2c60
+Create Date: 2026-10-17 19:05:37.218640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6a8c41e95'
+down_revision: Union[str, Sequence[str], None] = 'b7e3f19a2c60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    index_versions = op.create_table('index_versions',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(index_versions, [{'name': 'articles', 'version': 0}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('index_versions')
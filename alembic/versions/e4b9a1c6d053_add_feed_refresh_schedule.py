@@ -0,0 +1,32 @@
+"""add_feed_refresh_schedule
+
+Revision ID: e4b9a1c6d053
+Revises: c81d3f5a7e22
+Create Date: 2026-10-17 13:20:52.074193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9a1c6d053'
+down_revision: Union[str, Sequence[str], None] = 'c81d3f5a7e22'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('feeds', sa.Column('refresh_interval_seconds', sa.Integer(), nullable=True))
+    op.add_column('feeds', sa.Column('next_fetch_at', sa.DateTime(), nullable=True))
+    op.add_column('feeds', sa.Column('consecutive_failures', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('feeds', 'consecutive_failures')
+    op.drop_column('feeds', 'next_fetch_at')
+    op.drop_column('feeds', 'refresh_interval_seconds')
@@ -1,23 +1,37 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+import math
 import structlog
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.db.models import User
+from app.services.principal_cache import UserPrincipal, get_principal_cache
+from app.services.admission import get_rate_limiter
 
 logger = structlog.get_logger("auth")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> UserPrincipal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    # Tokens verified recently resolve without the JWT check or a DB round trip
+    cache = get_principal_cache() if settings.AUTH_CACHE_ENABLED else None
+    if cache is not None:
+        principal = cache.get(token)
+        if principal is not None:
+            return principal
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         
@@ -33,10 +47,28 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         logger.warning("auth_token_invalid", error=str(exc))
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    row = (await db.execute(select(User.id, User.email).where(User.email == email))).first()
+    if row is None:
         logger.warning("auth_user_not_found", email=email)
         raise credentials_exception
     
-    logger.debug("auth_user_verified", user_id=user.id)
-    return user
\ No newline at end of file
+    principal = UserPrincipal(id=row.id, email=row.email)
+    if cache is not None:
+        cache.put(token, principal, payload.get("exp"))
+    logger.debug("auth_user_verified", user_id=principal.id)
+    return principal
+
+async def get_rate_limited_user(current_user: UserPrincipal = Depends(get_current_user)) -> UserPrincipal:
+    """
+    get_current_user plus the per-user token bucket, for endpoints that start LLM work.
+    """
+    if settings.RATE_LIMIT_ENABLED:
+        allowed, retry_after = await get_rate_limiter().check(current_user.id)
+        if not allowed:
+            logger.warning("rate_limited", user_id=current_user.id, retry_after=round(retry_after, 2))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+    return current_user
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 import structlog
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.db.models import User
 from app.api import schemas
 from app.core import security, config
@@ -12,54 +13,80 @@ from app.core import security, config
 router = APIRouter()
 logger = structlog.get_logger("auth")
 
+def _too_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many concurrent logins, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/signup", response_model=schemas.UserOut)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(
+    user: schemas.UserCreate,
+    db: AsyncSession = Depends(get_async_db),
+    hasher: security.PasswordHasher = Depends(security.get_password_hasher),
+):
     """
     Register a new user.
     """
     # 1. Check if email already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # 2. Hash the password
-    hashed_password = security.get_password_hash(user.password)
-    
+
+    # 2. Hash the password (on the bcrypt pool, not the event loop)
+    try:
+        hashed_password = await hasher.hash(user.password)
+    except security.PasswordHasherBusy:
+        raise _too_busy()
+
     # 3. Save to DB
     new_user = User(email=user.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
+    await db.commit()
+
     logger.info("user_signed_up", user_id=new_user.id, email=new_user.email)
     return new_user
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), 
-    db: Session = Depends(get_db)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    hasher: security.PasswordHasher = Depends(security.get_password_hasher),
 ):
     """
     OAuth2 compatible token login, get an access token for future requests.
     """
     # 1. Find user by email
     # OAuth2 spec says the field is 'username', but we use email
-    user = db.query(User).filter(User.email == form_data.username).first()
-    
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+
     # 2. Verify User and Password
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = False, None
+    if user:
+        try:
+            verified, new_hash = await hasher.verify(form_data.password, user.hashed_password)
+        except security.PasswordHasherBusy:
+            raise _too_busy()
+    if not verified:
         logger.warning("login_failed", email=form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
+    # The stored hash uses an outdated cost factor: replace it while we have the password
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
+        logger.info("password_rehashed", user_id=user.id, rounds=hasher.rounds)
+
     # 3. Create Token
     access_token_expires = timedelta(minutes=config.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
     )
-    
+
     logger.info("login_success", user_id=user.id, email=user.email)
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
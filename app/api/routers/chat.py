@@ -1,39 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+import anyio
+import base64
+import weakref
 import structlog
 
 from app.api.schemas import ChatRequest, ChatResponse, SourceDocument, ChatHistoryOut
+from app.api.streaming import SSE_MEDIA_TYPE, TokenCoalescer, format_sse, wants_sse
+from app.core.config import settings
 # Import Auth and DB dependencies
-from app.api.deps import get_current_user 
-from app.db.session import get_db
+from app.api.deps import get_current_user, get_rate_limited_user
+from app.services.admission import LLMConcurrencyLimiter, LLMOverloaded, LLMSlot, get_llm_limiter
+from app.services.principal_cache import UserPrincipal
+from app.db.session import get_async_db
 # Import Models for saving history
-from app.db.models import User, ChatHistory
+from app.db.models import ChatHistory
 # Import RAG Service and its Dependency Provider
 from app.services.rag_service import RAGService, get_rag_service 
+from app.services.history_writer import HistoryWriter, get_history_writer
+from app.services.vector_service import RetrievalOptions
 
 router = APIRouter()
 logger = structlog.get_logger()
 
-def _upsert_history(
-    db: Session,
+def _retrieval_options(request: ChatRequest) -> RetrievalOptions:
+    return RetrievalOptions(
+        max_collections=request.max_collections,
+        timeout_ms=request.retrieval_timeout_ms,
+    )
+
+def _encode_cursor(item: ChatHistory) -> str:
+    raw = f"{item.timestamp.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, history_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(history_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _acquire_llm_slot(limiter: LLMConcurrencyLimiter) -> LLMSlot:
+    try:
+        return await limiter.acquire()
+    except LLMOverloaded:
+        raise HTTPException(status_code=503, detail="Server is busy, retry shortly", headers={"Retry-After": "1"})
+
+async def _get_owned_history(db: AsyncSession, user_id: int, history_id: int) -> ChatHistory | None:
+    return await db.scalar(
+        select(ChatHistory).where(ChatHistory.id == history_id, ChatHistory.user_id == user_id)
+    )
+
+async def _upsert_history(
+    db: AsyncSession,
     user_id: int,
     question: str,
     answer: str,
     history_id: int | None = None,
+    summary: str | None = None,
 ) -> ChatHistory:
     history_item = None
     if history_id:
-        history_item = (
-            db.query(ChatHistory)
-            .filter(ChatHistory.id == history_id, ChatHistory.user_id == user_id)
-            .first()
-        )
+        history_item = await _get_owned_history(db, user_id, history_id)
 
     if history_item:
         history_item.question = question
         history_item.answer = answer
+        # The conversation up to the turn being replaced
+        history_item.summary = summary
         history_item.timestamp = datetime.utcnow()
     else:
         history_item = ChatHistory(
@@ -44,29 +82,25 @@ def _upsert_history(
         )
         db.add(history_item)
 
-    db.commit()
-    db.refresh(history_item)
+    await db.commit()
     return history_item
 
-def _get_or_create_history_stub(
-    db: Session,
+async def _get_or_create_history_stub(
+    db: AsyncSession,
     user_id: int,
     question: str,
     history_id: int | None = None,
+    summary: str | None = None,
 ) -> ChatHistory:
     history_item = None
     if history_id:
-        history_item = (
-            db.query(ChatHistory)
-            .filter(ChatHistory.id == history_id, ChatHistory.user_id == user_id)
-            .first()
-        )
+        history_item = await _get_owned_history(db, user_id, history_id)
 
     if history_item:
         history_item.question = question
+        history_item.summary = summary
         history_item.timestamp = datetime.utcnow()
-        db.commit()
-        db.refresh(history_item)
+        await db.commit()
         return history_item
 
     history_item = ChatHistory(
@@ -76,38 +110,83 @@ def _get_or_create_history_stub(
         timestamp=datetime.utcnow(),
     )
     db.add(history_item)
-    db.commit()
-    db.refresh(history_item)
+    await db.commit()
     return history_item
 
+async def _queue_history(
+    db: AsyncSession,
+    writer: HistoryWriter,
+    user_id: int,
+    question: str,
+    answer: str,
+    history_id: int | None = None,
+    summary: str | None = None,
+) -> int:
+    """
+    Write-behind counterpart of `_upsert_history`: queues the row and returns
+    its id without a commit on the request path.
+    """
+    if history_id:
+        owner = writer.owner_of(history_id)
+        if owner is None and await _get_owned_history(db, user_id, history_id):
+            owner = user_id
+        if owner == user_id:
+            writer.update(history_id, question=question, answer=answer, summary=summary)
+            return history_id
+
+    history_id = await writer.allocate_id()
+    writer.insert(history_id, user_id, question, answer)
+    return history_id
+
 @router.post("/", response_model=ChatResponse)
 @router.post("/chat", response_model=ChatResponse, include_in_schema=False)
 async def chat_endpoint(
     request: ChatRequest,
-    # 1. SECURITY: Ensure user is logged in
-    current_user: User = Depends(get_current_user),
+    # 1. SECURITY: Ensure user is logged in and within their rate limit
+    current_user: UserPrincipal = Depends(get_rate_limited_user),
     # 2. DATABASE: Get a session to save history
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # 3. LOGIC: Get the RAG Service (using your existing DI)
-    service: RAGService = Depends(get_rag_service) 
+    service: RAGService = Depends(get_rag_service),
+    writer: HistoryWriter = Depends(get_history_writer),
+    llm_limiter: LLMConcurrencyLimiter = Depends(get_llm_limiter),
 ):
     """
     Receives a question, processes it through the RAG pipeline,
     saves the history to Postgres, and returns the answer.
     """
+    slot = None
     try:
-        # A. Get the AI result using the injected service
-        result = await service.ask_question(request.question)
+        # A. Summary of the earlier turns when this continues a conversation.
+        # Folding it may take an LLM slot of its own, so it comes first
+        memory = service.conversation_memory if settings.CONVERSATION_MEMORY_ENABLED else None
+        summary = None
+        if memory is not None and request.history_id:
+            summary = await memory.get(request.history_id, current_user.id, llm_limiter)
+
+        # Wait for one of the process-wide LLM slots (503 when overloaded)
+        slot = await _acquire_llm_slot(llm_limiter)
+        try:
+            result = await service.ask_question(request.question, _retrieval_options(request), summary)
+        finally:
+            slot.release()
         answer_text = result.get("answer", "No answer found.")
         
         # B. Save or update the interaction to the Database
-        history_item = _upsert_history(
-            db=db,
-            user_id=current_user.id,
-            question=request.question,
-            answer=answer_text,
-            history_id=request.history_id,
-        )
+        if settings.HISTORY_WRITE_BEHIND_ENABLED:
+            history_id = await _queue_history(
+                db, writer, current_user.id, request.question, answer_text, request.history_id, summary
+            )
+        else:
+            history_item = await _upsert_history(
+                db=db,
+                user_id=current_user.id,
+                question=request.question,
+                answer=answer_text,
+                history_id=request.history_id,
+                summary=summary,
+            )
+            history_id = history_item.id
         
         # C. Convert Documents (as before)
         raw_documents = result.get("context", [])
@@ -124,101 +203,200 @@ async def chat_endpoint(
         return ChatResponse(
             answer=answer_text,
             source_documents=converted_documents,
-            history_id=history_item.id,
+            history_id=history_id,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("chat_endpoint_error", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail="Internal Server Error")
+    finally:
+        # Also when saving the history failed or the request was cancelled
+        if slot is not None:
+            slot.release()
 
 @router.post("/stream")
 @router.post("/chat/stream", include_in_schema=False)
 async def chat_stream_endpoint(
     request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    service: RAGService = Depends(get_rag_service)
+    raw_request: Request,
+    current_user: UserPrincipal = Depends(get_rate_limited_user),
+    db: AsyncSession = Depends(get_async_db),
+    service: RAGService = Depends(get_rag_service),
+    writer: HistoryWriter = Depends(get_history_writer),
+    llm_limiter: LLMConcurrencyLimiter = Depends(get_llm_limiter),
 ):
-    history_item = _get_or_create_history_stub(
-        db=db,
-        user_id=current_user.id,
-        question=request.question,
-        history_id=request.history_id,
-    )
+    # Read before the stub replaces the last turn; folding it may take an LLM slot of its own
+    memory = service.conversation_memory if settings.CONVERSATION_MEMORY_ENABLED else None
+    summary = None
+    if memory is not None and request.history_id:
+        summary = await memory.get(request.history_id, current_user.id, llm_limiter)
+
+    # The slot is held until the stream ends; rejected requests leave no history stub
+    slot = await _acquire_llm_slot(llm_limiter)
+    try:
+        write_behind = settings.HISTORY_WRITE_BEHIND_ENABLED
+        if write_behind:
+            history_id = await _queue_history(
+                db, writer, current_user.id, request.question, "", request.history_id, summary
+            )
+        else:
+            history_item = await _get_or_create_history_stub(
+                db=db,
+                user_id=current_user.id,
+                question=request.question,
+                history_id=request.history_id,
+                summary=summary,
+            )
+            history_id = history_item.id
+    except BaseException:
+        slot.release()
+        raise
+
+    sse = wants_sse(raw_request.headers.get("accept"))
+    coalescer = TokenCoalescer(settings.STREAM_COALESCE_CHARS, settings.STREAM_COALESCE_MS)
+
+    async def _save_answer(answer: str):
+        if write_behind:
+            # Folds into the queued stub if it hasn't been flushed yet
+            writer.update(history_id, answer=answer)
+            return
+        history_item.answer = answer
+        history_item.timestamp = datetime.utcnow()
+        db.add(history_item)
+        await db.commit()
 
     async def generate():
         full_answer = ""
-        docs = []
+        sources_sent = False
+        stream = service.ask_question_stream(request.question, _retrieval_options(request), summary)
         try:
-            async for chunk, retrieved_docs in service.ask_question_stream(request.question):
-                if retrieved_docs:
-                    docs = retrieved_docs
-                if chunk:
-                    full_answer += chunk
-                    yield chunk
-            
-            # Save history after streaming is done
-            history_item.answer = full_answer
-            history_item.timestamp = datetime.utcnow()
-            db.add(history_item)
-            db.commit()
-            db.refresh(history_item)
-            
+            async for chunk, retrieved_docs in stream:
+                if sse and retrieved_docs and not sources_sent:
+                    # Sources go out as soon as retrieval is done, before any token
+                    sources_sent = True
+                    yield format_sse("sources", {
+                        "history_id": history_id,
+                        "sources": [
+                            {"page_content": doc.page_content, "metadata": doc.metadata}
+                            for doc in retrieved_docs
+                        ],
+                    })
+                if not chunk:
+                    continue
+
+                full_answer += chunk
+                text = coalescer.add(chunk)
+                if text is None:
+                    continue
+                if await raw_request.is_disconnected():
+                    logger.info("stream_client_disconnected", history_id=history_id, chars=len(full_answer))
+                    break
+                yield format_sse("token", {"text": text}) if sse else text
+            else:
+                text = coalescer.flush()
+                if text:
+                    yield format_sse("token", {"text": text}) if sse else text
+                if sse:
+                    yield format_sse("done", {"history_id": history_id})
+
         except Exception as e:
             logger.error("stream_error", error=str(e))
-            yield f"Error: {str(e)}"
+            yield format_sse("error", {"detail": str(e)}) if sse else f"Error: {str(e)}"
+
+        finally:
+            # Stop the upstream generation even if this task is being cancelled,
+            # then persist whatever was produced (the full or partial answer)
+            with anyio.CancelScope(shield=True):
+                await stream.aclose()
+                slot.release()
+                await _save_answer(full_answer)
 
-    response = StreamingResponse(generate(), media_type="text/plain")
-    response.headers["X-History-Id"] = str(history_item.id)
+    body = generate()
+    # If the client is gone before the body is ever iterated, the generator's
+    # finally never runs; release the slot when it is collected instead
+    weakref.finalize(body, slot.release)
+    response = StreamingResponse(body, media_type=SSE_MEDIA_TYPE if sse else "text/plain")
+    response.headers["X-History-Id"] = str(history_id)
+    if sse:
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"  # Don't let nginx buffer the events
     return response
 
 @router.get("/history", response_model=list[ChatHistoryOut])
-def get_chat_history(
+async def get_chat_history(
     response: Response,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    offset: int = 0,
-    limit: int = 50
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    writer: HistoryWriter = Depends(get_history_writer),
+    cursor: str | None = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    include_total: bool | None = None,
 ):
     """
-    Get the chat history for the current user with pagination.
+    Get the chat history for the current user, newest first.
+
+    Pass the `X-Next-Cursor` header of a page as `cursor` to get the next one
+    (keyset pagination on the (user_id, timestamp, id) index, constant cost
+    at any depth). `offset` is still accepted for older clients.
+    `X-Total-Count` costs a full count and is only sent in offset mode,
+    unless `include_total` says otherwise.
     """
-    # Get total count for pagination
-    total_count = db.query(ChatHistory).filter(
-        ChatHistory.user_id == current_user.id
-    ).count()
-    
-    # Get paginated history
-    history = db.query(ChatHistory).filter(
-        ChatHistory.user_id == current_user.id
-    ).order_by(ChatHistory.timestamp.desc()).offset(offset).limit(limit).all()
-    
-    # Add total count to response headers
-    response.headers["X-Total-Count"] = str(total_count)
-    
+    if settings.HISTORY_WRITE_BEHIND_ENABLED:
+        # Read your own writes: push queued rows out before listing
+        await writer.flush()
+
+    query = (
+        select(ChatHistory)
+        .where(ChatHistory.user_id == current_user.id)
+        .order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())
+        .limit(limit)
+    )
+    if cursor:
+        # Rows strictly after the last one of the previous page
+        query = query.where(tuple_(ChatHistory.timestamp, ChatHistory.id) < _decode_cursor(cursor))
+    else:
+        query = query.offset(offset)
+
+    history = (await db.scalars(query)).all()
+
+    if len(history) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(history[-1])
+
+    if include_total is None:
+        include_total = cursor is None
+    if include_total:
+        total_count = await db.scalar(
+            select(func.count()).select_from(ChatHistory).where(ChatHistory.user_id == current_user.id)
+        )
+        response.headers["X-Total-Count"] = str(total_count)
+
     return history
 
 @router.delete("/history/{history_id}", status_code=204)
-def delete_chat_history(
+async def delete_chat_history(
     history_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    writer: HistoryWriter = Depends(get_history_writer),
 ):
     """
     Delete a specific chat history item.
     Only the owner can delete their own history.
     """
+    if settings.HISTORY_WRITE_BEHIND_ENABLED:
+        await writer.flush()
+
     # Find the history item
-    history_item = db.query(ChatHistory).filter(
-        ChatHistory.id == history_id,
-        ChatHistory.user_id == current_user.id
-    ).first()
+    history_item = await _get_owned_history(db, current_user.id, history_id)
     
     if not history_item:
         raise HTTPException(status_code=404, detail="History item not found")
     
     # Delete the item
-    db.delete(history_item)
-    db.commit()
+    await db.delete(history_item)
+    await db.commit()
     
     return Response(status_code=204)
\ No newline at end of file
@@ -1,67 +1,82 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.api.deps import get_current_user
-from app.db.models import User
-from app.api.schemas import FeedCreate, FeedOut, ArticleOut
+from app.services.principal_cache import UserPrincipal
+from app.api.schemas import FeedCreate, FeedOut, ArticleOut, JobOut
+from app.db.models import Feed
 from app.services.feed_service import FeedService
+from app.services.job_queue import JobQueue, get_job_queue
+from app.services.jobs import enqueue_feed_refresh
 
 router = APIRouter()
 
-def get_feed_service(db: Session = Depends(get_db)) -> FeedService:
+def get_feed_service(db: AsyncSession = Depends(get_async_db)) -> FeedService:
     return FeedService(db)
 
 @router.post("", response_model=FeedOut)
-def create_feed(
+async def create_feed(
     feed_in: FeedCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     service: FeedService = Depends(get_feed_service)
 ):
     """
     Add a new RSS feed.
     """
     try:
-        return service.create_feed(feed_in.name, feed_in.url, feed_in.category)
+        return await service.create_feed(feed_in.name, feed_in.url, feed_in.category)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("", response_model=List[FeedOut])
-def get_feeds(
-    current_user: User = Depends(get_current_user),
+async def get_feeds(
+    current_user: UserPrincipal = Depends(get_current_user),
     service: FeedService = Depends(get_feed_service)
 ):
     """
     List all RSS feeds.
     """
-    return service.get_feeds()
+    return await service.get_feeds()
 
 @router.delete("/{feed_id}", status_code=204)
-def delete_feed(
+async def delete_feed(
     feed_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     service: FeedService = Depends(get_feed_service)
 ):
     """
     Delete an RSS feed.
     """
-    service.delete_feed(feed_id)
+    await service.delete_feed(feed_id)
     return
 
-@router.post("/{feed_id}/refresh")
-def refresh_feed(
+@router.post("/refresh", status_code=status.HTTP_202_ACCEPTED)
+async def refresh_all_feeds(
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    queue: JobQueue = Depends(get_job_queue),
+):
+    """
+    Queue a refresh of every active feed; poll /api/jobs/{job_id} for the outcome.
+    """
+    feed_ids = list(await db.scalars(select(Feed.id).where(Feed.is_active == 1)))
+    jobs = {feed_id: (await enqueue_feed_refresh(queue, feed_id)).id for feed_id in feed_ids}
+    return {"message": "Feed refreshes queued", "jobs": jobs}
+
+@router.post("/{feed_id}/refresh", status_code=status.HTTP_202_ACCEPTED, response_model=JobOut)
+async def refresh_feed(
     feed_id: int,
-    current_user: User = Depends(get_current_user),
-    service: FeedService = Depends(get_feed_service)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    queue: JobQueue = Depends(get_job_queue),
 ):
     """
-    Manually trigger a refresh for a specific feed.
+    Queue a refresh for a specific feed. Fetching and embedding run on the
+    job worker; poll /api/jobs/{job_id} for progress.
     """
-    try:
-        count = service.update_feed_articles(feed_id)
-        return {"message": "Feed refreshed successfully", "new_articles": count}
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if await db.get(Feed, feed_id) is None:
+        raise HTTPException(status_code=404, detail=f"Feed with id {feed_id} not found")
+    return await enqueue_feed_refresh(queue, feed_id)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.deps import get_current_user
+from app.api.schemas import JobOut
+from app.services.job_queue import JobQueue, get_job_queue
+from app.services.principal_cache import UserPrincipal
+
+router = APIRouter()
+
+@router.get("")
+async def get_job_counts(
+    current_user: UserPrincipal = Depends(get_current_user),
+    queue: JobQueue = Depends(get_job_queue),
+):
+    """
+    Number of jobs per status.
+    """
+    return await queue.counts()
+
+@router.get("/{job_id}", response_model=JobOut)
+async def get_job(
+    job_id: int,
+    current_user: UserPrincipal = Depends(get_current_user),
+    queue: JobQueue = Depends(get_job_queue),
+):
+    """
+    Status, progress and result of a background job.
+    """
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
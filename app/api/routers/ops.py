@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.security import get_password_hasher
+from app.db.embedding_cache import CachedEmbeddings
+from app.services.admission import get_llm_limiter, get_rate_limiter
+from app.services.answer_cache import get_answer_cache
+from app.services.feed_scheduler import get_feed_scheduler
+from app.services.history_writer import get_history_writer
+from app.services.jobs import get_job_worker
+from app.services.principal_cache import UserPrincipal, get_principal_cache
+from app.services.rag_service import RAGService, get_rag_service
+from app.services.rss_fetcher import get_rss_fetcher
+
+router = APIRouter()
+
+@router.get("/stats")
+def get_stats(
+    current_user: UserPrincipal = Depends(get_current_user),
+    service: RAGService = Depends(get_rag_service)
+):
+    """
+    Runtime counters of the RAG pipeline, used to tune caches and routing.
+    """
+    embeddings = service.vector_service.embedding_function
+    return {
+        "answer_cache": get_answer_cache().stats(),
+        "auth_cache": get_principal_cache().stats(),
+        "password_hasher": get_password_hasher().stats(),
+        "rate_limiter": get_rate_limiter().stats(),
+        "llm_limiter": get_llm_limiter().stats(),
+        "feed_fetcher": get_rss_fetcher().stats(),
+        "job_worker": get_job_worker().stats() if settings.JOB_WORKER_ENABLED else None,
+        "feed_scheduler": get_feed_scheduler().stats() if settings.SCHEDULER_ENABLED else None,
+        "router": service.router.stats(),
+        "single_flight": service.single_flight.stats(),
+        "reranker": service.reranker.stats() if service.reranker else None,
+        "embedding_cache": embeddings.stats() if isinstance(embeddings, CachedEmbeddings) else None,
+        "query_embedder": service.query_embedder.stats() if service.query_embedder else None,
+        "conversation_memory": service.conversation_memory.stats(),
+        "history_writer": get_history_writer().stats() if settings.HISTORY_WRITE_BEHIND_ENABLED else None,
+    }
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Dict, Any
 
 # Pydantic model for a single source document
@@ -10,6 +10,9 @@ class SourceDocument(BaseModel):
 class ChatRequest(BaseModel):
     question: str
     history_id: int | None = None
+    # Optional retrieval overrides (fan-out width and per-collection deadline)
+    max_collections: int | None = Field(default=None, ge=1)
+    retrieval_timeout_ms: int | None = Field(default=None, ge=50, le=10000)
 
 # Pydantic model for the outgoing response from the API
 class ChatResponse(BaseModel):
@@ -70,6 +73,24 @@ class ArticleOut(BaseModel):
     class Config:
         from_attributes = True
 
+# --- Job Schemas ---
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: str # queued, running, succeeded, failed
+    attempts: int
+    max_attempts: int
+    progress: Dict[str, Any] | None = None
+    result: Dict[str, Any] | None = None
+    error: str | None = None
+    run_at: Any
+    created_at: Any
+    finished_at: Any
+
+    class Config:
+        from_attributes = True
+
 class GenerateArticleRequest(BaseModel):
     topic: str
     category: str | None = None
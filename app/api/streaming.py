@@ -0,0 +1,45 @@
+import json
+import time
+from typing import Any, List, Optional
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def wants_sse(accept_header: Optional[str]) -> bool:
+    return SSE_MEDIA_TYPE in (accept_header or "")
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Serializes one Server-Sent Event frame with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class TokenCoalescer:
+    """
+    Buffers LLM tokens and releases them in larger pieces, once `max_chars`
+    have accumulated or `max_ms` have passed since the last release. This
+    turns one write per token into a handful of frames per second.
+    """
+
+    def __init__(self, max_chars: int, max_ms: int):
+        self.max_chars = max_chars
+        self.max_seconds = max_ms / 1000
+        self._parts: List[str] = []
+        self._size = 0
+        self._last_flush = 0.0  # The first token goes out immediately
+
+    def add(self, text: str) -> Optional[str]:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or time.monotonic() - self._last_flush >= self.max_seconds:
+            return self.flush()
+        return None
+
+    def flush(self) -> str:
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+        return text
@@ -1,12 +1,30 @@
+import asyncio
+import multiprocessing as mp
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from jose import jwt
+import structlog
 from app.core.config import settings
 
+logger = structlog.get_logger("auth")
+
 # 1. Password Hashing Setup
 # We use bcrypt, the industry standard for password storage
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache()
+def _crypt_context(rounds: int) -> CryptContext:
+    # Hashes with any other cost factor are flagged for rehash on login
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+pwd_context = _crypt_context(settings.BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
     """Checks if a raw password matches the hash in the DB."""
@@ -16,6 +34,95 @@ def get_password_hash(password):
     """Converts a raw password into a secure hash."""
     return pwd_context.hash(password)
 
+# Module-level so the pool's worker processes can import them
+def _hash(password: str, rounds: int) -> str:
+    return _crypt_context(rounds).hash(password)
+
+def _verify_and_update(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _crypt_context(rounds).verify_and_update(password, hashed_password)
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes queued; the caller should shed the request."""
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated pool instead of the shared threadpool.
+
+    Each hash costs ~200ms of CPU, so a login burst would otherwise occupy
+    every worker thread the sync endpoints depend on. At most `max_pending`
+    hashes may be queued or running; beyond that `PasswordHasherBusy` is
+    raised so the endpoint can answer 429 right away.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        rounds: Optional[int] = None,
+        use_processes: Optional[bool] = None,
+    ):
+        self.workers = workers or settings.PASSWORD_HASH_WORKERS
+        self.max_pending = max_pending or settings.PASSWORD_HASH_MAX_PENDING
+        self.rounds = rounds or settings.BCRYPT_ROUNDS
+        self.use_processes = settings.PASSWORD_HASH_USE_PROCESSES if use_processes is None else use_processes
+        self._executor: Optional[Executor] = None
+
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                # spawn: forking a process that already runs threads is unsafe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning("password_hash_shed", pending=self.pending)
+            raise PasswordHasherBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (matches, new_hash). `new_hash` is set when the stored hash
+        uses another cost factor and should replace it.
+        """
+        verified, new_hash = await self._run(_verify_and_update, password, hashed_password, self.rounds)
+        if new_hash is not None:
+            self.rehashed += 1
+        return verified, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+@lru_cache()
+def get_password_hasher() -> PasswordHasher:
+    return PasswordHasher()
+
 # 2. JWT Token Creation
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Generates a JWT token signed with our SECRET_KEY."""
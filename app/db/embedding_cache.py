@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import structlog
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+logger = structlog.get_logger()
+
+KEY_BYTES = 16
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.bin"
+META_FILE = "meta.json"
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model_key: str, text: str) -> bytes:
+    return hashlib.blake2b(
+        f"{model_key}\0{normalize_text(text)}".encode("utf-8"), digest_size=KEY_BYTES
+    ).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding vectors keyed by content hash.
+
+    Two append-only files hold the data: `vectors.f32` with one float32 row
+    per entry, read through a memory map, and `keys.bin` with the 16-byte key
+    of each row in the same order. The key -> row index lives in memory and
+    is rebuilt from `keys.bin` on open. Appends take an exclusive file lock,
+    so the API workers and the ingest script can share a directory; rows
+    appended by another process are indexed on the next lookup that misses.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, VECTORS_FILE)
+        self._keys_path = os.path.join(path, KEYS_FILE)
+        self._meta_path = os.path.join(path, META_FILE)
+
+        self.dim: Optional[int] = None
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0  # Rows of keys.bin indexed so far
+        self._mmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._sync()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _read_dim(self) -> Optional[int]:
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        return self.dim
+
+    def _sync(self):
+        """Indexes the rows appended (by any process) since the last call."""
+        if self._read_dim() is None or not os.path.exists(self._keys_path) or not os.path.exists(self._vectors_path):
+            return
+        row_bytes = self.dim * 4
+        # Vectors are written before their keys: a key always has its row
+        rows = min(os.path.getsize(self._keys_path) // KEY_BYTES, os.path.getsize(self._vectors_path) // row_bytes)
+        if rows <= self._rows:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._rows * KEY_BYTES)
+            data = f.read((rows - self._rows) * KEY_BYTES)
+        for offset in range(0, len(data), KEY_BYTES):
+            # Two processes may both have added a text; the first row wins
+            self._index.setdefault(data[offset:offset + KEY_BYTES], self._rows + offset // KEY_BYTES)
+        self._rows = rows
+        self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    @contextmanager
+    def _file_lock(self):
+        with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            if any(key not in self._index for key in keys):
+                self._sync()
+            return [
+                np.array(self._mmap[self._index[key]]) if key in self._index else None
+                for key in keys
+            ]
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(keys) != len(vectors):
+            raise ValueError("One vector per key is required")
+        if not len(keys):
+            return
+
+        with self._lock, self._file_lock():
+            if self._read_dim() is None:
+                self.dim = vectors.shape[1]
+                with open(self._meta_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Cache holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+            self._sync()
+            new = [i for i, key in enumerate(keys) if key not in self._index]
+            if not new:
+                return
+
+            # Drop the tail of an append that crashed half way, so rows and keys stay aligned
+            for file_path, size in ((self._vectors_path, self._rows * self.dim * 4), (self._keys_path, self._rows * KEY_BYTES)):
+                if os.path.exists(file_path) and os.path.getsize(file_path) > size:
+                    os.truncate(file_path, size)
+
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors[new].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(keys[i] for i in new))
+            self._sync()
+        logger.debug("embedding_cache_appended", rows=len(new), entries=self._rows)
+
+    def stats(self) -> dict:
+        return {
+            "entries": self._rows,
+            "dim": self.dim,
+            "file_bytes": self._rows * ((self.dim or 0) * 4 + KEY_BYTES),
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Serves `embed_documents` from an EmbeddingCache and sends only the
+    misses, deduplicated, to the wrapped model in a single batch. Queries
+    are not cached: they rarely repeat and would only grow the files.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_key: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_key = model_key
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # UTF-8 text not sent to the model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model_key, text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, cached):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        computed: Dict[bytes, np.ndarray] = {}
+        if missing:
+            vectors = np.asarray(self.embeddings.embed_documents(list(missing.values())), dtype=np.float32)
+            self.cache.put_many(list(missing), vectors)
+            computed = dict(zip(missing, vectors))
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        self.bytes_saved += sum(len(t.encode("utf-8")) for t in texts) - sum(len(t.encode("utf-8")) for t in missing.values())
+        return [(vector if vector is not None else computed[key]).tolist() for key, vector in zip(keys, cached)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            **self.cache.stats(),
+        }
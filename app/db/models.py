@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
 from sqlalchemy.orm import relationship, declarative_base
-from datetime import datetime, timezone
+from datetime import datetime
 
 # The base class for all our models
 Base = declarative_base()
@@ -19,9 +19,9 @@ class ChatHistory(Base):
     __tablename__ = "chat_history"
 
     id = Column(Integer, primary_key=True, index=True)
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index, JSON
 from sqlalchemy.orm import relationship, declarative_base
-from datetime import datetime, timezone
+from datetime import datetime
 
 # The base class for all our models
 Base = declarative_base()
@@ -44,11 +44,18 @@ class ChatHistory(Base):
     
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Rolling, token-bounded summary of the conversation up to this turn
+    summary = Column(Text, nullable=True)
 
     # Relationship: Belongs to one user
     owner = relationship("User", back_populates="history")
 
+    # Keyset pagination of a user's history: newest first, id as tie-breaker
+    __table_args__ = (
+        Index("ix_chat_history_user_id_timestamp_id", user_id, timestamp.desc(), id.desc()),
+    )
+
 class Feed(Base):
     __tablename__ = "feeds"
 
@@ -58,6 +65,13 @@ class Feed(Base):
     category = Column(String, nullable=False, default="General")
     is_active = Column(Integer, default=1) # 1 for active, 0 for inactive
     last_fetched = Column(DateTime, nullable=True)
+    # HTTP validators of the last download, sent back as a conditional GET
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    # Adaptive refresh schedule, maintained by the feed scheduler
+    refresh_interval_seconds = Column(Integer, nullable=True)
+    next_fetch_at = Column(DateTime, nullable=True)
+    consecutive_failures = Column(Integer, nullable=False, default=0, server_default="0")
     
     articles = relationship("Article", back_populates="feed")
 
@@ -69,7 +83,46 @@ class Article(Base):
     content = Column(Text, nullable=False)
     url = Column(String, unique=True, nullable=False)
     published_date = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     feed_id = Column(Integer, ForeignKey("feeds.id"))
-    feed = relationship("Feed", back_populates="articles")
\ No newline at end of file
+    feed = relationship("Feed", back_populates="articles")
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    # Jobs with the same key are not queued twice while one is pending
+    dedupe_key = Column(String, nullable=True, index=True)
+    status = Column(String, nullable=False, default="queued") # queued, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow) # Not picked up before this (retry backoff)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True) # Refreshed by every checkpoint: the worker's lease
+    progress = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Claiming: the oldest due job in a given status
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", status, run_at),
+        # At most one pending job per dedupe key, even with concurrent enqueues
+        Index(
+            "uq_jobs_pending_dedupe_key", dedupe_key, unique=True,
+            postgresql_where=status.in_(("queued", "running")),
+            sqlite_where=status.in_(("queued", "running")),
+        ),
+    )
+
+class IndexVersion(Base):
+    __tablename__ = "index_versions"
+
+    # One counter per index, e.g. "articles": bumped whenever new articles are embedded
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
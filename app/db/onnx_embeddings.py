@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+import onnxruntime as ort
+import structlog
+from langchain_core.embeddings import Embeddings
+
+logger = structlog.get_logger()
+
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+# Pooling, max length, lower-casing and normalization, from the sentence-transformers config
+EMBEDDING_CONFIG_FILE = "embedding_config.json"
+
+# The sentence-transformers modules this backend reproduces
+TRANSFORMER_MODULE = "sentence_transformers.models.Transformer"
+POOLING_MODULE = "sentence_transformers.models.Pooling"
+NORMALIZE_MODULE = "sentence_transformers.models.Normalize"
+POOLING_MODES = {
+    "pooling_mode_mean_tokens": "mean",
+    "pooling_mode_cls_token": "cls",
+    "pooling_mode_max_tokens": "max",
+}
+
+
+def resolve_model_id(model_name: str) -> str:
+    # sentence-transformers resolves bare names like "all-MiniLM-L6-v2" the same way
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def read_sentence_transformers_config(model_path: str) -> dict:
+    """
+    Reads how a sentence-transformers model turns token states into a
+    sentence vector, from the modules.json and module configs in
+    `model_path`. Raises ValueError for a model this backend can't
+    reproduce exactly (no sentence-transformers config, modules such as
+    Dense, or another pooling mode): its vectors would silently differ from
+    the HuggingFace backend's.
+    """
+    modules_path = os.path.join(model_path, "modules.json")
+    if not os.path.exists(modules_path):
+        raise ValueError("not a sentence-transformers model: modules.json is missing")
+    with open(modules_path) as f:
+        modules = json.load(f)
+    types = [module["type"] for module in modules]
+    if types[:2] != [TRANSFORMER_MODULE, POOLING_MODULE] or any(t != NORMALIZE_MODULE for t in types[2:]):
+        raise ValueError(f"unsupported sentence-transformers modules: {types}")
+
+    with open(os.path.join(model_path, modules[1]["path"], "config.json")) as f:
+        pooling = json.load(f)
+    modes = [key for key, enabled in pooling.items() if key.startswith("pooling_mode_") and enabled]
+    if len(modes) != 1 or modes[0] not in POOLING_MODES:
+        raise ValueError(f"unsupported pooling: {modes}")
+
+    transformer = {}
+    transformer_config = os.path.join(model_path, "sentence_bert_config.json")
+    if os.path.exists(transformer_config):
+        with open(transformer_config) as f:
+            transformer = json.load(f)
+
+    return {
+        "pooling": POOLING_MODES[modes[0]],
+        "max_length": transformer.get("max_seq_length"),  # None: the tokenizer's own limit
+        "do_lower_case": transformer.get("do_lower_case", False),
+        "normalize": NORMALIZE_MODULE in types[2:],
+    }
+
+
+def _is_exported(model_dir: str) -> bool:
+    # Exports from before the embedding config was recorded are redone
+    return all(os.path.exists(os.path.join(model_dir, name)) for name in (QUANTIZED_MODEL_FILE, EMBEDDING_CONFIG_FILE))
+
+
+def export_onnx_model(model_name: str, cache_dir: str) -> str:
+    """
+    Exports `model_name` to ONNX and quantizes its weights to int8, once.
+    Returns the directory holding the quantized model and its tokenizer.
+
+    The export is built in a temporary directory under a file lock and moved
+    into place in one rename, so a crash halfway or several workers starting
+    at once never leave a partial model that later runs would trust.
+    """
+    model_id = resolve_model_id(model_name)
+    model_dir = os.path.join(cache_dir, model_id.replace("/", "__"))
+    if _is_exported(model_dir):
+        return model_dir
+
+    from filelock import FileLock
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with FileLock(f"{model_dir}.lock"):
+        # Another worker may have finished the export while this one waited
+        if _is_exported(model_dir):
+            return model_dir
+
+        build_dir = tempfile.mkdtemp(prefix=".export-", dir=cache_dir)
+        try:
+            _export(model_id, build_dir)
+            if os.path.exists(model_dir):
+                # Left over by an export from before the rename
+                shutil.rmtree(model_dir)
+            os.replace(build_dir, model_dir)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    logger.info("onnx_export_finished", model=model_id, path=model_dir)
+    return model_dir
+
+
+def _export(model_id: str, target_dir: str):
+    from huggingface_hub import snapshot_download
+
+    # Checked before anything is downloaded or exported
+    config = read_sentence_transformers_config(snapshot_download(
+        model_id, allow_patterns=["modules.json", "sentence_bert_config.json", "*/config.json"]
+    ))
+
+    # Torch is only needed for the one-off export, not for inference
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    logger.info("onnx_export_started", model=model_id, target=target_dir, **config)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModel.from_pretrained(model_id).eval()
+    tokenizer.save_pretrained(target_dir)
+
+    input_names = list(tokenizer.model_input_names)
+    sample = tokenizer(["warmup sentence"], return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(target_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+    quantize_dynamic(fp32_path, os.path.join(target_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    with open(os.path.join(target_dir, EMBEDDING_CONFIG_FILE), "w") as f:
+        json.dump(config, f)
+
+
+def pool(hidden: np.ndarray, attention_mask: np.ndarray, mode: str) -> np.ndarray:
+    """
+    Sentence vectors from token states, like sentence-transformers' Pooling
+    module: padding never contributes.
+    """
+    if mode == "cls":
+        return hidden[:, 0]
+    mask = attention_mask[..., None].astype(np.float32)
+    if mode == "max":
+        return np.where(mask > 0, hidden, -1e9).max(axis=1)
+    return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an int8 ONNX export, computed with ONNX Runtime.
+
+    Applies the pooling, max sequence length, lower-casing and normalization
+    of the model's sentence-transformers config (recorded at export), so
+    vectors stay compatible with collections that were embedded with the
+    HuggingFace backend.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = 32, num_threads: Optional[int] = None):
+        from transformers import AutoTokenizer
+
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, EMBEDDING_CONFIG_FILE)) as f:
+            config = json.load(f)
+        self.pooling = config["pooling"]
+        self.max_length = config["max_length"] or self.tokenizer.model_max_length
+        self.do_lower_case = config["do_lower_case"]
+        self.normalize = config["normalize"]
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, QUANTIZED_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if self.do_lower_case:
+            texts = [text.lower() for text in texts]
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+
+            pooled = pool(hidden, encoded["attention_mask"], self.pooling)
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled)
+        return np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
@@ -1,15 +1,57 @@
+import os
+import re
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from app.core.config import settings
+from app.db.embedding_cache import CachedEmbeddings, EmbeddingCache
 
 from functools import lru_cache
 
 @lru_cache()
-def get_embedding_function():
+def configure_torch_threads():
+    """
+    Applies TORCH_NUM_THREADS once, before the first torch model loads.
+    Torch has a single intra-op pool per process, so this bounds the HF
+    embeddings and the reranker together; it can't be set per model.
+    """
+    if settings.TORCH_NUM_THREADS:
+        import torch
+
+        torch.set_num_threads(settings.TORCH_NUM_THREADS)
+
+@lru_cache()
+def get_embedding_model():
+    """
+    Returns the embedding model for EMBEDDING_BACKEND: "hf" (torch through
+    sentence-transformers) or "onnx" (int8 ONNX export of the same model).
+    """
+    if settings.EMBEDDING_BACKEND == "onnx":
+        from app.db.onnx_embeddings import OnnxEmbeddings, export_onnx_model
+
+        model_dir = export_onnx_model(settings.EMBEDDING_MODEL_NAME, settings.ONNX_MODEL_CACHE_DIR)
+        return OnnxEmbeddings(model_dir, num_threads=settings.ONNX_NUM_THREADS or None)
+
+    configure_torch_threads()
     return HuggingFaceEmbeddings(
         model_name=settings.EMBEDDING_MODEL_NAME
     )
 
+@lru_cache()
+def get_embedding_function():
+    """
+    Returns the embedding function for documents: the model behind the
+    persistent content-hash cache, so unchanged text is never re-embedded.
+    Query embedding goes straight to the model.
+    """
+    model = get_embedding_model()
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return model
+
+    # Backends give slightly different vectors: one cache per backend and model
+    model_key = f"{settings.EMBEDDING_BACKEND}:{settings.EMBEDDING_MODEL_NAME}"
+    cache_dir = os.path.join(settings.EMBEDDING_CACHE_DIR, re.sub(r"[^\w.-]+", "_", model_key))
+    return CachedEmbeddings(model, EmbeddingCache(cache_dir), model_key)
+
 def get_retriever(collection_name: str):
     """
     Creates and returns a retriever for a specific ChromaDB collection.
@@ -1,8 +1,18 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from app.api.routers import chat, auth, feeds
+from fastapi.responses import JSONResponse
+from app.api.routers import chat, auth, feeds, jobs, ops
 from app.core.logging import setup_logging
 from app.core.config import settings
+from app.core.security import get_password_hasher
+from app.db.session import async_engine
+from app.services.feed_scheduler import get_feed_scheduler
+from app.services.history_writer import get_history_writer
+from app.services.jobs import get_job_worker
+from app.services.rss_fetcher import get_rss_fetcher
+from app.services.warmup import readiness, warm_up
 import structlog
+import asyncio
 import time
 import uuid
 import os
@@ -33,11 +43,45 @@ logger.info(
     api_key_length=len(os.environ.get("LANGCHAIN_API_KEY", ""))
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server answers probes while models load
+    warmup_task = None
+    if settings.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        readiness.ready = True
+
+    if settings.HISTORY_WRITE_BEHIND_ENABLED:
+        get_history_writer().start()
+    if settings.SCHEDULER_ENABLED:
+        # Every worker runs one; the advisory lock lets a single leader refresh
+        get_feed_scheduler().start()
+    if settings.JOB_WORKER_ENABLED:
+        get_job_worker().start()
+
+    yield
+
+    if warmup_task is not None:
+        warmup_task.cancel()
+    if settings.SCHEDULER_ENABLED:
+        await get_feed_scheduler().stop()
+    if settings.JOB_WORKER_ENABLED:
+        # Jobs cut short here go back to the queue for the next worker
+        await get_job_worker().stop()
+    if settings.HISTORY_WRITE_BEHIND_ENABLED:
+        # Drain queued history rows before the pool goes away
+        await get_history_writer().stop()
+    get_password_hasher().shutdown()
+    await get_rss_fetcher().aclose()
+    await async_engine.dispose()
+
 # Create the FastAPI app instance
 app = FastAPI(
     title="NewsBot RAG API",
     description="An API for chatting with recent news from Brazil and Europe.",
-    version="1.0.6"
+    version="1.0.6",
+    lifespan=lifespan,
 )
 
 @app.middleware("http")
@@ -61,6 +105,8 @@ async def log_requests(request: Request, call_next):
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(feeds.router, prefix="/api/feeds", tags=["Feeds"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+app.include_router(ops.router, prefix="/api/ops", tags=["Ops"])
 
 
 @app.get("/", tags=["Root"])
@@ -68,4 +114,12 @@ async def read_root():
     """
     A simple root endpoint to confirm the API is running.
     """
-    return {"message": "Welcome to the NewsBot RAG API!"}
\ No newline at end of file
+    return {"message": "Welcome to the NewsBot RAG API!"}
+
+
+@app.get("/ready", tags=["Root"])
+async def read_ready():
+    """
+    Readiness probe: 503 until the startup warmup has finished.
+    """
+    return JSONResponse(status_code=200 if readiness.ready else 503, content=readiness.status())
@@ -0,0 +1,213 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class MemoryBucketStore:
+    """Token buckets in this process only, LRU-bounded by number of keys."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SqliteBucketStore:
+    """
+    Token buckets in a local SQLite file, shared by every worker process on
+    the host. Each take is one short IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> Tuple[bool, float]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM buckets")
+        finally:
+            conn.close()
+
+
+class RateLimiter:
+    """
+    Per-user token bucket: `burst` requests at once, refilled at
+    `per_minute` requests per minute.
+    """
+
+    def __init__(self, per_minute: Optional[float] = None, burst: Optional[int] = None, store=None):
+        self.rate = (per_minute or settings.RATE_LIMIT_PER_MINUTE) / 60
+        self.capacity = burst or settings.RATE_LIMIT_BURST
+        self.store = store or MemoryBucketStore()
+        self.allowed = 0
+        self.limited = 0
+
+    async def check(self, user_id: int) -> Tuple[bool, float]:
+        """
+        Takes a token for the user. Returns (allowed, seconds until the next token).
+        """
+        args = (f"user:{user_id}", self.rate, self.capacity, time.time())
+        if isinstance(self.store, MemoryBucketStore):
+            allowed, retry_after = self.store.take(*args)
+        else:
+            allowed, retry_after = await asyncio.to_thread(self.store.take, *args)
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return allowed, retry_after
+
+    def reset(self):
+        self.store.clear()
+
+    def stats(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+class LLMOverloaded(Exception):
+    """No LLM slot became free: the wait queue is full or the wait timed out."""
+
+
+class LLMSlot:
+    """A held LLM slot. Releasing is idempotent."""
+
+    def __init__(self, limiter: "LLMConcurrencyLimiter"):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+
+class LLMConcurrencyLimiter:
+    """
+    Caps the LLM generations in flight in this process. Requests beyond the
+    cap wait in a bounded queue for at most `queue_timeout_ms`; when the
+    queue is full they are rejected immediately.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout_ms: Optional[int] = None,
+    ):
+        self.max_in_flight = max_in_flight or settings.LLM_MAX_IN_FLIGHT
+        self.max_queue = max_queue if max_queue is not None else settings.LLM_MAX_QUEUE
+        self.queue_timeout = (queue_timeout_ms or settings.LLM_QUEUE_TIMEOUT_MS) / 1000
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting_seen = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait_ms = 0.0
+
+    async def acquire(self) -> LLMSlot:
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            logger.warning("llm_queue_full", in_flight=self.in_flight, waiting=self.waiting)
+            raise LLMOverloaded()
+
+        started = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.warning("llm_queue_timeout", in_flight=self.in_flight, waiting=self.waiting)
+            raise LLMOverloaded()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        self.total_wait_ms += (time.perf_counter() - started) * 1000
+        return LLMSlot(self)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting_seen,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait_ms / self.admitted, 2) if self.admitted else 0.0,
+        }
+
+
+@lru_cache()
+def get_rate_limiter() -> RateLimiter:
+    if settings.RATE_LIMIT_STORE == "sqlite":
+        return RateLimiter(store=SqliteBucketStore(settings.RATE_LIMIT_SQLITE_PATH))
+    return RateLimiter()
+
+
+@lru_cache()
+def get_llm_limiter() -> LLMConcurrencyLimiter:
+    return LLMConcurrencyLimiter()
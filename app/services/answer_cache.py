@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class SemanticAnswerCache:
+    """
+    In-process cache of RAG answers keyed on the question embedding.
+
+    A lookup is a hit when the cosine similarity between the incoming question
+    and a cached question is above `similarity_threshold`. Entries expire after
+    `ttl_seconds` and the least recently used entry is evicted once
+    `max_entries` is reached.
+
+    Lookups and stores may pass the shared index version (see
+    index_version.py) read before retrieval: a newer version drops every
+    entry, and answers built from an older one are neither served nor stored.
+    """
+
+    def __init__(self, similarity_threshold: float, ttl_seconds: int, max_entries: int):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+        # Stacked, normalized embeddings of the cached questions (rebuilt lazily)
+        self._keys: List[int] = []
+        self._matrix: Optional[np.ndarray] = None
+
+        # Index version the cached answers were generated at
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _rebuild_matrix(self):
+        self._keys = list(self._entries.keys())
+        if self._keys:
+            self._matrix = np.stack([self._entries[k]["embedding"] for k in self._keys])
+        else:
+            self._matrix = None
+
+    def _purge_expired(self, now: float):
+        expired = [k for k, entry in self._entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _sync_version(self, version: Optional[int]) -> bool:
+        """
+        Clears the entries of an older index version. False if `version`
+        itself is older than the cached answers.
+        """
+        if version is None or version == self._version:
+            return True
+        if version < self._version:
+            return False
+        count = len(self._entries)
+        self._entries.clear()
+        self._matrix = None
+        self._version = version
+        if count:
+            logger.info("answer_cache_invalidated", entries=count, version=version)
+        return True
+
+    def lookup(self, embedding, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached result for the most similar question, or None.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            if not self._sync_version(version):
+                self.misses += 1
+                return None
+            self._purge_expired(time.monotonic())
+            if self._matrix is None:
+                self._rebuild_matrix()
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            key = self._keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            entry = self._entries[key]
+
+        logger.debug("answer_cache_hit", similarity=float(similarities[best]), cached_question=entry["question"])
+        return entry["result"]
+
+    def store(self, embedding, question: str, result: Dict[str, Any], version: Optional[int] = None):
+        """
+        Caches `result` for the given question embedding. Results generated
+        at an index version the cache has moved past are dropped.
+        """
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[self._next_key] = {
+                "embedding": self._normalize(embedding),
+                "question": question,
+                "result": result,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "version": self._version,
+            }
+
+
+@lru_cache()
+def get_answer_cache() -> SemanticAnswerCache:
+    return SemanticAnswerCache(
+        similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    )
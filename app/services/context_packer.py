@@ -0,0 +1,91 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.vector_service import RetrievedChunk
+
+# Rough chars-per-token ratio for English news text with Llama tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_document(index: int, document: Document) -> str:
+    """
+    Renders a document as a short citation header followed by its text,
+    instead of the full Document repr with every metadata field.
+    """
+    metadata = document.metadata
+    header = [metadata.get("title"), metadata.get("source")]
+    header.append(metadata.get("published_date") or metadata.get("published"))
+    header = ", ".join(str(part) for part in header if part and part not in ("None", "N/A"))
+    return f"[{index}] {header}\n{document.page_content.strip()}"
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the `{context}` string of the final prompt.
+
+    Chunks keep their retrieval (fused) rank. Anything scoring more than
+    `score_margin` below the best chunk is cut, near-duplicates of an already
+    kept chunk are dropped, and the rest is added until `token_budget` is
+    reached.
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        dedupe_threshold: Optional[float] = None,
+        score_margin: Optional[float] = None,
+    ):
+        self.token_budget = token_budget if token_budget is not None else settings.CONTEXT_TOKEN_BUDGET
+        self.dedupe_threshold = (
+            dedupe_threshold if dedupe_threshold is not None else settings.CONTEXT_DEDUPE_THRESHOLD
+        )
+        self.score_margin = score_margin if score_margin is not None else settings.CONTEXT_SCORE_MARGIN
+
+    def select(self, chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+        """
+        Applies the score cutoff and near-duplicate filter.
+        """
+        if not chunks:
+            return []
+
+        cutoff = max(c.score for c in chunks) - self.score_margin
+        # Exact keyword hits (e.g. names) are kept even when their cosine is low
+        chunks = [c for c in chunks if c.score >= cutoff or c.keyword_match]
+
+        # Pairwise cosine of the (already normalized) chunk embeddings
+        matrix = np.stack([c.embedding for c in chunks])
+        similarities = matrix @ matrix.T
+        kept: List[int] = []
+        for i in range(len(chunks)):
+            if kept and similarities[i, kept].max() >= self.dedupe_threshold:
+                continue
+            kept.append(i)
+        return [chunks[i] for i in kept]
+
+    def pack(self, chunks: List[RetrievedChunk]) -> Tuple[str, List[Document]]:
+        """
+        Returns the formatted context and the documents that made it in.
+        """
+        parts: List[str] = []
+        documents: List[Document] = []
+        used = 0
+        for chunk in self.select(chunks):
+            text = format_document(len(parts) + 1, chunk.document)
+            tokens = estimate_tokens(text)
+            if used + tokens > self.token_budget:
+                if parts:
+                    break
+                # Always send something: trim the best chunk to the budget
+                text = text[: self.token_budget * CHARS_PER_TOKEN]
+                tokens = self.token_budget
+            parts.append(text)
+            documents.append(chunk.document)
+            used += tokens
+        return "\n\n".join(parts), documents
@@ -0,0 +1,149 @@
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import structlog
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import ChatHistory
+from app.db.session import AsyncSessionLocal
+from app.services.admission import LLMConcurrencyLimiter
+from app.services.context_packer import CHARS_PER_TOKEN, estimate_tokens
+from app.services.history_writer import get_history_writer
+from app.services.single_flight import SingleFlight
+
+logger = structlog.get_logger()
+
+
+def truncate_to_tokens(text: str, token_budget: int) -> str:
+    if estimate_tokens(text) <= token_budget:
+        return text
+    cut = text[: token_budget * CHARS_PER_TOKEN]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+class ConversationMemory:
+    """
+    Rolling, token-bounded summary of each conversation (history id).
+
+    A history row holds the last turn of its conversation, and `summary`
+    holds the summary of the turns before it. Nothing is summarized when a
+    turn ends. Only when a follow-up continues the conversation is the last
+    turn folded in, and the caller stores the result with the new turn. So
+    first questions and one-off questions cost no extra LLM call, and
+    neither does a fold that still fits the token budget word for word.
+    Concurrent follow-ups of the same turn share one summarization, which
+    runs under a slot of the given LLM limiter. Folded summaries are kept
+    in an LRU of recently continued conversations.
+    """
+
+    def __init__(
+        self,
+        llm,
+        summary_prompt_template: str,
+        token_budget: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+    ):
+        self.summary_chain = ChatPromptTemplate.from_template(summary_prompt_template) | llm | StrOutputParser()
+        self.token_budget = token_budget or settings.CONVERSATION_SUMMARY_TOKEN_BUDGET
+        self.max_entries = max_entries or settings.CONVERSATION_MEMORY_MAX_ENTRIES
+        self.session_factory = session_factory
+
+        # (history id, fingerprint of its last turn) -> summary including that turn
+        self._folded: "OrderedDict[Tuple[int, str], str]" = OrderedDict()
+        self._flights = SingleFlight()
+
+        self.hits = 0
+        self.misses = 0
+        self.summaries = 0
+        self.failed_summaries = 0
+
+    def _remember(self, key: Tuple[int, str], summary: str):
+        self._folded[key] = summary
+        self._folded.move_to_end(key)
+        while len(self._folded) > self.max_entries:
+            self._folded.popitem(last=False)
+
+    @staticmethod
+    def _turn(question: str, answer: str) -> str:
+        return f"User asked: {question}\nAssistant answered: {answer}"
+
+    async def get(
+        self, history_id: int, user_id: int, limiter: Optional[LLMConcurrencyLimiter] = None
+    ) -> Optional[str]:
+        """
+        Summary of the conversation including its last turn, to answer a
+        follow-up with and to store along with it. None for an unknown (or
+        someone else's) conversation. Must not be called while holding a
+        slot of `limiter`.
+        """
+        if settings.HISTORY_WRITE_BEHIND_ENABLED:
+            # The last turn may still be queued
+            await get_history_writer().flush()
+        async with self.session_factory() as session:
+            row = (await session.execute(
+                select(ChatHistory.summary, ChatHistory.question, ChatHistory.answer)
+                .where(ChatHistory.id == history_id, ChatHistory.user_id == user_id)
+            )).first()
+        if row is None:
+            return None
+        if not row.answer:
+            # A stream that produced nothing: no turn to add
+            return row.summary
+
+        fingerprint = hashlib.sha1(f"{row.summary}\0{row.question}\0{row.answer}".encode("utf-8")).hexdigest()
+        key = (history_id, fingerprint)
+        cached = self._folded.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._folded.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        try:
+            summary = await self._flights.do(
+                f"{history_id}:{fingerprint}", lambda: self._fold(row.summary, row.question, row.answer, limiter)
+            )
+        except Exception as e:
+            # Also LLMOverloaded: continue from the last turn rather than fail the follow-up
+            self.failed_summaries += 1
+            logger.error("conversation_summary_failed", history_id=history_id, error=str(e))
+            return truncate_to_tokens(self._turn(row.question, row.answer), self.token_budget)
+        self._remember(key, summary)
+        return summary
+
+    async def _fold(
+        self, previous: Optional[str], question: str, answer: str, limiter: Optional[LLMConcurrencyLimiter]
+    ) -> str:
+        turn = self._turn(question, answer)
+        combined = f"{previous}\n{turn}" if previous else turn
+        if estimate_tokens(combined) <= self.token_budget:
+            return combined
+
+        slot = await limiter.acquire() if limiter is not None else None
+        try:
+            summary = await self.summary_chain.ainvoke({
+                "summary": previous or "(empty)",
+                "question": question,
+                "answer": answer,
+                "max_words": self.token_budget * 3 // 4,
+            })
+        finally:
+            if slot is not None:
+                slot.release()
+        self.summaries += 1
+        return truncate_to_tokens(summary.strip(), self.token_budget)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._folded),
+            "hits": self.hits,
+            "misses": self.misses,
+            "summaries": self.summaries,
+            "failed_summaries": self.failed_summaries,
+        }
@@ -0,0 +1,255 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+import structlog
+from sqlalchemy import or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from app.core.config import settings
+from app.db.models import Feed
+from app.db.session import AsyncSessionLocal, async_engine
+from app.services.job_queue import JobQueue, get_job_queue
+from app.services.jobs import enqueue_feed_refresh
+
+logger = structlog.get_logger()
+
+# Interval multipliers after a refresh that found new articles / found none
+SPEED_UP = 0.5
+BACK_OFF = 1.5
+
+
+class FeedScheduler:
+    """
+    Refreshes active feeds in the background, each on its own interval.
+
+    Due feeds are not refreshed here: each gets a refresh job on the queue
+    (deduplicated against one already pending), so scheduled and manual
+    refreshes share the job worker's stage -> commit -> embed path and never
+    run side by side for a feed. The job reports back through
+    `record_refresh`: a feed that keeps producing new articles is refreshed
+    more often (down to `min_interval`), a quiet one less often (up to
+    `max_interval`), and a failing one backs off exponentially. Every next
+    run is jittered so feeds do not hit their hosts in lockstep.
+
+    Several API workers may run a scheduler; only the one holding the
+    Postgres advisory lock `lock_key` enqueues, the others retry the lock
+    every tick and take over if the leader goes away.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        engine: AsyncEngine = async_engine,
+        queue: Optional[JobQueue] = None,
+        tick_seconds: Optional[float] = None,
+        default_interval: Optional[int] = None,
+        min_interval: Optional[int] = None,
+        max_interval: Optional[int] = None,
+        jitter: Optional[float] = None,
+        lock_key: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.engine = engine
+        self._queue = queue
+        self.tick_seconds = tick_seconds or settings.SCHEDULER_TICK_SECONDS
+        self.default_interval = default_interval or settings.SCHEDULER_DEFAULT_INTERVAL_SECONDS
+        self.min_interval = min_interval or settings.SCHEDULER_MIN_INTERVAL_SECONDS
+        self.max_interval = max_interval or settings.SCHEDULER_MAX_INTERVAL_SECONDS
+        self.jitter = jitter if jitter is not None else settings.SCHEDULER_JITTER
+        self.lock_key = lock_key or settings.SCHEDULER_LOCK_KEY
+
+        self._lock_conn: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.is_leader = False
+        self.ticks = 0
+        self.enqueued = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.new_articles = 0
+        self.last_tick_at: Optional[datetime] = None
+
+    # --- Scheduling policy ---
+
+    def next_interval(self, current: Optional[int], added: Optional[int], failures: int) -> int:
+        """
+        Seconds until the next refresh. `added` is None when the refresh failed,
+        `failures` counts the failures in a row including this one.
+        """
+        if added is None:
+            interval = self.default_interval * 2 ** min(failures, 16)
+        elif added > 0:
+            interval = (current or self.default_interval) * SPEED_UP
+        else:
+            interval = (current or self.default_interval) * BACK_OFF
+        return int(min(self.max_interval, max(self.min_interval, interval)))
+
+    def _jittered(self, interval: int) -> timedelta:
+        return timedelta(seconds=interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    # --- Leader election ---
+
+    async def _ensure_leader(self) -> bool:
+        if self.engine.dialect.name != "postgresql":
+            # No advisory locks (SQLite in tests): a single process is assumed
+            self.is_leader = True
+            return True
+
+        if self._lock_conn is not None:
+            try:
+                # The lock lives as long as this connection; make sure it still does
+                await self._lock_conn.execute(text("SELECT 1"))
+                await self._lock_conn.commit()
+                return True
+            except Exception as e:
+                logger.warning("scheduler_leadership_lost", error=str(e))
+                await self._release_leadership()
+
+        conn = await self.engine.connect()
+        try:
+            acquired = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key})
+            # Session-level lock: it outlives the transaction, not the connection
+            await conn.commit()
+        except Exception:
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return False
+
+        self._lock_conn = conn
+        self.is_leader = True
+        logger.info("scheduler_leader_elected", lock_key=self.lock_key)
+        return True
+
+    async def _release_leadership(self):
+        conn, self._lock_conn = self._lock_conn, None
+        self.is_leader = False
+        if conn is None:
+            return
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+            await conn.commit()
+        except Exception:
+            pass  # Closing the connection releases it anyway
+        finally:
+            await conn.close()
+
+    # --- Refreshing ---
+
+    @property
+    def queue(self) -> JobQueue:
+        if self._queue is None:
+            self._queue = get_job_queue()
+        return self._queue
+
+    async def due_feeds(self, now: Optional[datetime] = None) -> List[int]:
+        now = now or datetime.utcnow()
+        async with self.session_factory() as session:
+            return list(await session.scalars(
+                select(Feed.id)
+                .where(Feed.is_active == 1, or_(Feed.next_fetch_at.is_(None), Feed.next_fetch_at <= now))
+                .order_by(Feed.next_fetch_at.nulls_first(), Feed.id)
+            ))
+
+    async def record_refresh(self, session: AsyncSession, feed_id: int, added: Optional[int]):
+        """
+        Schedules the next refresh of a feed after one finished with `added`
+        new articles (None when it failed). Joins the caller's transaction,
+        so the schedule lands together with the articles.
+        """
+        feed = await session.get(Feed, feed_id)
+        if feed is None:
+            return
+
+        feed.consecutive_failures = 0 if added is not None else (feed.consecutive_failures or 0) + 1
+        feed.refresh_interval_seconds = self.next_interval(
+            feed.refresh_interval_seconds, added, feed.consecutive_failures
+        )
+        feed.next_fetch_at = datetime.utcnow() + self._jittered(feed.refresh_interval_seconds)
+
+        if added is None:
+            self.failed += 1
+        else:
+            self.refreshed += 1
+            self.new_articles += added
+        logger.info(
+            "feed_scheduled",
+            feed_id=feed_id,
+            new_articles=added,
+            interval_seconds=feed.refresh_interval_seconds,
+            failures=feed.consecutive_failures,
+        )
+
+    async def run_once(self) -> int:
+        """
+        One tick: queues a refresh of every due feed if this process is the
+        leader. Returns the number of feeds queued.
+        """
+        self.ticks += 1
+        self.last_tick_at = datetime.utcnow()
+        if not await self._ensure_leader():
+            return 0
+
+        feed_ids = await self.due_feeds()
+        if not feed_ids:
+            return 0
+
+        for feed_id in feed_ids:
+            await enqueue_feed_refresh(self.queue, feed_id)
+        self.enqueued += len(feed_ids)
+
+        # Not due again while the job runs; record_refresh sets the real next run
+        async with self.session_factory() as session:
+            intervals = dict((await session.execute(
+                select(Feed.id, Feed.refresh_interval_seconds).where(Feed.id.in_(feed_ids))
+            )).all())
+            for feed_id, interval in intervals.items():
+                await session.execute(
+                    update(Feed)
+                    .where(Feed.id == feed_id)
+                    .values(next_fetch_at=self.last_tick_at + self._jittered(interval or self.default_interval))
+                )
+            await session.commit()
+        return len(feed_ids)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("scheduler_tick_failed", error=str(e))
+            await asyncio.sleep(self.tick_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._release_leadership()
+
+    def stats(self) -> dict:
+        return {
+            "leader": self.is_leader,
+            "ticks": self.ticks,
+            "enqueued": self.enqueued,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "new_articles": self.new_articles,
+            "last_tick_at": self.last_tick_at.isoformat() if self.last_tick_at else None,
+        }
+
+
+@lru_cache()
+def get_feed_scheduler() -> FeedScheduler:
+    return FeedScheduler()
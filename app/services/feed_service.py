@@ -1,93 +1,186 @@
+import asyncio
 import structlog
-from typing import List
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
+from typing import List, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 
 from app.db.models import Feed, Article
-from app.services.rss_fetcher import RSSFetcher
-from app.services.vector_service import VectorService
+from app.services.rss_fetcher import FeedFetchError, FetchResult, RSSFetcher, get_rss_fetcher
+from app.services.vector_service import VectorService, get_vector_service
+from app.services.index_version import bump_index_version, get_index_version
+from app.services.ingest_pipeline import Chunk, IngestPipeline
+from app.services.lexical_index import get_lexical_index
 from langchain_core.documents import Document
 
 logger = structlog.get_logger()
 
+# Dialects with INSERT ... ON CONFLICT DO NOTHING ... RETURNING
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+# Rows per multi-VALUES statement, well under the bind parameter limits
+INSERT_CHUNK_SIZE = 500
+
 class FeedService:
-    def __init__(self, db: Session, rss_fetcher: RSSFetcher = None, vector_service: VectorService = None):
+    def __init__(self, db: AsyncSession, rss_fetcher: RSSFetcher = None, vector_service: VectorService = None):
         self.db = db
-        self.rss_fetcher = rss_fetcher or RSSFetcher()
-        self.vector_service = vector_service or VectorService()
+        self.rss_fetcher = rss_fetcher or get_rss_fetcher()
+        self._vector_service = vector_service
+
+    @property
+    def vector_service(self) -> VectorService:
+        # Looked up on first use: listing, creating or deleting feeds never opens Chroma
+        if self._vector_service is None:
+            self._vector_service = get_vector_service()
+        return self._vector_service
 
-    def update_feed_articles(self, feed_id: int) -> int:
+    async def stage_fetch_result(self, feed: Feed, result: FetchResult) -> List[int]:
         """
-        Fetches the feed, saves new articles to DB, and embeds them.
-        Returns the number of new articles added.
+        Inserts the new articles and records the download on the feed without
+        committing or embedding, so the caller can commit them together with
+        its own bookkeeping and embed them afterwards with `embed_articles`,
+        outside the transaction (see RefreshFeedJob). Returns the new article ids.
         """
-        feed = self.db.query(Feed).filter(Feed.id == feed_id).first()
-        if not feed:
-            raise ValueError(f"Feed with id {feed_id} not found")
+        if result.error:
+            raise FeedFetchError(result.error)
+        feed.last_fetched = datetime.utcnow()
+        if result.not_modified:
+            # 304: nothing was downloaded or parsed
+            return []
+
+        rows = self._article_rows(feed, result.entries)
+
+        # Only the rows that were actually inserted come back, already-known URLs are skipped
+        inserted = await self._insert_new_articles(rows) if rows else []
+
+        # Validators for the next conditional GET
+        feed.etag = result.etag
+        feed.last_modified = result.last_modified
+        return [article_id for article_id, _ in inserted]
+
+    async def embed_articles(self, article_ids: List[int]) -> int:
+        """
+        Embeds already stored articles. Chunk ids derive from the article id,
+        so embedding an article again overwrites its chunks.
+        """
+        rows = (await self.db.execute(
+            select(Article, Feed).join(Feed, Article.feed_id == Feed.id).where(Article.id.in_(article_ids))
+        )).all()
+        documents = [
+            self._document(feed, article.id, article.title, article.content, article.url, article.published_date)
+            for article, feed in rows
+        ]
+        # Release the connection before the slow part
+        await self.db.commit()
+
+        if documents:
+            await self._embed(documents)
+            await self.db.commit()
+            self._committed(documents)
+        return len(documents)
+
+    @staticmethod
+    def _document(feed: Feed, article_id: int, title: str, content: str, url: str, published_date) -> Document:
+        # We store metadata to help with filtering/retrieval later
+        return Document(
+            id=f"article-{article_id}",
+            page_content=f"{title}\n\n{content}",
+            metadata={
+                "source": feed.name,
+                "url": url,
+                "category": feed.category,
+                "published_date": str(published_date),
+                "feed_id": feed.id,
+                "article_id": article_id
+            }
+        )
+
+    async def _embed(self, documents: List[Document]):
+        # Chunked, deduplicated and embedded in bounded batches, like scripts/ingest_data.py
+        async def embed(texts: List[str]) -> List[List[float]]:
+            return await asyncio.to_thread(self.vector_service.embed_documents, texts)
 
-        entries = self.rss_fetcher.fetch(feed.url)
-        new_articles_count = 0
-        documents_to_embed = []
+        async def write(chunks: List[Chunk], vectors: List[List[float]]):
+            await asyncio.to_thread(self.vector_service.add_documents, [chunk.to_document() for chunk in chunks], vectors)
 
+        totals = await IngestPipeline(embed, write).run(documents)
+        logger.info("articles_embedded", count=len(documents), chunks=totals["embedded"], feed=documents[0].metadata["source"])
+        # Answers cached by any worker were generated without these articles; visible once committed
+        await bump_index_version(self.db)
+
+    @staticmethod
+    def _committed(documents: List[Document]):
+        # This process doesn't wait for its next poll of the version it just bumped
+        get_index_version().expire()
+        # Keep the BM25 index in step with the committed articles
+        get_lexical_index().add_many(
+            (doc.metadata["article_id"], doc.page_content) for doc in documents
+        )
+
+    @staticmethod
+    def _article_rows(feed: Feed, entries) -> List[dict]:
+        """
+        One insertable row per distinct entry URL.
+        """
+        rows = {}
         for entry in entries:
-            # Check if article already exists
-            existing = self.db.query(Article).filter(Article.url == entry.link).first()
-            if existing:
+            url = entry.get("link")
+            if not url or url in rows:
                 continue
 
-            # Create new article
             published = None
-            if hasattr(entry, "published_parsed"):
-                published = datetime(*entry.published_parsed[:6], tzinfo=timezone.utc)
-            
-            article = Article(
-                title=entry.title,
-                content=entry.get("summary", "") or entry.get("description", ""),
-                url=entry.link,
-                published_date=published,
-                feed_id=feed.id
-            )
-            self.db.add(article)
-            self.db.flush() # Get ID
-            
-            new_articles_count += 1
-            
-            # Prepare for vector store
-            # We store metadata to help with filtering/retrieval later
-            doc = Document(
-                page_content=f"{article.title}\n\n{article.content}",
-                metadata={
-                    "source": feed.name,
-                    "url": article.url,
-                    "category": feed.category,
-                    "published_date": str(article.published_date),
-                    "feed_id": feed.id,
-                    "article_id": article.id
-                }
-            )
-            documents_to_embed.append(doc)
-
-        if documents_to_embed:
-            self.vector_service.add_documents(documents_to_embed)
-            logger.info("articles_embedded", count=len(documents_to_embed), feed=feed.name)
-
-        feed.last_fetched = datetime.now(timezone.utc)
-        self.db.commit()
-        
-        return new_articles_count
-
-    def create_feed(self, name: str, url: str, category: str) -> Feed:
+            if entry.get("published_parsed"):
+                # Naive UTC like every DateTime column: asyncpg rejects aware values there
+                published = datetime(*entry.published_parsed[:6])
+
+            rows[url] = {
+                "title": entry.get("title", ""),
+                "content": entry.get("summary", "") or entry.get("description", ""),
+                "url": url,
+                "published_date": published,
+                "feed_id": feed.id,
+            }
+        return list(rows.values())
+
+    async def _insert_new_articles(self, rows: List[dict]) -> List[Tuple[int, str]]:
+        """
+        Inserts the rows whose URL is not stored yet and returns their (id, url).
+        """
+        dialect = self.db.get_bind().dialect.name
+        if dialect in UPSERT_INSERTS:
+            # INSERT ... ON CONFLICT (url) DO NOTHING RETURNING id, url: one statement per chunk
+            inserted = []
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                statement = (
+                    UPSERT_INSERTS[dialect](Article)
+                    .values(rows[start:start + INSERT_CHUNK_SIZE])
+                    .on_conflict_do_nothing(index_elements=["url"])
+                    .returning(Article.id, Article.url)
+                )
+                inserted += (await self.db.execute(statement)).all()
+            return [tuple(row) for row in inserted]
+
+        # Other databases: drop known URLs with one IN query, then insert the rest in bulk
+        known = set(await self.db.scalars(select(Article.url).where(Article.url.in_([row["url"] for row in rows]))))
+        new_rows = [row for row in rows if row["url"] not in known]
+        if not new_rows:
+            return []
+        result = await self.db.execute(insert(Article).returning(Article.id, Article.url), new_rows)
+        return [tuple(row) for row in result.all()]
+
+    async def create_feed(self, name: str, url: str, category: str) -> Feed:
         feed = Feed(name=name, url=url, category=category)
         self.db.add(feed)
-        self.db.commit()
-        self.db.refresh(feed)
+        await self.db.commit()
+        await self.db.refresh(feed)
         return feed
 
-    def get_feeds(self) -> List[Feed]:
-        return self.db.query(Feed).all()
+    async def get_feeds(self) -> List[Feed]:
+        return list(await self.db.scalars(select(Feed)))
 
-    def delete_feed(self, feed_id: int):
-        feed = self.db.query(Feed).filter(Feed.id == feed_id).first()
+    async def delete_feed(self, feed_id: int):
+        feed = await self.db.get(Feed, feed_id)
         if feed:
-            self.db.delete(feed)
-            self.db.commit()
+            await self.db.delete(feed)
+            await self.db.commit()
@@ -0,0 +1,253 @@
+import asyncio
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+import structlog
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import ChatHistory
+from app.db.session import AsyncSessionLocal
+
+logger = structlog.get_logger()
+
+
+class HistoryWriter:
+    """
+    Write-behind persistence for ChatHistory.
+
+    IDs are handed out from blocks reserved up front, so a request learns its
+    history id without touching the database. Inserts and updates are queued
+    in memory, merged per row (a stream's stub and its final answer become one
+    insert) and written in batched statements on a timer or once `max_batch`
+    rows are pending. `stop()` drains whatever is still queued.
+
+    When a batch is rejected because of its data, its rows are retried one
+    by one, so a single bad row (say, of a user deleted meanwhile) cannot
+    hold back the rest. A row that keeps failing is dropped, and logged,
+    after `max_row_attempts` flushes.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        max_batch: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+        id_block_size: Optional[int] = None,
+        max_row_attempts: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch or settings.HISTORY_FLUSH_MAX_BATCH
+        self.flush_interval = (flush_interval_ms or settings.HISTORY_FLUSH_INTERVAL_MS) / 1000
+        self.id_block_size = id_block_size or settings.HISTORY_ID_BLOCK_SIZE
+        self.max_row_attempts = max_row_attempts or settings.HISTORY_ROW_MAX_ATTEMPTS
+
+        self._inserts: Dict[int, Dict[str, Any]] = {}
+        self._updates: Dict[int, Dict[str, Any]] = {}
+        self._ids: List[int] = []
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._high_water = 0  # Only used by the non-Postgres allocator
+        self._row_failures: Dict[int, int] = {}  # history id -> failed single-row writes
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+
+    # --- ID allocation ---
+
+    async def _reserve_ids(self, session: AsyncSession) -> List[int]:
+        if session.bind.dialect.name == "postgresql":
+            # One round trip reserves a whole block from the table's own sequence,
+            # so ids never collide with rows inserted elsewhere
+            result = await session.execute(
+                text("SELECT nextval(pg_get_serial_sequence('chat_history', 'id')) FROM generate_series(1, :n)"),
+                {"n": self.id_block_size},
+            )
+            return [row[0] for row in result]
+
+        # No sequences (SQLite in tests): continue after the highest id, single process only
+        current = await session.scalar(select(func.max(ChatHistory.id))) or 0
+        start = max(current, self._high_water) + 1
+        self._high_water = start + self.id_block_size - 1
+        return list(range(start, self._high_water + 1))
+
+    async def allocate_id(self) -> int:
+        if not self._ids:
+            async with self._id_lock:
+                if not self._ids:
+                    async with self.session_factory() as session:
+                        self._ids = await self._reserve_ids(session)
+        return self._ids.pop(0)
+
+    # --- Queueing ---
+
+    def owner_of(self, history_id: int) -> Optional[int]:
+        """
+        User id of a row that is queued but not written yet, if any.
+        """
+        row = self._inserts.get(history_id)
+        return row["user_id"] if row else None
+
+    def insert(self, history_id: int, user_id: int, question: str, answer: str):
+        self._inserts[history_id] = {
+            "id": history_id,
+            "user_id": user_id,
+            "question": question,
+            "answer": answer,
+            "timestamp": datetime.utcnow(),
+        }
+        self._queued()
+
+    def update(self, history_id: int, touch: bool = True, **values: Any):
+        if touch:
+            values["timestamp"] = datetime.utcnow()
+        if history_id in self._inserts:
+            # Not written yet: fold the change into the pending insert
+            self._inserts[history_id].update(values)
+            return
+        self._updates.setdefault(history_id, {"id": history_id}).update(values)
+        self._queued()
+
+    def _queued(self):
+        if len(self._inserts) + len(self._updates) >= self.max_batch:
+            self._wakeup.set()
+
+    # --- Flushing ---
+
+    async def flush(self):
+        async with self._flush_lock:
+            inserts, self._inserts = self._inserts, {}
+            updates, self._updates = self._updates, {}
+            if not inserts and not updates:
+                return
+
+            started = time.perf_counter()
+            try:
+                await self._write(inserts, updates)
+            except (IntegrityError, DataError) as e:
+                # Some row is bad: write the others and isolate it
+                self.failed_flushes += 1
+                logger.error("history_flush_failed", error=str(e), inserts=len(inserts), updates=len(updates))
+                await self._write_rows(inserts, updates)
+                return
+            except Exception as e:
+                # Database unreachable or similar: keep everything for the next tick
+                self.failed_flushes += 1
+                logger.error("history_flush_failed", error=str(e), inserts=len(inserts), updates=len(updates))
+                self._requeue(inserts, updates)
+                raise
+
+            self.flushes += 1
+            self.rows_written += len(inserts) + len(updates)
+            for history_id in (*inserts, *updates):
+                self._row_failures.pop(history_id, None)
+            logger.debug(
+                "history_flushed",
+                inserts=len(inserts),
+                updates=len(updates),
+                ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+
+    async def _write(self, inserts: Dict[int, Dict[str, Any]], updates: Dict[int, Dict[str, Any]]):
+        async with self.session_factory() as session:
+            if inserts:
+                await session.execute(insert(ChatHistory), list(inserts.values()))
+            # Bulk UPDATE by primary key, grouped by the set of columns changed
+            for columns in {tuple(sorted(row)) for row in updates.values()}:
+                rows = [row for row in updates.values() if tuple(sorted(row)) == columns]
+                await session.execute(update(ChatHistory), rows)
+            await session.commit()
+
+    async def _write_rows(self, inserts: Dict[int, Dict[str, Any]], updates: Dict[int, Dict[str, Any]]):
+        """
+        Writes each row in its own transaction. Failed rows are queued again
+        until they have failed `max_row_attempts` times, then dropped.
+        """
+        rows = [({history_id: row}, {}) for history_id, row in inserts.items()]
+        rows += [({}, {history_id: row}) for history_id, row in updates.items()]
+        for row_inserts, row_updates in rows:
+            history_id = next(iter(row_inserts or row_updates))
+            try:
+                await self._write(row_inserts, row_updates)
+            except Exception as e:
+                failures = self._row_failures.get(history_id, 0) + 1
+                if failures < self.max_row_attempts:
+                    self._row_failures[history_id] = failures
+                    self._requeue(row_inserts, row_updates)
+                    continue
+                self._row_failures.pop(history_id, None)
+                self.dropped_rows += 1
+                # Later changes to the same row would fail the same way
+                self._updates.pop(history_id, None)
+                logger.error(
+                    "history_row_dropped",
+                    history_id=history_id,
+                    row={**row_inserts, **row_updates}[history_id],
+                    attempts=failures,
+                    error=str(e),
+                )
+                continue
+            self._row_failures.pop(history_id, None)
+            self.rows_written += 1
+
+    def _requeue(self, inserts: Dict[int, Dict[str, Any]], updates: Dict[int, Dict[str, Any]]):
+        # Changes queued while the flush was running are newer, they win
+        for history_id, row in inserts.items():
+            row.update(self._updates.pop(history_id, {}))
+            self._inserts[history_id] = row
+        for history_id, row in updates.items():
+            row.update(self._updates.get(history_id, {}))
+            self._updates[history_id] = row
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Already logged and re-queued; back off until the next tick
+                await asyncio.sleep(self.flush_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.error("history_drain_failed", dropped=len(self._inserts) + len(self._updates))
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._inserts) + len(self._updates),
+            "reserved_ids": len(self._ids),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+        }
+
+
+@lru_cache()
+def get_history_writer() -> HistoryWriter:
+    return HistoryWriter()
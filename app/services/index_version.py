@@ -0,0 +1,95 @@
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+import structlog
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.models import IndexVersion
+from app.db.session import AsyncSessionLocal
+
+logger = structlog.get_logger()
+
+ARTICLES = "articles"
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+async def bump_index_version(db: AsyncSession, name: str = ARTICLES):
+    """
+    Increments the shared version of an index inside the caller's
+    transaction: readers in every process see it once that commits.
+    """
+    now = datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+    if dialect in UPSERT_INSERTS:
+        statement = (
+            UPSERT_INSERTS[dialect](IndexVersion)
+            .values(name=name, version=1, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=[IndexVersion.name],
+                set_={"version": IndexVersion.version + 1, "updated_at": now},
+            )
+        )
+        await db.execute(statement)
+        return
+
+    result = await db.execute(
+        update(IndexVersion).where(IndexVersion.name == name).values(version=IndexVersion.version + 1, updated_at=now)
+    )
+    if not result.rowcount:
+        await db.execute(insert(IndexVersion).values(name=name, version=1, updated_at=now))
+
+
+class IndexVersionReader:
+    """
+    Reads the shared version of an index from the database.
+
+    Per-process caches derived from the articles (answers, BM25 postings,
+    centroids) compare it with the version they were built at, so an ingest
+    in any worker or replica reaches all of them. A read is reused for
+    `poll_seconds`; `expire` forces the next call to go to the database.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[async_sessionmaker] = None,
+        poll_seconds: Optional[float] = None,
+        name: str = ARTICLES,
+    ):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.poll_seconds = settings.INDEX_VERSION_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.name = name
+
+        self._version = 0
+        self._read_at: Optional[float] = None
+
+    async def current(self) -> int:
+        now = time.monotonic()
+        if self._read_at is not None and now - self._read_at < self.poll_seconds:
+            return self._version
+        try:
+            async with self.session_factory() as db:
+                version = await db.scalar(select(IndexVersion.version).where(IndexVersion.name == self.name))
+        except Exception as e:
+            # Keep answering with the last known version, the next call retries
+            logger.error("index_version_read_error", index=self.name, error=str(e))
+            return self._version
+        # Never goes back, even if a replica reads from a lagging database
+        self._version = max(self._version, version or 0)
+        self._read_at = now
+        return self._version
+
+    def expire(self):
+        self._read_at = None
+
+
+@lru_cache()
+def get_index_version() -> IndexVersionReader:
+    return IndexVersionReader()
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import html
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Set, Union
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+from app.services.rss_fetcher import FeedFetchError, RSSFetcher
+
+_DONE = object()  # End of stream marker between stages
+_TAGS = re.compile(r"<[^>]+>")
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    metadata: dict
+
+    def to_document(self) -> Document:
+        return Document(id=self.id, page_content=self.text, metadata=self.metadata)
+
+
+# (chunks) -> the chunks to embed; embed(texts) -> vectors; write(chunks, vectors)
+SelectFn = Callable[[List[Chunk]], Awaitable[List[Chunk]]]
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+WriteFn = Callable[[List[Chunk], List[List[float]]], Awaitable[None]]
+
+
+def clean_text(text: str) -> str:
+    """
+    Plain text for chunking: markup stripped, entities decoded, runs of
+    whitespace collapsed. Paragraph breaks are kept for the splitter.
+    """
+    text = unicodedata.normalize("NFC", html.unescape(_TAGS.sub(" ", text)))
+    text = re.sub(r"[^\S\n]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def chunk_documents(documents: List[Document], chunk_size: int, chunk_overlap: int) -> List[Chunk]:
+    """
+    Normalizes and splits documents. Chunk ids are `{document id}-{position}`,
+    so the same text always gets the same ids. Module level so that it can
+    run in a process pool.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+    chunks = []
+    for doc in documents:
+        for index, text in enumerate(splitter.split_text(clean_text(doc.page_content))):
+            chunks.append(Chunk(f"{doc.id}-{index}", text, {**doc.metadata, "chunk": index}))
+    return chunks
+
+
+async def fetch_documents(
+    fetcher: RSSFetcher, url: str, to_document: Callable[[dict], Document]
+) -> AsyncIterator[Document]:
+    """
+    Fetch stage for a feed that is not tracked in the database: downloads it
+    and yields one document per entry. Raises FeedFetchError when the
+    download fails.
+    """
+    result = await fetcher.fetch(url)
+    if result.error:
+        raise FeedFetchError(result.error)
+    for entry in result.entries:
+        yield to_document(entry)
+
+
+async def _aiter(documents: Union[Iterable[Document], AsyncIterable[Document]]) -> AsyncIterator[Document]:
+    if hasattr(documents, "__aiter__"):
+        async for doc in documents:
+            yield doc
+    else:
+        for doc in documents:
+            yield doc
+
+
+class IngestPipeline:
+    """
+    Streams documents through chunk -> dedupe -> embed -> write.
+
+    Each stage is a task joined to the next by a bounded queue, so when a
+    stage falls behind (usually embedding) the earlier ones wait instead of
+    piling up chunks: memory depends on the queue and batch sizes, not on
+    how many documents come in. Documents are chunked `group_size` at a
+    time and all chunks of a document travel together until they are
+    selected, so `select` (e.g. a comparison with the store) sees whole
+    documents. Embedding runs in batches of `batch_size` texts, up to
+    `embed_concurrency` at a time.
+    """
+
+    def __init__(
+        self,
+        embed: EmbedFn,
+        write: WriteFn,
+        select: Optional[SelectFn] = None,
+        executor: Optional[Executor] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        group_size: int = 16,
+        embed_concurrency: int = 1,
+        dedupe_window: Optional[int] = None,
+    ):
+        self.embed = embed
+        self.write = write
+        self.select = select
+        self.executor = executor  # For chunking; None is the default thread pool
+        self.chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+        self.chunk_overlap = settings.INGEST_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        self.batch_size = batch_size or settings.INGEST_EMBED_BATCH_SIZE
+        self.queue_size = queue_size or settings.INGEST_QUEUE_SIZE
+        self.group_size = group_size
+        self.embed_concurrency = embed_concurrency
+        self.dedupe_window = dedupe_window or settings.INGEST_DEDUPE_WINDOW
+
+        # Recently seen chunk ids and text hashes, oldest first
+        self._seen: "OrderedDict[Union[str, bytes], None]" = OrderedDict()
+        self.totals: Counter = Counter()
+
+    async def run(self, documents: Union[Iterable[Document], AsyncIterable[Document]]) -> Counter:
+        """
+        Ingests the documents and returns the totals (documents, chunks,
+        duplicates, selected, embedded, seconds). The first stage error
+        stops the whole pipeline and is raised.
+        """
+        started = time.perf_counter()
+        chunked, selected, embedded = (asyncio.Queue(self.queue_size) for _ in range(3))
+        tasks = [
+            asyncio.create_task(self._chunk(documents, chunked)),
+            asyncio.create_task(self._dedupe(chunked, selected)),
+            asyncio.create_task(self._embed(selected, embedded)),
+            asyncio.create_task(self._write(embedded)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.totals["seconds"] = time.perf_counter() - started
+        return self.totals
+
+    async def _chunk(self, documents, out: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        group: List[Document] = []
+
+        async def flush():
+            chunks = await loop.run_in_executor(
+                self.executor, chunk_documents, group, self.chunk_size, self.chunk_overlap
+            )
+            self.totals.update(documents=len(group), chunks=len(chunks))
+            await out.put(chunks)
+
+        async for doc in _aiter(documents):
+            group.append(doc)
+            if len(group) >= self.group_size:
+                await flush()
+                group = []
+        if group:
+            await flush()
+        await out.put(_DONE)
+
+    def _first_seen(self, chunk: Chunk) -> bool:
+        # By id (an article listed twice) and by text (the same story under two URLs)
+        keys = (chunk.id, hashlib.blake2b(chunk.text.encode("utf-8"), digest_size=16).digest())
+        seen = [key for key in keys if key in self._seen]
+        for key in seen:
+            self._seen.move_to_end(key)
+        if seen:
+            return False
+        for key in keys:
+            self._seen[key] = None
+        while len(self._seen) > self.dedupe_window:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _dedupe(self, inp: asyncio.Queue, out: asyncio.Queue):
+        while (chunks := await inp.get()) is not _DONE:
+            unique = [chunk for chunk in chunks if self._first_seen(chunk)]
+            self.totals["duplicates"] += len(chunks) - len(unique)
+            if self.select is not None:
+                unique = await self.select(unique)
+            self.totals["selected"] += len(unique)
+            if unique:
+                await out.put(unique)
+        await out.put(_DONE)
+
+    async def _embed(self, inp: asyncio.Queue, out: asyncio.Queue):
+        slots = asyncio.Semaphore(self.embed_concurrency)
+        tasks: Set[asyncio.Task] = set()
+
+        async def embed_batch(batch: List[Chunk]):
+            try:
+                vectors = await self.embed([chunk.text for chunk in batch])
+                await out.put((batch, vectors))
+            finally:
+                slots.release()
+
+        async def submit(batch: List[Chunk]):
+            await slots.acquire()
+            for task in [task for task in tasks if task.done()]:
+                tasks.discard(task)
+                task.result()  # Raises the failure of an earlier batch
+            tasks.add(asyncio.create_task(embed_batch(batch)))
+
+        pending: List[Chunk] = []
+        try:
+            while (chunks := await inp.get()) is not _DONE:
+                pending.extend(chunks)
+                while len(pending) >= self.batch_size:
+                    await submit(pending[:self.batch_size])
+                    pending = pending[self.batch_size:]
+            if pending:
+                await submit(pending)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        await out.put(_DONE)
+
+    async def _write(self, inp: asyncio.Queue):
+        while (item := await inp.get()) is not _DONE:
+            batch, vectors = item
+            await self.write(batch, vectors)
+            self.totals["embedded"] += len(batch)
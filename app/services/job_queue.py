@@ -0,0 +1,358 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import structlog
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Job
+from app.db.session import AsyncSessionLocal
+
+logger = structlog.get_logger()
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class PermanentJobError(Exception):
+    """The job can never succeed (e.g. its feed was deleted): fail it without retrying."""
+
+
+class JobLeaseLost(Exception):
+    """The job's lease expired and it was handed to another worker: this one must drop it."""
+
+
+class JobQueue:
+    """
+    A durable queue on the `jobs` table.
+
+    Workers claim the oldest due job with `SELECT ... FOR UPDATE SKIP LOCKED`
+    on Postgres, so concurrent workers never wait on or take the same row;
+    the claim is a guarded UPDATE, which also keeps SQLite (no row locks)
+    correct. Failed attempts are retried with exponential backoff via
+    `run_at`, and a running job whose worker stops checkpointing for
+    `lease_seconds` is handed to another worker.
+
+    Every write a worker makes about a claimed job is guarded by the claim
+    (`locked_by` and `attempts`, which each claim increments), so a worker
+    whose lease expired cannot overwrite the new owner's progress or
+    outcome; it gets JobLeaseLost instead. A partial unique index allows
+    one pending job per dedupe key, so concurrent enqueues cannot both insert.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        max_attempts: Optional[int] = None,
+        retry_base_seconds: Optional[float] = None,
+        retry_max_seconds: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        self.retry_base_seconds = retry_base_seconds or settings.JOB_RETRY_BASE_SECONDS
+        self.retry_max_seconds = retry_max_seconds or settings.JOB_RETRY_MAX_SECONDS
+        self.lease_seconds = lease_seconds or settings.JOB_LEASE_SECONDS
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        dedupe_key: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+    ) -> Job:
+        """
+        Queues a job. With a `dedupe_key`, a job with the same key that is
+        still queued or running is returned instead of a new one.
+        """
+        async with self.session_factory() as session:
+            if dedupe_key is not None:
+                pending = await self._pending(session, dedupe_key)
+                if pending is not None:
+                    return pending
+
+            job = Job(
+                kind=kind,
+                payload=payload,
+                dedupe_key=dedupe_key,
+                status=QUEUED,
+                attempts=0,
+                max_attempts=max_attempts or self.max_attempts,
+                run_at=datetime.utcnow(),
+            )
+            session.add(job)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # A concurrent enqueue with the same key got in first (uq_jobs_pending_dedupe_key)
+                await session.rollback()
+                pending = await self._pending(session, dedupe_key) if dedupe_key is not None else None
+                if pending is None:
+                    raise
+                return pending
+            logger.info("job_enqueued", job_id=job.id, kind=kind)
+            return job
+
+    @staticmethod
+    async def _pending(session: AsyncSession, dedupe_key: str) -> Optional[Job]:
+        return await session.scalar(
+            select(Job).where(Job.dedupe_key == dedupe_key, Job.status.in_((QUEUED, RUNNING)))
+        )
+
+    @staticmethod
+    def _owned(job: Job) -> tuple:
+        # Still running under the claim this worker made
+        return (Job.id == job.id, Job.status == RUNNING, Job.locked_by == job.locked_by, Job.attempts == job.attempts)
+
+    async def get(self, job_id: int) -> Optional[Job]:
+        async with self.session_factory() as session:
+            return await session.get(Job, job_id)
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        """
+        Marks the oldest due job as running for `worker_id` and returns it,
+        or None when nothing is due.
+        """
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            job_id = await session.scalar(
+                select(Job.id)
+                .where(Job.status == QUEUED, Job.run_at <= now)
+                .order_by(Job.run_at, Job.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if job_id is None:
+                return None
+
+            claimed = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == QUEUED)
+                .values(status=RUNNING, attempts=Job.attempts + 1, locked_by=worker_id, locked_at=now)
+            )
+            await session.commit()
+            if claimed.rowcount != 1:
+                # Another worker got there first (SQLite only)
+                return None
+            return await session.get(Job, job_id, populate_existing=True)
+
+    async def checkpoint(self, job: Job, progress: Dict[str, Any], session: Optional[AsyncSession] = None):
+        """
+        Records progress and renews the lease of a claimed job. Given a
+        session, the update joins its transaction (and is committed by the
+        caller), so the progress and the work it describes land atomically.
+        Raises JobLeaseLost when the job is no longer this claim's.
+        """
+        statement = (
+            update(Job)
+            .where(*self._owned(job))
+            .values(progress=progress, locked_at=datetime.utcnow())
+        )
+        if session is not None:
+            updated = await session.execute(statement)
+        else:
+            async with self.session_factory() as own_session:
+                updated = await own_session.execute(statement)
+                await own_session.commit()
+        if updated.rowcount != 1:
+            raise JobLeaseLost(job.id)
+
+    async def succeed(self, job: Job, result: Optional[Dict[str, Any]] = None):
+        await self._finish(job, status=SUCCEEDED, result=result, error=None)
+
+    async def fail(self, job: Job, error: str, permanent: bool = False) -> bool:
+        """
+        Records a failed attempt of a claimed job. It is queued again after
+        a backoff unless the failure is permanent or its attempts are used
+        up. Returns True when it will be retried.
+        """
+        retry = not permanent and job.attempts < job.max_attempts
+        if retry:
+            values = dict(status=QUEUED, run_at=datetime.utcnow() + timedelta(seconds=self.retry_delay(job.attempts)))
+        else:
+            values = dict(status=FAILED, finished_at=datetime.utcnow())
+        async with self.session_factory() as session:
+            updated = await session.execute(
+                update(Job).where(*self._owned(job)).values(error=error, locked_by=None, locked_at=None, **values)
+            )
+            await session.commit()
+        if updated.rowcount != 1:
+            raise JobLeaseLost(job.id)
+        logger.warning("job_failed", job_id=job.id, kind=job.kind, attempts=job.attempts, retry=retry, error=error)
+        return retry
+
+    async def release(self, job: Job):
+        """
+        Puts a job that was interrupted (worker shutdown) back in the queue
+        without counting the attempt. No-op when the lease was lost already.
+        """
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Job)
+                .where(*self._owned(job))
+                .values(status=QUEUED, attempts=Job.attempts - 1, locked_by=None, locked_at=None)
+            )
+            await session.commit()
+
+    async def requeue_expired(self) -> int:
+        """
+        Hands running jobs whose lease expired (their worker died) back to
+        the queue, or fails them when their attempts are used up.
+        """
+        expired_before = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        expired = (Job.status == RUNNING, Job.locked_at < expired_before)
+        async with self.session_factory() as session:
+            failed = await session.execute(
+                update(Job)
+                .where(*expired, Job.attempts >= Job.max_attempts)
+                .values(status=FAILED, error="lease expired", finished_at=datetime.utcnow(), locked_by=None)
+            )
+            requeued = await session.execute(
+                update(Job)
+                .where(*expired)
+                .values(status=QUEUED, run_at=datetime.utcnow(), locked_by=None, locked_at=None)
+            )
+            await session.commit()
+        if failed.rowcount or requeued.rowcount:
+            logger.warning("job_leases_expired", requeued=requeued.rowcount, failed=failed.rowcount)
+        return requeued.rowcount
+
+    async def counts(self) -> Dict[str, int]:
+        async with self.session_factory() as session:
+            rows = await session.execute(select(Job.status, func.count()).group_by(Job.status))
+            return {status: count for status, count in rows}
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.retry_max_seconds, self.retry_base_seconds * 2 ** max(attempts - 1, 0))
+
+    async def _finish(self, job: Job, **values):
+        async with self.session_factory() as session:
+            updated = await session.execute(
+                update(Job)
+                .where(*self._owned(job))
+                .values(finished_at=datetime.utcnow(), locked_by=None, locked_at=None, **values)
+            )
+            await session.commit()
+        if updated.rowcount != 1:
+            raise JobLeaseLost(job.id)
+
+
+JobHandler = Callable[[Job, JobQueue], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class JobWorker:
+    """
+    Runs queued jobs: `concurrency` loops that each claim a job, run the
+    handler registered for its kind and record the outcome. Handlers report
+    progress with `queue.checkpoint`; whatever they return is the job result.
+    A job whose lease was lost meanwhile is left to its new owner.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: Optional[int] = None,
+        poll_interval_ms: Optional[int] = None,
+        worker_id: Optional[str] = None,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.poll_interval = (poll_interval_ms or settings.JOB_POLL_INTERVAL_MS) / 1000
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+        self._next_reap = 0.0
+
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.lost = 0
+
+    async def run_once(self) -> bool:
+        """
+        Claims and runs one job. Returns False when no job was due.
+        """
+        job = await self.queue.claim(self.worker_id)
+        if job is None:
+            return False
+
+        handler = self.handlers.get(job.kind)
+        log = logger.bind(job_id=job.id, kind=job.kind, attempt=job.attempts)
+        try:
+            try:
+                if handler is None:
+                    raise PermanentJobError(f"No handler for job kind '{job.kind}'")
+                log.info("job_started")
+                result = await handler(job, self.queue)
+            except asyncio.CancelledError:
+                await self.queue.release(job)
+                raise
+            except JobLeaseLost:
+                raise
+            except Exception as e:
+                permanent = isinstance(e, PermanentJobError)
+                if await self.queue.fail(job, str(e) or type(e).__name__, permanent=permanent):
+                    self.retried += 1
+                else:
+                    self.failed += 1
+                return True
+
+            await self.queue.succeed(job, result)
+        except JobLeaseLost:
+            self.lost += 1
+            log.warning("job_lease_lost", worker_id=self.worker_id)
+            return True
+
+        self.succeeded += 1
+        log.info("job_succeeded", result=result)
+        return True
+
+    async def _run(self, slot: int):
+        while True:
+            try:
+                if slot == 0 and time.monotonic() >= self._next_reap:
+                    # Jobs of dead workers; checked a few times per lease
+                    self._next_reap = time.monotonic() + self.queue.lease_seconds / 4
+                    await self.queue.requeue_expired()
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                logger.error("job_worker_error", worker_id=self.worker_id, error=str(e))
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(slot)) for slot in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        # Interrupted jobs are released back to the queue by run_once
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "running": bool(self._tasks),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "lost": self.lost,
+        }
+
+
+@lru_cache()
+def get_job_queue() -> JobQueue:
+    return JobQueue()
@@ -0,0 +1,102 @@
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Feed, Job
+from app.db.session import AsyncSessionLocal
+from app.services.feed_service import FeedService
+from app.services.job_queue import JobQueue, JobWorker, PermanentJobError, get_job_queue
+from app.services.rss_fetcher import FeedFetchError, RSSFetcher, get_rss_fetcher
+from app.services.vector_service import VectorService, get_vector_service
+
+# Job kinds
+REFRESH_FEED = "refresh_feed"
+
+# (session, feed id, new articles or None when the fetch failed), joins the session's transaction
+RefreshCallback = Callable[[AsyncSession, int, Optional[int]], Awaitable[None]]
+
+
+class RefreshFeedJob:
+    """
+    Fetches a feed, stores its new articles and embeds them in batches.
+
+    The new articles are committed in one transaction together with a
+    checkpoint listing their ids, so a retry after an embedding failure
+    resumes at the first batch not embedded yet instead of fetching again
+    (the articles are known by then and would never be embedded). No
+    transaction is open while embedding. `on_refreshed` hears about every
+    fetch, successful or not, in the same transaction (the scheduler uses
+    it to plan the feed's next refresh).
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        fetcher: Optional[RSSFetcher] = None,
+        vector_service: Optional[VectorService] = None,
+        embed_batch_size: Optional[int] = None,
+        on_refreshed: Optional[RefreshCallback] = None,
+    ):
+        self.session_factory = session_factory
+        self.fetcher = fetcher
+        self._vector_service = vector_service
+        self.embed_batch_size = embed_batch_size or settings.JOB_EMBED_BATCH_SIZE
+        self.on_refreshed = on_refreshed
+
+    def _get_vector_service(self) -> VectorService:
+        # One embedding model for every job instead of one per FeedService
+        if self._vector_service is None:
+            self._vector_service = get_vector_service()
+        return self._vector_service
+
+    async def __call__(self, job: Job, queue: JobQueue) -> Dict[str, Any]:
+        feed_id = job.payload["feed_id"]
+        progress = dict(job.progress or {})
+
+        async with self.session_factory() as session:
+            service = FeedService(session, self.fetcher or get_rss_fetcher(), self._get_vector_service())
+
+            # 1. Fetch and store, unless an earlier attempt already did
+            if "article_ids" not in progress:
+                await queue.checkpoint(job, {"stage": "fetching"})
+                feed = await session.get(Feed, feed_id)
+                if feed is None:
+                    raise PermanentJobError(f"Feed with id {feed_id} not found")
+                result = await service.rss_fetcher.fetch(feed.url, feed.etag, feed.last_modified)
+                try:
+                    article_ids = await service.stage_fetch_result(feed, result)
+                except FeedFetchError:
+                    if self.on_refreshed is not None:
+                        await self.on_refreshed(session, feed_id, None)
+                        await session.commit()
+                    raise
+                progress = {"stage": "embedding", "new_articles": len(article_ids), "embedded": 0, "article_ids": article_ids}
+                await queue.checkpoint(job, progress, session=session)
+                if self.on_refreshed is not None:
+                    await self.on_refreshed(session, feed_id, len(article_ids))
+                await session.commit()
+
+            # 2. Embed in batches, checkpointing after each one
+            article_ids = progress["article_ids"]
+            for start in range(progress["embedded"], len(article_ids), self.embed_batch_size):
+                batch = article_ids[start:start + self.embed_batch_size]
+                await service.embed_articles(batch)
+                progress["embedded"] = start + len(batch)
+                await queue.checkpoint(job, progress)
+
+        return {"feed_id": feed_id, "new_articles": progress["new_articles"], "embedded": progress["embedded"]}
+
+
+async def enqueue_feed_refresh(queue: JobQueue, feed_id: int) -> Job:
+    # A refresh already waiting for this feed will pick up the same entries
+    return await queue.enqueue(REFRESH_FEED, {"feed_id": feed_id}, dedupe_key=f"{REFRESH_FEED}:{feed_id}")
+
+
+@lru_cache()
+def get_job_worker() -> JobWorker:
+    # Imported here: the scheduler enqueues through this module
+    from app.services.feed_scheduler import get_feed_scheduler
+
+    return JobWorker(get_job_queue(), {REFRESH_FEED: RefreshFeedJob(on_refreshed=get_feed_scheduler().record_refresh)})
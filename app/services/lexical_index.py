@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import select
+
+from app.db.models import Article
+from app.db.session import SessionLocal
+
+logger = structlog.get_logger()
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the to was were will with "
+    "what who when where which how about after over new news".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring over Article rows.
+
+    The index is built from the database on first use. FeedService adds the
+    articles it commits in this process; articles committed by other
+    processes are picked up when `asearch` sees a newer shared index
+    version (see index_version.py).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.built = False
+        # Shared index version the last build caught up with
+        self.version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, doc_id: int, text: str):
+        """
+        Indexes a document. Adding an id that is already indexed is a no-op.
+        """
+        terms = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self._doc_lengths:
+                return
+            for term, frequency in terms.items():
+                self._postings[term][doc_id] = frequency
+            length = sum(terms.values())
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def add_many(self, documents: Iterable[Tuple[int, str]]):
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+
+    def build(self, db, chunk_size: int = 500):
+        """
+        Indexes every stored article that is not indexed yet. Only ids are
+        compared, so catching up after an ingest elsewhere doesn't reload the
+        whole table. Safe to call while FeedService adds articles.
+        """
+        with self._lock:
+            indexed = set(self._doc_lengths)
+        missing = sorted(set(db.scalars(select(Article.id))) - indexed)
+        for start in range(0, len(missing), chunk_size):
+            rows = db.execute(
+                select(Article.id, Article.title, Article.content).where(Article.id.in_(missing[start:start + chunk_size]))
+            )
+            self.add_many((row.id, f"{row.title}\n{row.content}") for row in rows)
+        self.built = True
+        logger.info("lexical_index_built", documents=len(self), added=len(missing))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Returns the top `k` (article id, BM25 score) pairs for the query.
+        """
+        with self._lock:
+            count = len(self._doc_lengths)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[int, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _is_current(self, version: Optional[int]) -> bool:
+        return self.built and (version is None or version == self.version)
+
+    async def asearch(self, query: str, k: int = 10, version: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Searches the index, first building it or catching up with the
+        database when `version` differs from the one it was built at.
+        """
+        if not self._is_current(version):
+            await asyncio.to_thread(self._build_from_session, version)
+        return self.search(query, k)
+
+    def _build_from_session(self, version: Optional[int] = None):
+        with self._build_lock:
+            if self._is_current(version):
+                return
+            db = SessionLocal()
+            try:
+                self.build(db)
+            finally:
+                db.close()
+            self.version = version
+
+
+@lru_cache()
+def get_lexical_index() -> BM25Index:
+    return BM25Index()
@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Set, Tuple
+
+import structlog
+from sqlalchemy import event, inspect
+
+from app.core.config import settings
+from app.db.models import User
+
+logger = structlog.get_logger("auth")
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """The authenticated caller, as far as the endpoints need to know it."""
+
+    id: int
+    email: str
+
+
+class PrincipalCache:
+    """
+    Bounded TTL cache of verified access token -> UserPrincipal.
+
+    A hit skips both the JWT verification and the users lookup. Entries live
+    for `ttl_seconds` at most and never past the token's own expiry. The
+    cache is per process: `invalidate_user` drops a user's entries here, other
+    workers converge within the TTL.
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.AUTH_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.AUTH_CACHE_MAX_ENTRIES
+
+        # token hash -> (principal, expires at)
+        self._entries: "OrderedDict[str, Tuple[UserPrincipal, float]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        # ORM hooks may fire from sync sessions running in worker threads
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[UserPrincipal]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: UserPrincipal, token_expires_at: Optional[float] = None):
+        """
+        `token_expires_at` is the token's `exp` claim (unix time).
+        """
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (principal, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        principal, _ = self._entries.pop(key)
+        keys = self._by_user.get(principal.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[principal.id]
+
+    def invalidate_user(self, user_id: int):
+        """
+        Forgets every cached token of a user. Call when the user is deleted,
+        changes password or otherwise loses access.
+        """
+        with self._lock:
+            keys = self._by_user.pop(user_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+        if keys:
+            logger.info("auth_cache_invalidated", user_id=user_id, tokens=len(keys))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+@lru_cache()
+def get_principal_cache() -> PrincipalCache:
+    return PrincipalCache()
+
+
+# Invalidation hooks: any ORM delete of a user or change of their password
+# (or email, which tokens are issued for) drops their cached tokens
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target: User):
+    get_principal_cache().invalidate_user(target.id)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target: User):
+    state = inspect(target)
+    if state.attrs.hashed_password.history.has_changes() or state.attrs.email.history.has_changes():
+        get_principal_cache().invalidate_user(target.id)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.db.vector_store import get_embedding_model
+
+logger = structlog.get_logger()
+
+
+class MicroBatchEmbedder:
+    """
+    Embeds concurrent queries together instead of one forward pass each.
+
+    Queries are collected until `max_batch_size` is reached or the oldest one
+    has waited `max_wait_ms`, then embedded in a single `embed_documents`
+    call on a dedicated thread. Each awaiting coroutine gets its own vector.
+    """
+
+    def __init__(self, embedding_function, max_batch_size: Optional[int] = None, max_wait_ms: Optional[int] = None):
+        self.embedding_function = embedding_function
+        self.max_batch_size = max_batch_size or settings.EMBED_BATCH_MAX_SIZE
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else settings.EMBED_BATCH_MAX_WAIT_MS
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embed")
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.queries = 0
+        self.max_batch_seen = 0
+        self.total_queue_ms = 0.0
+
+    async def aembed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.monotonic()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)  # Hold a reference until the batch completes
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        started = time.monotonic()
+        # Identical questions in the same window are embedded once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+
+        self.batches += 1
+        self.queries += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.total_queue_ms += sum((started - enqueued) * 1000 for _, _, enqueued in batch)
+
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.embedding_function.embed_documents, texts
+            )
+        except Exception as e:
+            logger.error("query_embedding_batch_failed", size=len(batch), error=str(e))
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+        logger.debug(
+            "query_embedding_batch",
+            size=len(batch),
+            unique=len(texts),
+            embed_ms=round((time.monotonic() - started) * 1000, 2),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_queue_ms": round(self.total_queue_ms / self.queries, 2) if self.queries else 0.0,
+            "pending": len(self._pending),
+        }
+
+
+@lru_cache()
+def get_query_embedder() -> MicroBatchEmbedder:
+    # The raw model: queries are not worth a place in the document embedding cache
+    return MicroBatchEmbedder(get_embedding_model())
@@ -4,11 +4,39 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_groq import ChatGroq
 from langsmith import traceable
 from app.core.config import settings
-from app.services.vector_service import VectorService
+from app.services.vector_service import (
+    VectorService,
+    RetrievedChunk,
+    RetrievalOptions,
+    asearch_collections,
+    reciprocal_rank_fusion,
+)
+from app.services.answer_cache import SemanticAnswerCache, get_answer_cache
+from app.services.index_version import IndexVersionReader, get_index_version
+from app.services.region_router import RegionRouter
+from app.services.context_packer import ContextPacker
+from app.services.single_flight import SingleFlight
+from app.services.lexical_index import BM25Index, get_lexical_index
+from app.services.reranker import get_reranker
+from app.services.query_embedder import get_query_embedder
+from app.services.conversation_memory import ConversationMemory
+from contextlib import aclosing
 from functools import lru_cache
+from typing import List, Optional
+import asyncio
+import hashlib
+import structlog
+
+logger = structlog.get_logger()
 
 class RAGService:
-    def __init__(self, vector_service: VectorService = None):
+    def __init__(
+        self,
+        vector_service: VectorService = None,
+        answer_cache: SemanticAnswerCache = None,
+        lexical_index: BM25Index = None,
+        index_version: IndexVersionReader = None,
+    ):
         # 1. Initialize the LLM
         self.llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0)
 
@@ -20,45 +48,267 @@ class RAGService:
         prompts = settings.get_prompts()
         self.final_prompt_template = prompts["final_prompt_template"]
         self.final_prompt = ChatPromptTemplate.from_template(self.final_prompt_template)
+        self.conversation_prompt = ChatPromptTemplate.from_template(prompts["conversation_prompt_template"])
+        self.condense_prompt = ChatPromptTemplate.from_template(prompts["condense_prompt_template"])
+
+        # 4. Semantic answer cache (shared by all requests in this process),
+        # emptied when any process embeds new articles
+        self.answer_cache = answer_cache or get_answer_cache()
+        self.index_version = index_version or get_index_version()
+
+        # 5. Region router over the per-feed collections written by ingest_data.py
+        self.router = RegionRouter(self.llm, prompts["router_prompt_template"])
+
+        # 6. Packs retrieved chunks into a token-bounded prompt context
+        self.context_packer = ContextPacker()
+
+        # 7. Coalesces identical questions that are in flight at the same time
+        self.single_flight = SingleFlight()
+
+        # 8. BM25 index over Article rows for exact names and places
+        self.lexical_index = lexical_index or get_lexical_index()
+
+        # 9. Optional cross-encoder rerank of the fused candidates
+        self.reranker = get_reranker() if settings.RERANK_ENABLED else None
+
+        # 10. Batches query embeddings of concurrent requests
+        self.query_embedder = get_query_embedder() if settings.EMBED_BATCH_ENABLED else None
+
+        # 11. Rolling per-conversation summaries for follow-up questions
+        self.conversation_memory = ConversationMemory(self.llm, prompts["summary_prompt_template"])
+
+    @staticmethod
+    def _flight_key(question: str, options: RetrievalOptions, summary: Optional[str] = None) -> str:
+        key = " ".join(question.lower().split()).rstrip("?!. ")
+        if options != RetrievalOptions():
+            key = f"{key}|{options}"
+        if summary:
+            # Follow-ups only coalesce within the same conversation state
+            key = f"{key}|{hashlib.sha1(summary.encode('utf-8')).hexdigest()}"
+        return key
+
+    async def _condense(self, question: str, summary: str) -> str:
+        """
+        Rewrites a follow-up ("what did he say next?") as a standalone query
+        using the conversation summary, so retrieval finds the right articles.
+        """
+        try:
+            chain = self.condense_prompt | self.llm | StrOutputParser()
+            query = (await chain.ainvoke({"summary": summary, "question": question})).strip()
+            return query or question
+        except Exception as e:
+            logger.error("condense_question_error", error=str(e))
+            return question
+
+    def _generation_input(self, context: str, question: str, summary: Optional[str]):
+        if summary:
+            return self.conversation_prompt, {"context": context, "question": question, "summary": summary}
+        return self.final_prompt, {"context": context, "question": question}
+
+    async def _embed_question(self, question: str) -> List[float]:
+        """
+        Embeds the question once so the cache lookup and the vector search share it.
+        """
+        if self.query_embedder is not None:
+            return await self.query_embedder.aembed_query(question)
+        return await self.vector_service.embedding_function.aembed_query(question)
+
+    async def _index_version(self) -> Optional[int]:
+        # Read before retrieval: an answer is only as fresh as the articles it saw
+        if not settings.ANSWER_CACHE_ENABLED:
+            return None
+        return await self.index_version.current()
+
+    @staticmethod
+    def _cacheable(options: RetrievalOptions) -> bool:
+        # Entries are keyed by the question only: answers retrieved with
+        # non-default options are neither served from nor stored in the cache
+        return settings.ANSWER_CACHE_ENABLED and options == RetrievalOptions()
+
+    def _cached_result(self, query_embedding: List[float], options: RetrievalOptions, version: Optional[int]):
+        if not self._cacheable(options):
+            return None
+        return self.answer_cache.lookup(query_embedding, version)
+
+    def _cache_result(
+        self, query_embedding: List[float], options: RetrievalOptions, question: str, result: dict, version: Optional[int]
+    ):
+        if self._cacheable(options):
+            self.answer_cache.store(query_embedding, question, result, version)
+
+    async def _retrieve(
+        self, question: str, query_embedding: List[float], options: RetrievalOptions
+    ) -> List[RetrievedChunk]:
+        """
+        Routes the question to its regional collection(s), searches them
+        concurrently, fuses the rankings with reciprocal-rank fusion and
+        optionally reranks the fused candidates.
+        """
+        vector_services = []
+        if settings.ROUTER_ENABLED:
+            decision = await self.router.route(question, query_embedding)
+            vector_services = [self.router.vector_services[name] for name in decision.collections]
+            vector_services = vector_services[: options.max_collections or settings.RETRIEVAL_MAX_COLLECTIONS]
+        if not vector_services or settings.ROUTER_INCLUDE_DEFAULT_COLLECTION:
+            vector_services.append(self.vector_service)
+
+        hybrid = settings.HYBRID_SEARCH_ENABLED
+        vector_search = asearch_collections(
+            vector_services,
+            query_embedding,
+            k=settings.HYBRID_VECTOR_K if hybrid else settings.RETRIEVAL_CANDIDATE_K,
+            timeout_ms=options.timeout_ms or settings.RETRIEVAL_TIMEOUT_MS,
+        )
+        if hybrid:
+            rankings, keyword_ranking = await asyncio.gather(
+                vector_search, self._keyword_search(question, query_embedding)
+            )
+            rankings.append(keyword_ranking)
+        else:
+            rankings = await vector_search
+        chunks = reciprocal_rank_fusion(rankings, rrf_k=settings.RRF_K)
+
+        if self.reranker is not None:
+            chunks = await self.reranker.rerank(question, chunks[: settings.RERANK_CANDIDATES])
+        return chunks
+
+    async def _keyword_search(self, question: str, query_embedding: List[float]) -> List[RetrievedChunk]:
+        """
+        BM25 lookup over articles, resolved to their chunks in the articles collection.
+        """
+        try:
+            # Catches up with articles other workers committed since the last search
+            version = await self.index_version.current()
+            hits = await self.lexical_index.asearch(question, k=settings.BM25_K, version=version)
+            if not hits:
+                return []
+            article_ids = [article_id for article_id, _ in hits]
+            return await asyncio.to_thread(self.vector_service.get_by_article_ids, article_ids, query_embedding)
+        except Exception as e:
+            logger.error("keyword_search_error", error=str(e))
+            return []
+
+    async def warm_up(self):
+        """
+        Loads every model and index on the hot path and runs one dummy embed
+        and search through them, without calling the LLM.
+        """
+        query_embedding = await self._embed_question("warmup")
+        await self.router.get_centroids()
+        await asearch_collections(
+            [self.vector_service, *self.router.vector_services.values()], query_embedding, k=1
+        )
+        if settings.HYBRID_SEARCH_ENABLED:
+            await self.lexical_index.asearch("warmup", k=1)
+        if self.reranker is not None:
+            await self.reranker.warm_up()
+
+    async def ask_question(
+        self, question: str, options: RetrievalOptions = RetrievalOptions(), summary: Optional[str] = None
+    ) -> dict:
+        """
+        Answers the question, sharing one pipeline run between concurrent
+        requests for the same (normalized) question. `summary` is the rolling
+        summary of the conversation the question belongs to, if any.
+        """
+        if not settings.COALESCE_REQUESTS:
+            return await self._answer(question, options, summary)
+        return await self.single_flight.do(
+            self._flight_key(question, options, summary), lambda: self._answer(question, options, summary)
+        )
+
+    async def ask_question_stream(
+        self, question: str, options: RetrievalOptions = RetrievalOptions(), summary: Optional[str] = None
+    ):
+        """
+        Streams the answer for the given question. Concurrent identical
+        questions subscribe to the same upstream generation.
+        """
+        if not settings.COALESCE_REQUESTS:
+            stream = self._answer_stream(question, options, summary)
+        else:
+            stream = self.single_flight.stream(
+                self._flight_key(question, options, summary),
+                lambda: self._answer_stream(question, options, summary),
+            )
+        async with aclosing(stream):
+            async for chunk, docs in stream:
+                yield chunk, docs
 
     @traceable
-    async def ask_question(self, question: str) -> dict:
+    async def _answer(self, question: str, options: RetrievalOptions, summary: Optional[str] = None) -> dict:
         """
         Executes the RAG pipeline using the articles collection.
         """
+        search_query = await self._condense(question, summary) if summary else question
+        query_embedding = await self._embed_question(search_query)
+        version = await self._index_version()
+        cached = self._cached_result(query_embedding, options, version)
+        if cached is not None:
+            return cached
+
         # Simple RAG: Retrieve -> Generate
-        docs = await self.articles_retriever.ainvoke(question)
+        chunks = await self._retrieve(search_query, query_embedding, options)
+        context, docs = self.context_packer.pack(chunks)
         
+        prompt, input_data = self._generation_input(context, question, summary)
         generation_chain = (
-            self.final_prompt
+            prompt
             | self.llm
             | StrOutputParser()
         )
         
-        input_data = {"context": docs, "question": question}
         answer = await generation_chain.ainvoke(input_data)
         
-        return {
+        result = {
             "answer": answer,
             "context": docs
         }
+        if not summary:
+            # Answers shaped by one conversation aren't reused for others
+            self._cache_result(query_embedding, options, question, result, version)
+        return result
 
     @traceable(project_name="newsbot-rag")
-    async def ask_question_stream(self, question: str):
+    async def _answer_stream(self, question: str, options: RetrievalOptions, summary: Optional[str] = None):
         """
         Streams the answer for the given question.
         """
-        docs = await self.articles_retriever.ainvoke(question)
-        input_data = {"context": docs, "question": question}
+        search_query = await self._condense(question, summary) if summary else question
+        query_embedding = await self._embed_question(search_query)
+        version = await self._index_version()
+        cached = self._cached_result(query_embedding, options, version)
+        if cached is not None:
+            # Replay the cached answer as a single chunk
+            yield "", cached["context"]
+            yield cached["answer"], cached["context"]
+            return
+
+        chunks = await self._retrieve(search_query, query_embedding, options)
+        context, docs = self.context_packer.pack(chunks)
+        prompt, input_data = self._generation_input(context, question, summary)
         
         generation_chain = (
-            self.final_prompt
+            prompt
             | self.llm
             | StrOutputParser()
         )
         
-        async for chunk in generation_chain.astream(input_data):
-            yield chunk, docs
+        # Sources are available before the first token
+        yield "", docs
+
+        answer_parts = []
+        # Closing the token stream early (client gone) cancels the Groq request
+        async with aclosing(generation_chain.astream(input_data)) as tokens:
+            async for chunk in tokens:
+                answer_parts.append(chunk)
+                yield chunk, docs
+
+        # Only complete, conversation-independent answers are cached
+        if not summary:
+            self._cache_result(
+                query_embedding, options, question, {"answer": "".join(answer_parts), "context": docs}, version
+            )
 
     @traceable
     async def generate_article(self, topic: str, category: str = None) -> str:
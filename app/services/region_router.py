@@ -0,0 +1,148 @@
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+import numpy as np
+import structlog
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.core.config import settings
+from app.services.vector_service import VectorService
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class RoutingDecision:
+    collections: List[str]
+    method: str  # "centroid", "llm", "ambiguous" or "default"
+    margin: float = 0.0
+    scores: Dict[str, float] = field(default_factory=dict)
+
+
+class RegionRouter:
+    """
+    Picks the regional Chroma collection(s) for a question by comparing the
+    question embedding with each collection's centroid. The LLM router prompt
+    is only used when the two best centroids are too close to call.
+
+    Centroids are cached for `centroid_ttl_seconds`. The collections are
+    filled by scripts/ingest_data.py in another process, so there is no
+    in-process event to refresh them on. An empty result (nothing ingested
+    yet) is not cached.
+    """
+
+    def __init__(
+        self,
+        llm,
+        router_prompt_template: str,
+        feeds: Optional[List[dict]] = None,
+        margin_threshold: Optional[float] = None,
+        vector_service_factory=VectorService,
+        centroid_ttl_seconds: Optional[float] = None,
+    ):
+        feeds = feeds if feeds is not None else settings.get_feeds()
+        # Maps the label the router prompt answers with (e.g. "brazil") to its collection
+        self.regions = {
+            feed.get("region", feed["name"].split("_")[0]).lower(): feed["name"]
+            for feed in feeds
+        }
+        self.vector_services = {
+            name: vector_service_factory(collection_name=name) for name in self.regions.values()
+        }
+        self.margin_threshold = (
+            margin_threshold if margin_threshold is not None else settings.ROUTER_MARGIN_THRESHOLD
+        )
+        self.centroid_ttl_seconds = (
+            centroid_ttl_seconds if centroid_ttl_seconds is not None else settings.ROUTER_CENTROID_TTL_SECONDS
+        )
+        self.routing_chain = ChatPromptTemplate.from_template(router_prompt_template) | llm | StrOutputParser()
+
+        self._centroids: Optional[Dict[str, np.ndarray]] = None
+        self._centroids_computed_at = 0.0
+        self._centroid_lock = asyncio.Lock()
+
+        self.method_counts: Counter = Counter()
+        self.recent_decisions: deque = deque(maxlen=100)
+
+    def _compute_centroids(self) -> Dict[str, np.ndarray]:
+        centroids = {}
+        for name, vector_service in self.vector_services.items():
+            centroid = vector_service.get_centroid(settings.ROUTER_CENTROID_SAMPLE_SIZE)
+            if centroid is not None:
+                centroids[name] = centroid
+        logger.info("router_centroids_computed", collections=list(centroids))
+        return centroids
+
+    def _centroids_expired(self) -> bool:
+        return (
+            self._centroids is None
+            or time.monotonic() - self._centroids_computed_at >= self.centroid_ttl_seconds
+        )
+
+    async def get_centroids(self) -> Dict[str, np.ndarray]:
+        if self._centroids_expired():
+            async with self._centroid_lock:
+                if self._centroids_expired():
+                    centroids = await asyncio.to_thread(self._compute_centroids)
+                    if not centroids:
+                        # E.g. warmup before the first ingest: look again on the next route
+                        return centroids
+                    self._centroids = centroids
+                    self._centroids_computed_at = time.monotonic()
+        return self._centroids
+
+    async def route(self, question: str, query_embedding: List[float]) -> RoutingDecision:
+        centroids = await self.get_centroids()
+        if not centroids:
+            decision = RoutingDecision(collections=[], method="default")
+        else:
+            names = list(centroids)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            similarities = np.stack([centroids[name] for name in names]) @ query
+            order = np.argsort(similarities)[::-1]
+            scores = {names[i]: float(similarities[i]) for i in order}
+            margin = float(similarities[order[0]] - similarities[order[1]]) if len(order) > 1 else 1.0
+
+            if margin >= self.margin_threshold:
+                decision = RoutingDecision([names[order[0]]], "centroid", margin, scores)
+            else:
+                decision = await self._route_with_llm(question, margin, scores)
+
+        self._record(decision)
+        return decision
+
+    async def _route_with_llm(self, question: str, margin: float, scores: Dict[str, float]) -> RoutingDecision:
+        if settings.ROUTER_LLM_FALLBACK:
+            try:
+                label = await self.routing_chain.ainvoke({"question": question})
+                collection = self.regions.get(label.strip().lower())
+                if collection in scores:
+                    return RoutingDecision([collection], "llm", margin, scores)
+            except Exception as e:
+                logger.warning("router_llm_fallback_failed", error=str(e))
+
+        # Too close to call: search every candidate collection
+        return RoutingDecision(list(scores), "ambiguous", margin, scores)
+
+    def _record(self, decision: RoutingDecision):
+        self.method_counts[decision.method] += 1
+        # No question text: the stats are readable by every logged-in user
+        self.recent_decisions.append(asdict(decision))
+        logger.info(
+            "query_routed",
+            collections=decision.collections,
+            method=decision.method,
+            margin=round(decision.margin, 4),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "margin_threshold": self.margin_threshold,
+            "methods": dict(self.method_counts),
+            "recent_decisions": list(self.recent_decisions),
+        }
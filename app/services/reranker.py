@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.db.vector_store import configure_torch_threads
+from app.services.vector_service import RetrievedChunk
+
+logger = structlog.get_logger()
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores retrieved chunks with a small local cross-encoder.
+
+    All candidates of a request go through the model in one batched forward
+    pass on a single dedicated thread, so reranking never competes with the
+    event loop's default executor. Its torch intra-op threads are shared with
+    the HF embeddings (see TORCH_NUM_THREADS). Scores are cached per (query,
+    chunk id). If the model doesn't answer within the latency budget
+    (including time spent queued behind other requests) the fused order is
+    kept unchanged.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        top_n: Optional[int] = None,
+        budget_ms: Optional[int] = None,
+        cache_size: Optional[int] = None,
+    ):
+        self.model_name = model_name or settings.RERANK_MODEL_NAME
+        self.top_n = top_n or settings.RERANK_TOP_N
+        self.budget_ms = budget_ms or settings.RERANK_BUDGET_MS
+        self.cache_size = cache_size or settings.RERANK_CACHE_SIZE
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._model = None
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.skipped = 0
+
+    def _load_model(self):
+        from sentence_transformers import CrossEncoder
+
+        configure_torch_threads()
+        logger.info("reranker_model_loading", model=self.model_name)
+        return CrossEncoder(self.model_name, device="cpu")
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> Sequence[float]:
+        if self._model is None:
+            self._model = self._load_model()
+        return self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+    @staticmethod
+    def _query_hash(query: str) -> str:
+        return hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+
+    def _store(self, keys: List[Tuple[str, str]], scores: Sequence[float]):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._scores[key] = float(score)
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def _cached(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        with self._lock:
+            found = {key: self._scores[key] for key in keys if key in self._scores}
+            for key in found:
+                self._scores.move_to_end(key)
+        self.cache_hits += len(found)
+        self.cache_misses += len(keys) - len(found)
+        return found
+
+    async def rerank(self, query: str, chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+        """
+        Returns the `top_n` best chunks by cross-encoder score, or the input
+        unchanged if the budget runs out.
+        """
+        if not chunks:
+            return chunks
+
+        query_hash = self._query_hash(query)
+        keys = [(query_hash, chunk.id) for chunk in chunks]
+        scores = self._cached(keys)
+
+        missing = [(key, chunk) for key, chunk in zip(keys, chunks) if key not in scores]
+        if missing:
+            missing_keys = [key for key, _ in missing]
+            pairs = [(query, chunk.document.page_content) for _, chunk in missing]
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._predict, pairs)
+            try:
+                predicted = await asyncio.wait_for(asyncio.shield(future), self.budget_ms / 1000)
+            except asyncio.TimeoutError:
+                self.skipped += 1
+                logger.warning("rerank_budget_exhausted", budget_ms=self.budget_ms, candidates=len(pairs))
+                # Keep the work: a repeat of this query will find the scores cached
+                future.add_done_callback(
+                    lambda f: self._store(missing_keys, f.result()) if not f.exception() else None
+                )
+                return chunks
+            self._store(missing_keys, predicted)
+            scores.update(zip(missing_keys, (float(s) for s in predicted)))
+
+        ranked = sorted(zip(keys, chunks), key=lambda item: scores[item[0]], reverse=True)
+        return [chunk for _, chunk in ranked[: self.top_n]]
+
+    async def warm_up(self):
+        """
+        Loads the model on its thread and runs one forward pass.
+        """
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._predict, [("warmup", "warmup")])
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "cached_scores": len(self._scores),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "skipped": self.skipped,
+        }
+
+
+@lru_cache()
+def get_reranker() -> CrossEncoderReranker:
+    return CrossEncoderReranker()
@@ -1,20 +1,132 @@
+import asyncio
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
 import feedparser
+import httpx
 import structlog
-from typing import List, Dict, Any
+
+from app.core.config import settings
 
 logger = structlog.get_logger()
 
+
+class FeedFetchError(Exception):
+    """The feed could not be downloaded or parsed."""
+
+
+@dataclass
+class FetchResult:
+    url: str
+    entries: List[Dict[str, Any]] = field(default_factory=list)
+    not_modified: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None
+
+
 class RSSFetcher:
-    def fetch(self, url: str) -> List[Dict[str, Any]]:
+    """
+    Downloads feeds over one pooled HTTP client with conditional GETs.
+
+    The stored ETag / Last-Modified are sent back as If-None-Match /
+    If-Modified-Since, so an unchanged feed costs a 304 and no parsing.
+    Requests to the same host are capped at `per_host_limit` at a time and
+    parsing runs in a worker thread. Feeds are downloaded concurrently by
+    the job worker, one refresh_feed job per feed, all on this client.
+    """
+
+    def __init__(
+        self,
+        timeout_seconds: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        per_host_limit: Optional[int] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout_seconds = timeout_seconds or settings.FEED_FETCH_TIMEOUT_SECONDS
+        self.max_connections = max_connections or settings.FEED_FETCH_MAX_CONNECTIONS
+        self.per_host_limit = per_host_limit or settings.FEED_FETCH_PER_HOST_LIMIT
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+        self.fetched = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout_seconds,
+                limits=httpx.Limits(max_connections=self.max_connections),
+                follow_redirects=True,
+                headers={"User-Agent": "NewsBot/1.0 (+feed refresher)"},
+                transport=self._transport,
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
         """
-        Fetches and parses an RSS feed using feedparser.
+        Fetches and parses one feed. Errors are logged and reported in the
+        result rather than raised.
         """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
         try:
-            feed = feedparser.parse(url)
+            async with self._host_limit(url):
+                response = await self._get_client().get(url, headers=headers)
+
+            if response.status_code == 304:
+                self.not_modified += 1
+                logger.debug("feed_not_modified", url=url)
+                return FetchResult(url, not_modified=True, etag=etag, last_modified=last_modified)
+            response.raise_for_status()
+
+            feed = await asyncio.to_thread(
+                feedparser.parse, response.content, response_headers=dict(response.headers)
+            )
             if feed.bozo:
                 logger.warning("feed_parse_warning", url=url, error=feed.bozo_exception)
-            
-            return feed.entries
+
+            self.fetched += 1
+            return FetchResult(
+                url,
+                entries=feed.entries,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
         except Exception as e:
+            self.errors += 1
             logger.error("feed_fetch_error", url=url, error=str(e))
-            return []
+            return FetchResult(url, etag=etag, last_modified=last_modified, error=str(e))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        # Semaphores belong to the loop that created them
+        self._host_limits.clear()
+
+    def stats(self) -> dict:
+        return {
+            "fetched": self.fetched,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+        }
+
+
+@lru_cache()
+def get_rss_fetcher() -> RSSFetcher:
+    return RSSFetcher()
@@ -0,0 +1,113 @@
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+class _Broadcast:
+    """Items produced by one streaming call, replayed to every subscriber."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    `do` is for coroutines: every caller awaits the same result. `stream` is
+    for async generators: one leader consumes the generator and every
+    subscriber receives all of its items, including the ones produced before
+    it joined. The leader is cancelled once the last subscriber leaves.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            self.leaders += 1
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(self._calls, key, f))
+        else:
+            self.followers += 1
+            logger.debug("request_coalesced", key=key)
+        # A caller going away must not cancel the call the others are waiting on
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _forget(calls: Dict[str, Any], key: str, future: asyncio.Future):
+        if calls.get(key) is future:
+            del calls[key]
+        if not future.cancelled():
+            future.exception()  # Mark as retrieved even if every caller left
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, fn))
+        else:
+            self.followers += 1
+            logger.debug("stream_coalesced", key=key)
+
+        broadcast.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with broadcast.changed:
+                    await broadcast.changed.wait_for(lambda: position < len(broadcast.items) or broadcast.done)
+                    batch = broadcast.items[position:]
+                    position = len(broadcast.items)
+                    finished = broadcast.done
+                for item in batch:
+                    yield item
+                if finished:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+        finally:
+            broadcast.subscribers -= 1
+            # Nobody is listening any more: stop the upstream call
+            if broadcast.subscribers == 0 and not broadcast.done:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+                broadcast.task.cancel()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, fn: Callable[[], AsyncIterator[Any]]):
+        try:
+            async with aclosing(fn()) as items:
+                async for item in items:
+                    async with broadcast.changed:
+                        broadcast.items.append(item)
+                        broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
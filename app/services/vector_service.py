@@ -1,4 +1,9 @@
-from typing import List, Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+import asyncio
+import math
+import numpy as np
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from app.core.config import settings
@@ -7,6 +12,21 @@ import structlog
 
 logger = structlog.get_logger()
 
+@dataclass
+class RetrievedChunk:
+    """A search hit together with the stored embedding Chroma already has for it."""
+    id: str
+    document: Document
+    embedding: np.ndarray
+    score: float  # Cosine similarity to the query
+    keyword_match: bool = False  # Found by the BM25 index rather than the vector search
+
+@dataclass(frozen=True)
+class RetrievalOptions:
+    """Per-request retrieval knobs; None falls back to the settings default."""
+    max_collections: Optional[int] = None
+    timeout_ms: Optional[int] = None
+
 class VectorService:
     def __init__(self, collection_name: str = "articles"):
         self.collection_name = collection_name
@@ -17,13 +37,59 @@ class VectorService:
             embedding_function=self.embedding_function,
         )
 
-    def add_documents(self, documents: List[Document]):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds document texts with the collection's (cached) embedding function.
+        """
+        return self.embedding_function.embed_documents(texts)
+
+    def add_documents(self, documents: List[Document], embeddings: Optional[List[List[float]]] = None):
         """
-        Adds documents to the vector store.
+        Adds documents to the vector store. With precomputed `embeddings`
+        (one per document) they are upserted as given instead of embedded here.
         """
-        if documents:
+        if not documents:
+            return
+        if embeddings is None:
             self.vector_db.add_documents(documents)
-            logger.info("documents_added", count=len(documents), collection=self.collection_name)
+        else:
+            self.vector_db._collection.upsert(
+                ids=[doc.id for doc in documents],
+                embeddings=embeddings,
+                documents=[doc.page_content for doc in documents],
+                metadatas=[doc.metadata for doc in documents],
+            )
+        logger.info("documents_added", count=len(documents), collection=self.collection_name)
+
+    def get_centroid(self, sample_size: Optional[int] = None, page_size: int = 1000) -> Optional[np.ndarray]:
+        """
+        Returns the normalized mean embedding of the collection, or None if it is empty.
+
+        Embeddings are read and summed a page at a time. A collection larger
+        than `sample_size` is estimated from evenly spaced pages instead of
+        being read whole.
+        """
+        collection = self.vector_db._collection
+        count = collection.count()
+        if not count:
+            return None
+        sample_size = min(sample_size or count, count)
+        pages = math.ceil(sample_size / page_size)
+        per_page = math.ceil(sample_size / pages)
+
+        total = None
+        for page in range(pages):
+            # Page i reads from the start of the i-th slice of the collection, not just the oldest chunks
+            start, end = page * count // pages, (page + 1) * count // pages
+            embeddings = collection.get(include=["embeddings"], limit=min(per_page, end - start), offset=start)["embeddings"]
+            if embeddings is None or len(embeddings) == 0:
+                continue
+            page_sum = np.asarray(embeddings, dtype=np.float32).sum(axis=0)
+            total = page_sum if total is None else total + page_sum
+        if total is None:
+            return None
+        norm = np.linalg.norm(total)
+        return total / norm if norm else total
 
     def get_retriever(self):
         """
@@ -37,3 +103,115 @@ class VectorService:
         """
         retriever = self.get_retriever()
         return await retriever.ainvoke(query)
+
+    def search_by_vector(self, embedding: List[float], k: int = 4) -> List[RetrievedChunk]:
+        """
+        Searches the collection with an already computed query embedding,
+        returning the stored chunk embeddings so later stages don't re-embed.
+        """
+        result = self.vector_db._collection.query(
+            query_embeddings=[embedding],
+            n_results=k,
+            include=["documents", "metadatas", "embeddings"],
+        )
+        if not result["ids"] or not result["ids"][0]:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        matrix = np.asarray(result["embeddings"][0], dtype=np.float32)
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        scores = matrix @ query
+
+        return [
+            RetrievedChunk(
+                id=chunk_id,
+                document=Document(page_content=text or "", metadata=metadata or {}),
+                embedding=matrix[i],
+                score=float(scores[i]),
+            )
+            for i, (chunk_id, text, metadata) in enumerate(
+                zip(result["ids"][0], result["documents"][0], result["metadatas"][0])
+            )
+        ]
+
+    def get_by_article_ids(self, article_ids: List[int], embedding: List[float]) -> List[RetrievedChunk]:
+        """
+        Loads the chunks stored for the given articles (in that order), scored
+        against the query embedding. Used to merge BM25 hits with vector hits.
+        """
+        if not article_ids:
+            return []
+        result = self.vector_db.get(
+            where={"article_id": {"$in": list(article_ids)}},
+            include=["documents", "metadatas", "embeddings"],
+        )
+        if not result["ids"]:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        matrix = np.asarray(result["embeddings"], dtype=np.float32)
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        scores = matrix @ query
+
+        rank = {article_id: i for i, article_id in enumerate(article_ids)}
+        chunks = [
+            RetrievedChunk(
+                id=chunk_id,
+                document=Document(page_content=text or "", metadata=metadata or {}),
+                embedding=matrix[i],
+                score=float(scores[i]),
+                keyword_match=True,
+            )
+            for i, (chunk_id, text, metadata) in enumerate(
+                zip(result["ids"], result["documents"], result["metadatas"])
+            )
+        ]
+        return sorted(chunks, key=lambda chunk: rank.get(chunk.document.metadata.get("article_id"), len(rank)))
+
+    async def asearch_by_vector(self, embedding: List[float], k: int = 4) -> List[RetrievedChunk]:
+        """
+        Asynchronous version of search_by_vector (Chroma's client is blocking).
+        """
+        return await asyncio.to_thread(self.search_by_vector, embedding, k)
+
+
+@lru_cache()
+def get_vector_service() -> VectorService:
+    """The shared service for the default 'articles' collection (one Chroma client per process)."""
+    return VectorService()
+
+
+def reciprocal_rank_fusion(rankings: List[List[RetrievedChunk]], rrf_k: int = 60) -> List[RetrievedChunk]:
+    """
+    Merges several ranked lists into one: each chunk scores sum(1 / (rrf_k + rank)).
+    """
+    fused: Dict[str, float] = {}
+    chunks: Dict[str, RetrievedChunk] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            fused[chunk.id] = fused.get(chunk.id, 0.0) + 1.0 / (rrf_k + rank)
+            chunks.setdefault(chunk.id, chunk)
+    return sorted(chunks.values(), key=lambda chunk: fused[chunk.id], reverse=True)
+
+async def asearch_collections(
+    vector_services: List[VectorService],
+    embedding: List[float],
+    k: int = 4,
+    timeout_ms: int = 1500,
+) -> List[List[RetrievedChunk]]:
+    """
+    Searches every collection concurrently. A collection that misses the
+    deadline or fails contributes an empty ranking instead of delaying the rest.
+    """
+    async def search(vector_service: VectorService) -> List[RetrievedChunk]:
+        try:
+            return await asyncio.wait_for(vector_service.asearch_by_vector(embedding, k), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            logger.warning("collection_search_timeout", collection=vector_service.collection_name, timeout_ms=timeout_ms)
+        except Exception as e:
+            logger.error("collection_search_error", collection=vector_service.collection_name, error=str(e))
+        return []
+
+    return list(await asyncio.gather(*(search(vs) for vs in vector_services)))
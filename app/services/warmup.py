@@ -0,0 +1,53 @@
+import asyncio
+import time
+from typing import Optional
+
+import structlog
+
+from app.services.rag_service import get_rag_service
+
+logger = structlog.get_logger()
+
+
+class Readiness:
+    """Tracks whether the process has finished warming up and can take traffic."""
+
+    def __init__(self):
+        self.ready = False
+        self.error: Optional[str] = None
+        self.warmup_seconds: Optional[float] = None
+
+    def status(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "warmup_seconds": self.warmup_seconds,
+            "last_error": self.error,
+        }
+
+
+readiness = Readiness()
+
+
+async def warm_up(max_backoff_seconds: float = 60.0):
+    """
+    Builds the RAG service (embedding model, Chroma, ChatGroq client) and runs
+    a dummy embed + search, retrying with backoff until it succeeds.
+    """
+    started = time.monotonic()
+    backoff = 1.0
+    while True:
+        try:
+            # The constructor loads models from disk, keep it off the event loop
+            service = await asyncio.to_thread(get_rag_service)
+            await service.warm_up()
+            break
+        except Exception as e:
+            readiness.error = str(e)
+            logger.error("warmup_failed", error=str(e), retry_in=backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff_seconds)
+
+    readiness.warmup_seconds = round(time.monotonic() - started, 2)
+    readiness.error = None
+    readiness.ready = True
+    logger.info("warmup_complete", seconds=readiness.warmup_seconds)
@@ -0,0 +1,97 @@
+"""
+Compares the "hf" and "onnx" embedding backends on throughput, resident
+memory and embedding drift.
+
+Each backend runs in its own process so RSS numbers are not polluted by the
+other one. Run from the repository root:
+
+    python scripts/benchmark_embeddings.py --texts 512
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+
+SAMPLE_SENTENCES = [
+    "Brazil's central bank kept interest rates unchanged amid inflation concerns.",
+    "European leaders met in Brussels to discuss energy prices and the winter outlook.",
+    "Heavy rains caused flooding across Rio Grande do Sul, displacing thousands.",
+    "The French government announced new measures to support farmers.",
+    "Lula and Macron signed an agreement on Amazon rainforest protection.",
+    "Germany's economy contracted slightly in the third quarter.",
+    "Protests in São Paulo demanded better public transport.",
+    "Spain and Portugal reported record tourism numbers this summer.",
+]
+
+
+def make_texts(count: int):
+    return [f"{SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]} (item {i})" for i in range(count)]
+
+
+def rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend: str, texts, queue):
+    from app.core.config import settings
+
+    settings.EMBEDDING_BACKEND = backend
+    from app.db.vector_store import get_embedding_model
+
+    baseline = rss_mb()
+    started = time.perf_counter()
+    # The raw model: the embedding cache would turn the second pass into lookups
+    embeddings = get_embedding_model()
+    load_seconds = time.perf_counter() - started
+
+    embeddings.embed_documents(texts[:8])  # Warmup
+    started = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+
+    queue.put({
+        "backend": backend,
+        "load_s": load_seconds,
+        "docs_per_s": len(texts) / elapsed,
+        "rss_mb": rss_mb() - baseline,
+        "vectors": vectors,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=512, help="number of texts to embed")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    context = mp.get_context("spawn")
+    results = {}
+    for backend in ("hf", "onnx"):
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(backend, texts, queue))
+        process.start()
+        results[backend] = queue.get()
+        process.join()
+
+    print(f"{'backend':<8} {'load s':>8} {'docs/s':>10} {'RSS MB':>8}")
+    for backend, result in results.items():
+        print(f"{backend:<8} {result['load_s']:>8.2f} {result['docs_per_s']:>10.1f} {result['rss_mb']:>8.1f}")
+
+    hf, onnx = results["hf"]["vectors"], results["onnx"]["vectors"]
+    hf = hf / np.linalg.norm(hf, axis=1, keepdims=True)
+    onnx = onnx / np.linalg.norm(onnx, axis=1, keepdims=True)
+    cosine = (hf * onnx).sum(axis=1)
+
+    # Do both backends rank the same neighbours first?
+    top_hf = np.argsort(-(hf @ hf.T), axis=1)[:, 1:6]
+    top_onnx = np.argsort(-(onnx @ hf.T), axis=1)[:, 1:6]
+    overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(top_hf, top_onnx)])
+
+    print(f"\ndrift: mean cosine {cosine.mean():.4f}, min cosine {cosine.min():.4f}, top-5 overlap {overlap:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures bcrypt logins/sec per core for a few cost factors, then the
+throughput and load shedding of the PasswordHasher pool under a login burst.
+
+Run from the repository root (needs the same environment as the API):
+
+    python scripts/benchmark_password_hashing.py --rounds 10 11 12 --burst 64
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.core.security import PasswordHasher, PasswordHasherBusy, _hash, _verify_and_update
+
+
+def single_core(rounds: int, seconds: float) -> float:
+    hashed = _hash("benchmark-password", rounds)
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        _verify_and_update("benchmark-password", hashed, rounds)
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+async def burst(rounds: int, workers: int, max_pending: int, logins: int):
+    hasher = PasswordHasher(workers=workers, max_pending=max_pending, rounds=rounds, use_processes=True)
+    hashed = _hash("benchmark-password", rounds)
+    # Start the worker processes before timing
+    await asyncio.gather(*(hasher.verify("benchmark-password", hashed) for _ in range(workers)))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(hasher.verify("benchmark-password", hashed) for _ in range(logins)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    accepted = sum(1 for r in results if not isinstance(r, PasswordHasherBusy))
+    return accepted / elapsed, logins - accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13], help="bcrypt cost factors")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time per single-core measurement")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="pool size for the burst")
+    parser.add_argument("--max-pending", type=int, default=32, help="queue limit for the burst")
+    parser.add_argument("--burst", type=int, default=64, help="concurrent logins in the burst")
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'logins/s/core':>14} {'ms/login':>9}")
+    for rounds in args.rounds:
+        rate = single_core(rounds, args.seconds)
+        print(f"{rounds:>6} {rate:>14.1f} {1000 / rate:>9.1f}")
+
+    print(f"\nburst of {args.burst} logins, {args.workers} worker processes, max pending {args.max_pending}")
+    print(f"{'rounds':>6} {'logins/s':>9} {'per core':>9} {'shed (429)':>11}")
+    for rounds in args.rounds:
+        rate, shed = asyncio.run(burst(rounds, args.workers, args.max_pending, args.burst))
+        print(f"{rounds:>6} {rate:>9.1f} {rate / args.workers:>9.1f} {shed:>11}")
+
+
+if __name__ == "__main__":
+    main()
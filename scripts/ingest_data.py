@@ -1,11 +1,40 @@
-import feedparser
+"""
+Fetches the configured RSS feeds and upserts their chunks into one Chroma
+collection per feed.
+
+Articles stream through the shared ingestion pipeline
+(app/services/ingest_pipeline.py, the same one the API uses): chunk,
+dedupe, compare with the collection, embed in batches, write. Stages are
+joined by bounded queues and at most `--feeds` feeds are in flight, so
+memory stays flat however many feeds and articles there are.
+
+Chunk ids are derived from the article URL and the chunk's position, so a
+re-run writes nothing for unchanged articles, re-embeds changed chunks in
+place and deletes the chunks an article no longer has (including those of
+earlier runs that used random ids). Chunking and embedding run in a process
+pool and only this process writes to Chroma. A dry run creates nothing;
+the exit code is 1 when any feed failed. Run from the repository root:
+
+    python scripts/ingest_data.py                     # ingest every feed
+    python scripts/ingest_data.py --dry-run           # report the delta only
+    python scripts/ingest_data.py --workers 4 --batch-size 64
+"""
+import argparse
+import asyncio
+import hashlib
 import logging
+import multiprocessing as mp
 import os
-import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Tuple
+
 import langsmith as ls
+from chromadb.errors import NotFoundError
 from dotenv import load_dotenv
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
@@ -13,77 +42,236 @@ from langchain_core.documents import Document
 load_dotenv()
 
 CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma_db")
-EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
 
 from app.core.config import settings
+from app.db.embedding_cache import CachedEmbeddings
+from app.db.vector_store import get_embedding_function
+from app.services.ingest_pipeline import Chunk, IngestPipeline, fetch_documents
+from app.services.rss_fetcher import RSSFetcher
 
 RSS_FEEDS = settings.get_feeds()
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-@ls.traceable
-def parse_rss_feed(feed_url: str) -> list[Document]:
+
+def article_id(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+
+
+def chunk_id(url: str, index: int) -> str:
+    return f"{article_id(url)}-{index}"
+
+
+def entry_to_document(entry) -> Document:
+    source = str(entry.get("link", ""))
+    title = str(entry.get("title", "No Title"))
+    return Document(
+        # The pipeline names chunks {document id}-{position}, i.e. chunk_id(url, position)
+        id=article_id(source or title),
+        page_content=str(entry.get("summary", "")),
+        metadata={
+            "title": title,
+            "source": source,
+            "published": str(entry.get("published", "N/A")),
+        },
+    )
+
+
+def embed_texts(texts: List[str]) -> Tuple[List[List[float]], int]:
+    """
+    Embeds one batch in a pool worker (the model is loaded once per worker).
+    Returns the vectors and how many came from the embedding cache.
+    """
+    embeddings = get_embedding_function()
+    if not isinstance(embeddings, CachedEmbeddings):
+        return embeddings.embed_documents(texts), 0
+    hits = embeddings.hits
+    vectors = embeddings.embed_documents(texts)
+    return vectors, embeddings.hits - hits
+
+
+@dataclass
+class Delta:
+    new: List[Chunk]
+    changed: List[Chunk]
+    unchanged: int
+    stale_ids: List[str]
+
+
+def plan(collection, chunks: List[Chunk]) -> Delta:
+    """
+    Compares chunks (all of those of their articles) with what the
+    collection already stores (everything is new without a collection).
+    """
+    if collection is None:
+        return Delta(list(chunks), [], 0, [])
+    ids = [chunk.id for chunk in chunks]
+    stored = collection.get(ids=ids, include=["documents", "metadatas"]) if ids else {"ids": []}
+    stored_by_id = {
+        id_: (text, metadata)
+        for id_, text, metadata in zip(stored["ids"], stored.get("documents") or [], stored.get("metadatas") or [])
+    }
+    new = [chunk for chunk in chunks if chunk.id not in stored_by_id]
+    changed = [chunk for chunk in chunks if chunk.id in stored_by_id and stored_by_id[chunk.id] != (chunk.text, chunk.metadata)]
+
+    # Chunks of these articles that the current text no longer produces
+    sources = sorted({chunk.metadata["source"] for chunk in chunks if chunk.metadata["source"]})
+    previous = collection.get(where={"source": {"$in": sources}}, include=[]) if sources else {"ids": []}
+    current = set(ids)
+    stale_ids = [id_ for id_ in previous["ids"] if id_ not in current]
+    return Delta(new, changed, len(chunks) - len(new) - len(changed), stale_ids)
+
+
+def open_collection(chroma_path: str, name: str, dry_run: bool):
+    """
+    The feed's collection. A dry run only opens an existing one and returns
+    None otherwise, so it leaves nothing behind on disk.
+    """
+    if dry_run and not os.path.exists(os.path.join(chroma_path, "chroma.sqlite3")):
+        return None
     try:
-        feed = feedparser.parse(feed_url)
-        if feed.bozo:
-            logging.warning(f"Error parsing feed {feed_url}: {feed.bozo_exception}")
+        # Only used for reads and upserts of precomputed vectors: no embedding model here
+        return Chroma(collection_name=name, persist_directory=chroma_path, create_collection_if_not_exists=not dry_run)._collection
+    except NotFoundError:
+        return None
+
+
+def make_executor(workers: int) -> Executor:
+    if workers:
+        # spawn: forking a process that already runs threads is unsafe
+        return ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"))
+    # 0: everything in this process, for debugging and tests
+    return ThreadPoolExecutor(1)
+
+
+async def ingest_feed(
+    feed: dict,
+    fetcher: RSSFetcher,
+    executor: Executor,
+    workers: int,
+    chroma_path: str,
+    batch_size: int,
+    dry_run: bool,
+    totals: Counter,
+):
+    loop = asyncio.get_running_loop()
+    name = feed["name"]
+    collection = open_collection(chroma_path, name, dry_run)
+    delta_totals: Counter = Counter()
+
+    async def select(chunks: List[Chunk]) -> List[Chunk]:
+        delta = plan(collection, chunks)
+        delta_totals.update(new=len(delta.new), changed=len(delta.changed), unchanged=delta.unchanged, stale=len(delta.stale_ids))
+        if dry_run:
             return []
+        if delta.stale_ids:
+            collection.delete(ids=delta.stale_ids)
+        return delta.new + delta.changed
 
-        logging.info(f"Found {len(feed.entries)} entries in feed {feed_url}")
+    async def embed(texts: List[str]) -> List[List[float]]:
+        vectors, cache_hits = await loop.run_in_executor(executor, embed_texts, texts)
+        delta_totals["cache_hits"] += cache_hits
+        return vectors
 
-        documents = []
-        for entry in feed.entries:
-            doc = Document(
-                page_content=str(entry.get("summary", "")),
-                metadata={
-                    "title": str(entry.get("title", "No Title")),
-                    "source": str(entry.get("link", "")),
-                    "published": str(entry.get("published", "N/A")),
-                },
-            )
-            documents.append(doc)
-        return documents
+    async def write(chunks: List[Chunk], vectors: List[List[float]]):
+        collection.upsert(
+            ids=[chunk.id for chunk in chunks],
+            embeddings=vectors,
+            documents=[chunk.text for chunk in chunks],
+            metadatas=[chunk.metadata for chunk in chunks],
+        )
 
-    except Exception as e:
-        logging.error(f"An unexpected error occurred while parsing {feed_url}: {e}")
-        return []
+    pipeline = IngestPipeline(
+        embed, write, select=select, executor=executor, batch_size=batch_size,
+        # Enough batches in flight to keep every pool worker busy
+        embed_concurrency=max(workers, 1) * 2,
+    )
+    result = await pipeline.run(fetch_documents(fetcher, feed["url"], entry_to_document))
+    if not result["documents"]:
+        logging.warning(f"No articles found for {name}. Skipping.")
+        return
 
+    totals.update(
+        docs=result["documents"], chunks=result["chunks"], duplicates=result["duplicates"],
+        embedded=result["embedded"], **delta_totals,
+    )
+    logging.info(
+        f"{name}: {result['documents']} articles, {result['chunks']} chunks: {delta_totals['new']} new, "
+        f"{delta_totals['changed']} changed, {delta_totals['unchanged']} unchanged, {delta_totals['stale']} stale"
+    )
 
-@ls.traceable
-def ingest_data():
-    logging.info("Starting data ingestion process...")
 
-    embedding_function = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+async def ingest(
+    feeds: List[dict],
+    chroma_path: str = CHROMA_PATH,
+    workers: int = 2,
+    batch_size: int = None,
+    dry_run: bool = False,
+    fetcher: RSSFetcher = None,
+    max_feeds: int = 4,
+) -> Counter:
+    """
+    Ingests every feed, `max_feeds` at a time, and returns the totals (docs,
+    chunks, duplicates, new, changed, unchanged, stale, embedded,
+    cache_hits, failed_feeds, seconds).
+    """
+    started = time.perf_counter()
+    fetcher = fetcher or RSSFetcher()
+    executor = make_executor(workers)
+    feed_slots = asyncio.Semaphore(max_feeds)
+    totals: Counter = Counter()
 
-    for feed_info in RSS_FEEDS:
-        name = feed_info["name"]
-        url = feed_info["url"]
-        logging.info(f"--- Processing collection: {name} from {url} ---")
+    async def run(feed: dict):
+        async with feed_slots:
+            await ingest_feed(feed, fetcher, executor, workers, chroma_path, batch_size, dry_run, totals)
 
-        docs = parse_rss_feed(url)
-        if not docs:
-            logging.warning(f"No articles found for {name}. Skipping.")
-            continue
+    try:
+        outcomes = await asyncio.gather(*(run(feed) for feed in feeds), return_exceptions=True)
+        for feed, outcome in zip(feeds, outcomes):
+            if isinstance(outcome, Exception):
+                totals["failed_feeds"] += 1
+                logging.error(f"Failed to ingest into Chroma for collection {feed['name']}: {outcome}")
+    finally:
+        executor.shutdown()
+        await fetcher.aclose()
 
-        chunks = text_splitter.split_documents(docs)
-        logging.info(f"Split {len(docs)} articles into {len(chunks)} chunks.")
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+@ls.traceable
+def ingest_data(workers: int = 2, batch_size: int = None, dry_run: bool = False, max_feeds: int = 4) -> Counter:
+    logging.info("Starting data ingestion process..." + (" (dry run)" if dry_run else ""))
+    totals = asyncio.run(ingest(RSS_FEEDS, CHROMA_PATH, workers, batch_size, dry_run, max_feeds=max_feeds))
 
-        try:
-            vector_store = Chroma.from_documents(
-                documents=chunks,
-                embedding=embedding_function,  # ✅ correct name
-                collection_name=name,
-                persist_directory=CHROMA_PATH,
-            )       
+    seconds = totals["seconds"]
+    print(
+        f"{'(dry run) ' if dry_run else ''}{len(RSS_FEEDS)} feeds, {totals['docs']} articles, {totals['chunks']} chunks "
+        f"in {seconds:.1f}s: {totals['docs'] / seconds:.1f} docs/s, {totals['chunks'] / seconds:.1f} chunks/s"
+    )
+    print(
+        f"delta: {totals['new']} new, {totals['changed']} changed, {totals['unchanged']} unchanged, "
+        f"{totals['stale']} stale, {totals['duplicates']} duplicates; embedded {totals['embedded']} ({totals['cache_hits']} from the embedding cache)"
+    )
+    if totals["failed_feeds"]:
+        logging.error(f"--- Data ingestion finished with {totals['failed_feeds']} failed feed(s) ---")
+    else:
+        logging.info("--- Data ingestion process finished successfully! ---")
+    return totals
 
-            logging.info(f"Successfully ingested {len(chunks)} chunks into '{name}'.")
-        except Exception as e:
-            logging.error(f"Failed to ingest into Chroma for collection {name}: {e}")
 
-    logging.info("--- Data ingestion process finished successfully! ---")
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="processes for chunking and embedding (0: in-process)")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_EMBED_BATCH_SIZE, help="chunks per embedding batch")
+    parser.add_argument("--feeds", type=int, default=4, help="feeds fetched and ingested at the same time")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+    totals = ingest_data(args.workers, args.batch_size, args.dry_run, args.feeds)
+    # Non-zero when any feed failed, so cron and CI notice
+    sys.exit(1 if totals["failed_feeds"] else 0)
 
 
 if __name__ == "__main__":
-    ingest_data()
+    main()
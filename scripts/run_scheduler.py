@@ -0,0 +1,46 @@
+"""
+Runs the adaptive feed scheduler as its own process, for deployments that
+keep SCHEDULER_ENABLED off in the API. Several copies can run: only the
+holder of the advisory lock queues refreshes. The refreshes themselves are
+jobs, run by the API's job worker or scripts/run_worker.py. Run from the
+repository root:
+
+    python scripts/run_scheduler.py            # until interrupted
+    python scripts/run_scheduler.py --once     # a single tick
+"""
+import argparse
+import asyncio
+
+from app.core.logging import setup_logging
+from app.db.session import async_engine
+from app.services.feed_scheduler import FeedScheduler
+
+
+async def run(once: bool):
+    scheduler = FeedScheduler()
+    try:
+        if once:
+            enqueued = await scheduler.run_once()
+            print(f"leader={scheduler.is_leader} enqueued={enqueued} {scheduler.stats()}")
+        else:
+            scheduler.start()
+            await asyncio.Event().wait()
+    finally:
+        await scheduler.stop()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="run one tick and exit")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        asyncio.run(run(args.once))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
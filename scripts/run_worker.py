@@ -0,0 +1,51 @@
+"""
+Runs a job worker as its own process, for deployments that keep
+JOB_WORKER_ENABLED off in the API. Any number of workers can share the
+jobs table. Run from the repository root:
+
+    python scripts/run_worker.py                 # until interrupted
+    python scripts/run_worker.py --concurrency 4
+    python scripts/run_worker.py --drain         # run due jobs, then exit
+"""
+import argparse
+import asyncio
+
+from app.core.logging import setup_logging
+from app.db.session import async_engine
+from app.services.jobs import get_job_worker
+from app.services.rss_fetcher import get_rss_fetcher
+
+
+async def run(drain: bool, concurrency: int = None):
+    worker = get_job_worker()
+    if concurrency:
+        worker.concurrency = concurrency
+    try:
+        if drain:
+            while await worker.run_once():
+                pass
+            print(worker.stats())
+        else:
+            worker.start()
+            await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        await get_rss_fetcher().aclose()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, help="jobs run at the same time")
+    parser.add_argument("--drain", action="store_true", help="run the jobs that are due and exit")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        asyncio.run(run(args.drain, args.concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,45 @@
+import os
+import tempfile
 import pytest
 from typing import Generator, AsyncGenerator
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
+
+# Tests mock the RAG service; don't load models at startup
+os.environ.setdefault("WARMUP_ENABLED", "false")
+# Chat tests mock the RAG service; conversation memory has its own tests
+os.environ.setdefault("CONVERSATION_MEMORY_ENABLED", "false")
+# Jobs are run explicitly by the job queue tests
+os.environ.setdefault("JOB_WORKER_ENABLED", "false")
 
 from app.main import app
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db
 from app.db.models import Base
+from app.services.principal_cache import get_principal_cache
+from app.services.admission import get_llm_limiter, get_rate_limiter
+from app.services.job_queue import JobQueue, get_job_queue
 
-# Use an in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# A file-backed SQLite database, so the sync session used to seed data and the
+# aiosqlite session used by the endpoints see the same tables
+_db_file = os.path.join(tempfile.mkdtemp(), "test.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{_db_file}"
+SQLALCHEMY_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{_db_file}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: TestClient runs the app on its own event loop, connections must not outlive it
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=NullPool)
+
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 @pytest.fixture(scope="function")
 def db_session() -> Generator[Session, None, None]:
     """
@@ -47,10 +67,28 @@ def client(db_session: Session) -> Generator[TestClient, None, None]:
         finally:
             pass
 
+    async def override_get_async_db() -> AsyncGenerator[AsyncSession, None]:
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_job_queue] = lambda: JobQueue(TestingAsyncSessionLocal)
+    # Tables are recreated per test, cached principals would point at old users
+    get_principal_cache().clear()
+    # Same for the per-user buckets; the LLM semaphore must belong to this client's loop
+    get_rate_limiter().reset()
+    get_llm_limiter.cache_clear()
     
     with TestClient(app) as c:
         yield c
     
     # Clear overrides
     app.dependency_overrides.clear()
+
+@pytest.fixture(scope="function")
+def async_session_factory(db_session: Session):
+    """
+    Async sessions on the same test database, for services that open their own.
+    """
+    return TestingAsyncSessionLocal
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+from app.core.security import create_access_token
+from app.db.models import User
+from app.services.admission import (
+    LLMConcurrencyLimiter,
+    LLMOverloaded,
+    MemoryBucketStore,
+    RateLimiter,
+    SqliteBucketStore,
+    get_llm_limiter,
+    get_rate_limiter,
+)
+
+def test_bucket_allows_burst_then_refills():
+    store = MemoryBucketStore()
+    results = [store.take("u", rate=1.0, capacity=2, now=100.0) for _ in range(3)]
+
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert results[2][1] == pytest.approx(1.0)
+    assert store.take("u", rate=1.0, capacity=2, now=101.0)[0] is True
+
+@pytest.mark.asyncio
+async def test_sqlite_store_is_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    first = RateLimiter(per_minute=60, burst=2, store=SqliteBucketStore(path))
+    second = RateLimiter(per_minute=60, burst=2, store=SqliteBucketStore(path))
+
+    assert (await first.check(7))[0] is True
+    assert (await second.check(7))[0] is True
+    allowed, retry_after = await first.check(7)
+    assert allowed is False and 0 < retry_after <= 1.0
+    assert (await second.check(8))[0] is True
+
+@pytest.mark.asyncio
+async def test_llm_limiter_queues_then_rejects():
+    limiter = LLMConcurrencyLimiter(max_in_flight=1, max_queue=1, queue_timeout_ms=1000)
+    first = await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.stats()["queue_depth"] == 1
+    # Queue full: rejected without waiting
+    with pytest.raises(LLMOverloaded):
+        await limiter.acquire()
+
+    first.release()
+    first.release()  # Idempotent
+    second = await waiter
+    assert limiter.stats()["in_flight"] == 1
+    second.release()
+
+    stats = limiter.stats()
+    assert stats["admitted"] == 2 and stats["rejected"] == 1 and stats["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_llm_limiter_times_out_waiters():
+    limiter = LLMConcurrencyLimiter(max_in_flight=1, max_queue=5, queue_timeout_ms=20)
+    slot = await limiter.acquire()
+
+    with pytest.raises(LLMOverloaded):
+        await limiter.acquire()
+
+    assert limiter.stats()["timed_out"] == 1
+    assert limiter.stats()["queue_depth"] == 0
+    slot.release()
+
+def test_chat_returns_429_when_bucket_is_empty(client: TestClient, db_session, monkeypatch):
+    from app.main import app
+    from app.core.config import settings
+    from app.services.rag_service import get_rag_service
+
+    db_session.add(User(email="limited@example.com", hashed_password="x"))
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'limited@example.com'})}"}
+    mock_service = MagicMock()
+    mock_service.ask_question = AsyncMock(return_value={"answer": "ok", "context": []})
+    app.dependency_overrides[get_rag_service] = lambda: mock_service
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 1)
+    get_rate_limiter.cache_clear()
+
+    try:
+        assert client.post("/api/chat", json={"question": "q"}, headers=headers).status_code == 200
+        response = client.post("/api/chat", json={"question": "q"}, headers=headers)
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        mock_service.ask_question.assert_awaited_once()
+    finally:
+        get_rate_limiter.cache_clear()
+
+def test_chat_releases_llm_slot_when_summary_fails(client: TestClient, db_session, monkeypatch):
+    from app.main import app
+    from app.core.config import settings
+    from app.services.rag_service import get_rag_service
+
+    db_session.add(User(email="memory-fail@example.com", hashed_password="x"))
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'memory-fail@example.com'})}"}
+    mock_service = MagicMock()
+    mock_service.conversation_memory.get = AsyncMock(side_effect=RuntimeError("db down"))
+    limiter = LLMConcurrencyLimiter(max_in_flight=1, max_queue=0, queue_timeout_ms=10)
+    app.dependency_overrides[get_rag_service] = lambda: mock_service
+    app.dependency_overrides[get_llm_limiter] = lambda: limiter
+    monkeypatch.setattr(settings, "CONVERSATION_MEMORY_ENABLED", True)
+
+    for _ in range(2):
+        # Had the first request leaked the only slot, the second would be a 503
+        response = client.post("/api/chat", json={"question": "q", "history_id": 1}, headers=headers)
+        assert response.status_code == 500
+    assert limiter.stats()["in_flight"] == 0
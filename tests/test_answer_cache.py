@@ -0,0 +1,41 @@
+from unittest.mock import patch
+from app.services.answer_cache import SemanticAnswerCache
+
+def test_similar_question_hits_cache():
+    cache = SemanticAnswerCache(similarity_threshold=0.9, ttl_seconds=60, max_entries=10)
+    cache.store([1.0, 0.0, 0.0], "What happened in Rio?", {"answer": "Carnival", "context": []})
+
+    assert cache.lookup([0.99, 0.05, 0.0])["answer"] == "Carnival"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "version": 0}
+
+def test_expired_entries_are_not_served():
+    cache = SemanticAnswerCache(similarity_threshold=0.9, ttl_seconds=60, max_entries=10)
+    with patch("app.services.answer_cache.time.monotonic", return_value=0):
+        cache.store([1.0, 0.0], "q", {"answer": "a", "context": []})
+    with patch("app.services.answer_cache.time.monotonic", return_value=61):
+        assert cache.lookup([1.0, 0.0]) is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(similarity_threshold=0.9, ttl_seconds=60, max_entries=2)
+    cache.store([1.0, 0.0, 0.0], "a", {"answer": "a", "context": []})
+    cache.store([0.0, 1.0, 0.0], "b", {"answer": "b", "context": []})
+    cache.lookup([1.0, 0.0, 0.0])  # "a" is now the most recently used
+    cache.store([0.0, 0.0, 1.0], "c", {"answer": "c", "context": []})
+
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0, 0.0])["answer"] == "a"
+
+def test_newer_index_version_drops_older_answers():
+    cache = SemanticAnswerCache(similarity_threshold=0.9, ttl_seconds=60, max_entries=10)
+    cache.store([1.0, 0.0], "q", {"answer": "old", "context": []}, version=1)
+    assert cache.lookup([1.0, 0.0], version=1)["answer"] == "old"
+
+    # Another worker embedded new articles
+    assert cache.lookup([1.0, 0.0], version=2) is None
+    # An answer retrieved before that commit is not cached under the new version
+    cache.store([1.0, 0.0], "q", {"answer": "old", "context": []}, version=1)
+    assert cache.lookup([1.0, 0.0], version=2) is None
+
+    cache.store([1.0, 0.0], "q", {"answer": "new", "context": []}, version=2)
+    assert cache.lookup([1.0, 0.0], version=2)["answer"] == "new"
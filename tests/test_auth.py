@@ -1,3 +1,5 @@
+import asyncio
+import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from app.db.models import User
@@ -49,3 +51,33 @@ def test_login_invalid_credentials(client: TestClient):
         data={"username": "wrong@example.com", "password": "wrongpassword"}
     )
     assert response.status_code == 401
+
+def test_login_rehashes_outdated_cost_factor(client: TestClient, db_session: Session):
+    from app.main import app
+    from app.core.security import PasswordHasher, get_password_hasher, _hash
+
+    hasher = PasswordHasher(workers=1, max_pending=4, rounds=5, use_processes=False)
+    app.dependency_overrides[get_password_hasher] = lambda: hasher
+    user = User(email="rehash@example.com", hashed_password=_hash("password", 4))
+    db_session.add(user)
+    db_session.commit()
+
+    response = client.post("/api/auth/token", data={"username": "rehash@example.com", "password": "password"})
+
+    assert response.status_code == 200
+    db_session.refresh(user)
+    assert user.hashed_password.startswith("$2b$05$")
+    assert hasher.stats()["rehashed"] == 1
+
+@pytest.mark.asyncio
+async def test_password_hasher_sheds_beyond_max_pending():
+    from app.core.security import PasswordHasher, PasswordHasherBusy
+
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=4, use_processes=False)
+    results = await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+
+    assert isinstance(results[0], str)
+    assert isinstance(results[1], PasswordHasherBusy)
+    assert hasher.stats()["rejected"] == 1
+    assert (await hasher.verify("a", results[0]))[0] is True
+    hasher.shutdown()
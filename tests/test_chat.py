@@ -1,9 +1,11 @@
+from datetime import datetime
 from unittest.mock import MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from app.services.rag_service import get_rag_service
 from app.core.security import create_access_token
-from app.db.models import User
+from app.db.models import User, ChatHistory
 from app.core.security import get_password_hash
+from app.services.vector_service import RetrievalOptions
 from langchain_core.documents import Document
 
 def test_chat_endpoint(client: TestClient, db_session):
@@ -46,7 +48,7 @@ def test_chat_endpoint(client: TestClient, db_session):
         history_id = data["history_id"]
 
         # Verify RAG service was called
-        mock_service.ask_question.assert_called_once_with("What is the news?")
+        mock_service.ask_question.assert_called_once_with("What is the news?", RetrievalOptions(), None)
 
         # Send another question using the existing history_id
         mock_service.ask_question.reset_mock()
@@ -58,7 +60,156 @@ def test_chat_endpoint(client: TestClient, db_session):
         assert response_second.status_code == 200
         data_second = response_second.json()
         assert data_second["history_id"] == history_id
-        mock_service.ask_question.assert_called_once_with("Any updates?")
+        mock_service.ask_question.assert_called_once_with("Any updates?", RetrievalOptions(), None)
 
     finally:
         app.dependency_overrides.clear()
+
+def test_chat_stream_sse_sends_sources_first(client: TestClient, db_session):
+    user = User(email="stream@example.com", hashed_password=get_password_hash("pass"))
+    db_session.add(user)
+    db_session.commit()
+    token = create_access_token(data={"sub": "stream@example.com"})
+
+    docs = [Document(page_content="Source text", metadata={"source": "http://example.com/1"})]
+
+    async def fake_stream(question, options, summary=None):
+        yield "", docs
+        for chunk in ["Lula ", "visited ", "Paris."]:
+            yield chunk, docs
+
+    mock_service = MagicMock()
+    mock_service.ask_question_stream = fake_stream
+
+    from app.main import app
+    app.dependency_overrides[get_rag_service] = lambda: mock_service
+
+    try:
+        response = client.post(
+            "/api/chat/stream",
+            json={"question": "What is the news?"},
+            headers={"Authorization": f"Bearer {token}", "Accept": "text/event-stream"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+        assert events[0] == "event: sources"
+        assert events[-1] == "event: done"
+        assert "Source text" in response.text
+
+        history_id = int(response.headers["X-History-Id"])
+        history = client.get("/api/chat/history", headers={"Authorization": f"Bearer {token}"}).json()
+        assert history[0]["id"] == history_id
+        assert history[0]["answer"] == "Lula visited Paris."
+    finally:
+        app.dependency_overrides.clear()
+
+def test_chat_history_list_and_delete(client: TestClient, db_session):
+    user = User(email="history@example.com", hashed_password=get_password_hash("pass"))
+    db_session.add(user)
+    db_session.commit()
+    db_session.add_all([
+        ChatHistory(user_id=user.id, question=f"q{i}", answer=f"a{i}", timestamp=datetime(2024, 1, i + 1))
+        for i in range(3)
+    ])
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'history@example.com'})}"}
+
+    response = client.get("/api/chat/history?limit=2", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "3"
+    items = response.json()
+    assert [item["question"] for item in items] == ["q2", "q1"]
+
+    assert client.delete(f"/api/chat/history/{items[0]['id']}", headers=headers).status_code == 204
+    assert client.delete(f"/api/chat/history/{items[0]['id']}", headers=headers).status_code == 404
+    assert client.get("/api/chat/history", headers=headers).headers["X-Total-Count"] == "2"
+
+def test_chat_endpoint_write_behind(client: TestClient, db_session, async_session_factory, monkeypatch):
+    from app.main import app
+    from app.core.config import settings
+    from app.services.history_writer import HistoryWriter, get_history_writer
+
+    user = User(email="behind@example.com", hashed_password=get_password_hash("pass"))
+    db_session.add(user)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'behind@example.com'})}"}
+
+    writer = HistoryWriter(async_session_factory, max_batch=100, flush_interval_ms=60_000, id_block_size=10)
+    mock_service = MagicMock()
+    mock_service.ask_question = AsyncMock(return_value={"answer": "Queued answer.", "context": []})
+    monkeypatch.setattr(settings, "HISTORY_WRITE_BEHIND_ENABLED", True)
+    app.dependency_overrides[get_rag_service] = lambda: mock_service
+    app.dependency_overrides[get_history_writer] = lambda: writer
+
+    response = client.post("/api/chat", json={"question": "What is new?"}, headers=headers)
+    assert response.status_code == 200
+    history_id = response.json()["history_id"]
+    # Nothing written yet, the row only exists in the queue
+    assert db_session.query(ChatHistory).count() == 0
+    assert writer.owner_of(history_id) == user.id
+
+    # Listing flushes first, so the user sees their own write
+    items = client.get("/api/chat/history", headers=headers).json()
+    assert [(item["id"], item["answer"]) for item in items] == [(history_id, "Queued answer.")]
+
+def test_chat_history_keyset_pagination(client: TestClient, db_session):
+    user = User(email="pages@example.com", hashed_password=get_password_hash("pass"))
+    db_session.add(user)
+    db_session.commit()
+    # Two rows share a timestamp: the id breaks the tie
+    timestamps = [datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 2), datetime(2024, 1, 3), datetime(2024, 1, 4)]
+    db_session.add_all([
+        ChatHistory(user_id=user.id, question=f"q{i}", answer="a", timestamp=ts) for i, ts in enumerate(timestamps)
+    ])
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'pages@example.com'})}"}
+
+    seen = []
+    response = client.get("/api/chat/history?limit=2", headers=headers)
+    while True:
+        assert response.status_code == 200
+        seen += [item["question"] for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        response = client.get(f"/api/chat/history?limit=2&cursor={cursor}", headers=headers)
+        assert "X-Total-Count" not in response.headers
+
+    assert seen == ["q4", "q3", "q2", "q1", "q0"]
+    assert client.get("/api/chat/history?cursor=not-a-cursor", headers=headers).status_code == 400
+    for query in ("limit=0", "limit=-1", "limit=201", "offset=-1"):
+        assert client.get(f"/api/chat/history?{query}", headers=headers).status_code == 422
+
+def test_follow_up_stores_the_folded_summary_with_the_new_turn(client: TestClient, db_session, monkeypatch):
+    from app.main import app
+    from app.core.config import settings
+
+    user = User(email="follow-up@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    item = ChatHistory(user_id=user.id, question="Who won?", answer="Lula.", timestamp=datetime.utcnow())
+    db_session.add(item)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'follow-up@example.com'})}"}
+
+    mock_service = MagicMock()
+    mock_service.ask_question = AsyncMock(return_value={"answer": "In October.", "context": []})
+    mock_service.conversation_memory.get = AsyncMock(return_value="User asked: Who won? Lula.")
+    app.dependency_overrides[get_rag_service] = lambda: mock_service
+    monkeypatch.setattr(settings, "CONVERSATION_MEMORY_ENABLED", True)
+    try:
+        # A first question doesn't touch the memory
+        assert client.post("/api/chat", json={"question": "Hi"}, headers=headers).status_code == 200
+        mock_service.conversation_memory.get.assert_not_called()
+
+        response = client.post("/api/chat", json={"question": "When?", "history_id": item.id}, headers=headers)
+        assert response.status_code == 200
+        mock_service.ask_question.assert_called_with("When?", RetrievalOptions(), "User asked: Who won? Lula.")
+    finally:
+        app.dependency_overrides.clear()
+
+    db_session.expire_all()
+    stored = db_session.get(ChatHistory, item.id)
+    assert (stored.question, stored.answer, stored.summary) == ("When?", "In October.", "User asked: Who won? Lula.")
@@ -0,0 +1,56 @@
+import numpy as np
+from langchain_core.documents import Document
+from app.services.context_packer import ContextPacker
+from app.services.vector_service import RetrievedChunk
+
+def make_chunk(chunk_id, text, embedding, score, **metadata):
+    vector = np.asarray(embedding, dtype=np.float32)
+    return RetrievedChunk(
+        id=chunk_id,
+        document=Document(page_content=text, metadata=metadata),
+        embedding=vector / np.linalg.norm(vector),
+        score=score,
+    )
+
+def test_pack_formats_compactly_and_keeps_retrieval_order():
+    packer = ContextPacker(token_budget=1000, dedupe_threshold=0.95, score_margin=0.5)
+    chunks = [
+        make_chunk("b", "First story", [1.0, 0.0], 0.6, source="nyt", published_date="2025-01-01"),
+        make_chunk("a", "Second story", [0.0, 1.0], 0.8, source="nyt", url="http://x/2"),
+    ]
+
+    context, docs = packer.pack(chunks)
+
+    assert context == "[1] nyt, 2025-01-01\nFirst story\n\n[2] nyt\nSecond story"
+    assert [d.page_content for d in docs] == ["First story", "Second story"]
+
+def test_near_duplicates_are_dropped():
+    packer = ContextPacker(token_budget=1000, dedupe_threshold=0.95, score_margin=0.5)
+    chunks = [
+        make_chunk("a", "Lula meets Macron", [1.0, 0.0], 0.9),
+        make_chunk("b", "Lula meets Macron in Paris", [0.99, 0.01], 0.85),
+        make_chunk("c", "Floods in Porto Alegre", [0.0, 1.0], 0.7),
+    ]
+
+    assert [c.id for c in packer.select(chunks)] == ["a", "c"]
+
+def test_low_scores_are_cut_relative_to_best():
+    packer = ContextPacker(token_budget=1000, dedupe_threshold=0.99, score_margin=0.1)
+    chunks = [
+        make_chunk("a", "Relevant", [1.0, 0.0], 0.8),
+        make_chunk("b", "Unrelated", [0.0, 1.0], 0.5),
+    ]
+
+    assert [c.id for c in packer.select(chunks)] == ["a"]
+
+def test_token_budget_limits_context():
+    packer = ContextPacker(token_budget=30, dedupe_threshold=0.99, score_margin=1.0)
+    chunks = [
+        make_chunk("a", "x" * 80, [1.0, 0.0], 0.9),
+        make_chunk("b", "y" * 80, [0.0, 1.0], 0.8),
+    ]
+
+    context, docs = packer.pack(chunks)
+
+    assert len(docs) == 1
+    assert "y" not in context
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from app.db.models import ChatHistory, User
+from app.services.admission import LLMConcurrencyLimiter
+from app.services.conversation_memory import ConversationMemory, truncate_to_tokens
+
+def make_memory(responses, session_factory, **kwargs):
+    return ConversationMemory(
+        FakeListChatModel(responses=responses),
+        "{summary} | {question} | {answer} | {max_words}",
+        session_factory=session_factory,
+        **kwargs,
+    )
+
+def seed_history(db_session, **values) -> ChatHistory:
+    user = User(email="memory@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    item = ChatHistory(user_id=user.id, **values)
+    db_session.add(item)
+    db_session.commit()
+    return item
+
+def test_truncate_to_tokens_keeps_whole_words():
+    assert truncate_to_tokens("short", 10) == "short"
+    assert truncate_to_tokens("alpha beta gamma delta", 3) == "alpha beta"
+
+@pytest.mark.asyncio
+async def test_get_folds_the_last_turn_verbatim_while_it_fits(db_session, async_session_factory):
+    item = seed_history(db_session, question="Any news on Macron?", answer="He visited Brasília.")
+    memory = make_memory([], async_session_factory, token_budget=200)  # No LLM responses: it must not be called
+
+    summary = await memory.get(item.id, item.user_id)
+    assert summary == "User asked: Any news on Macron?\nAssistant answered: He visited Brasília."
+    assert await memory.get(item.id, item.user_id) == summary
+    assert await memory.get(item.id, item.user_id + 1) is None
+    assert memory.stats()["hits"] == 1
+    assert memory.stats()["misses"] == 1
+    assert memory.stats()["summaries"] == 0
+
+@pytest.mark.asyncio
+async def test_concurrent_follow_ups_share_one_summary_under_an_llm_slot(db_session, async_session_factory):
+    item = seed_history(db_session, summary="Earlier: Lula won.", question="Who won?", answer="Lula " * 100)
+    memory = make_memory(["Lula won the Brazilian election."], async_session_factory, token_budget=20)
+    limiter = LLMConcurrencyLimiter(max_in_flight=1, max_queue=0, queue_timeout_ms=1000)
+
+    summaries = await asyncio.gather(*(memory.get(item.id, item.user_id, limiter) for _ in range(3)))
+
+    assert summaries == ["Lula won the Brazilian election."] * 3
+    assert memory.stats()["summaries"] == 1
+    assert limiter.stats()["admitted"] == 1 and limiter.stats()["in_flight"] == 0
+    # Stored by the chat endpoint together with the follow-up, not here
+    db_session.expire_all()
+    assert db_session.get(ChatHistory, item.id).summary == "Earlier: Lula won."
+
+@pytest.mark.asyncio
+async def test_failed_summary_falls_back_to_the_last_turn(db_session, async_session_factory):
+    item = seed_history(db_session, question="q", answer="a " * 100)
+    memory = make_memory([], async_session_factory, token_budget=10)  # No responses left: the LLM call fails
+
+    summary = await memory.get(item.id, item.user_id)
+
+    assert summary.startswith("User asked: q\nAssistant answered: a")
+    assert memory.stats()["failed_summaries"] == 1
@@ -0,0 +1,57 @@
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.db.embedding_cache import KEYS_FILE, VECTORS_FILE, CachedEmbeddings, EmbeddingCache, cache_key
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic 4-d vectors; records every batch sent to the 'model'."""
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[len(t), sum(map(ord, t)) % 97, 1.0, 0.5] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def test_only_misses_are_embedded_in_one_batch(tmp_path):
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, EmbeddingCache(str(tmp_path)), "hf:test-model")
+
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    assert model.batches == [["alpha", "beta"]]
+
+    second = cached.embed_documents(["beta", "gamma", "  alpha "])
+    assert model.batches[1] == ["gamma"]
+    assert second[0] == first[1] and second[2] == first[0]  # Whitespace is normalized away
+
+    stats = cached.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 3, 3)
+    assert stats["hit_rate"] == 0.5
+    assert stats["bytes_saved"] == len("alpha") + len("beta") + len("  alpha ")
+
+def test_cache_persists_and_sees_other_writers(tmp_path):
+    writer = EmbeddingCache(str(tmp_path))
+    reader = EmbeddingCache(str(tmp_path))
+    keys = [cache_key("m", t) for t in ("a", "b")]
+    writer.put_many(keys, np.array([[1, 2], [3, 4]], dtype=np.float32))
+
+    # Appended by another instance (process) after this one was opened
+    assert [v.tolist() for v in reader.get_many(keys)] == [[1, 2], [3, 4]]
+    reopened = EmbeddingCache(str(tmp_path))
+    assert len(reopened) == 2 and reopened.get_many([cache_key("m", "c")]) == [None]
+    # Same text under another model is a different entry
+    assert cache_key("other", "a") != keys[0]
+
+def test_half_written_append_is_discarded(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many([cache_key("m", "a")], np.array([[1, 1]], dtype=np.float32))
+    # A crash after the vector but before its key was written
+    with open(os.path.join(tmp_path, VECTORS_FILE), "ab") as f:
+        f.write(np.array([9, 9], dtype=np.float32).tobytes())
+
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many([cache_key("m", "b")], np.array([[2, 2]], dtype=np.float32))
+    assert os.path.getsize(os.path.join(tmp_path, KEYS_FILE)) == 2 * 16
+    assert [v.tolist() for v in EmbeddingCache(str(tmp_path)).get_many([cache_key("m", "a"), cache_key("m", "b")])] == [[1, 1], [2, 2]]
@@ -0,0 +1,100 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from feedparser import FeedParserDict
+from app.db.models import Feed
+from app.services.feed_scheduler import FeedScheduler
+from app.services.job_queue import QUEUED, JobQueue, JobWorker
+from app.services.jobs import REFRESH_FEED, RefreshFeedJob
+from app.services.rss_fetcher import FetchResult
+
+class FakeFetcher:
+    """New entries for /busy, none for /quiet, an error for /broken."""
+    def __init__(self):
+        self.fetched = []
+        self.count = 0
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        self.fetched.append(url)
+        if url.endswith("/broken"):
+            return FetchResult(url, error="HTTP 500")
+        if url.endswith("/quiet"):
+            return FetchResult(url, not_modified=True)
+        self.count += 1
+        return FetchResult(url, entries=[FeedParserDict(
+            title=f"Title {self.count}",
+            link=f"{url}/{self.count}",
+            summary="Summary",
+            published_parsed=time.gmtime(1700000000),
+        )])
+
+class NoEmbedding:
+    def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+    def add_documents(self, documents, embeddings=None):
+        pass
+
+def make_scheduler(async_session_factory, **kwargs) -> FeedScheduler:
+    options = dict(default_interval=1000, min_interval=100, max_interval=10000, jitter=0.0)
+    options.update(kwargs)
+    return FeedScheduler(
+        session_factory=async_session_factory,
+        engine=async_session_factory.kw["bind"],
+        queue=JobQueue(async_session_factory),
+        **options,
+    )
+
+def add_feed(db_session, name: str, **columns) -> int:
+    feed = Feed(name=name, url=f"http://example.com/{name}", category="News", **columns)
+    db_session.add(feed)
+    db_session.commit()
+    return feed.id
+
+def test_interval_adapts_to_activity_and_failures(async_session_factory):
+    scheduler = make_scheduler(async_session_factory)
+    assert scheduler.next_interval(None, 3, 0) == 500
+    assert scheduler.next_interval(150, 3, 0) == 100  # Clamped to the minimum
+    assert scheduler.next_interval(1000, 0, 0) == 1500
+    assert scheduler.next_interval(9000, 0, 0) == 10000  # Clamped to the maximum
+    assert [scheduler.next_interval(100, None, n) for n in (1, 2, 3, 4)] == [2000, 4000, 8000, 10000]
+
+def test_jitter_stays_within_bounds(async_session_factory):
+    scheduler = make_scheduler(async_session_factory, jitter=0.2)
+    delays = [scheduler._jittered(1000).total_seconds() for _ in range(200)]
+    assert all(800 <= d <= 1200 for d in delays)
+    assert len(set(delays)) > 1
+
+@pytest.mark.asyncio
+async def test_tick_queues_due_feeds_and_jobs_reschedule_them(db_session, async_session_factory):
+    busy = add_feed(db_session, "busy", refresh_interval_seconds=1000)
+    quiet = add_feed(db_session, "quiet", refresh_interval_seconds=1000)
+    broken = add_feed(db_session, "broken", consecutive_failures=1)
+    add_feed(db_session, "later", next_fetch_at=datetime.utcnow() + timedelta(hours=1))
+    add_feed(db_session, "inactive", is_active=0)
+
+    scheduler = make_scheduler(async_session_factory)
+    before = datetime.utcnow()
+    assert await scheduler.run_once() == 3
+    # Queued, not refreshed: a second tick finds nothing due and queues nothing twice
+    assert await scheduler.run_once() == 0
+    assert await scheduler.queue.counts() == {QUEUED: 3}
+
+    fetcher = FakeFetcher()
+    handler = RefreshFeedJob(async_session_factory, fetcher, NoEmbedding(), on_refreshed=scheduler.record_refresh)
+    worker = JobWorker(scheduler.queue, {REFRESH_FEED: handler})
+    while await worker.run_once():
+        pass
+    assert sorted(fetcher.fetched) == [f"http://example.com/{n}" for n in ("broken", "busy", "quiet")]
+
+    db_session.expire_all()
+    feeds = {feed.id: feed for feed in db_session.query(Feed).all()}
+    assert feeds[busy].refresh_interval_seconds == 500
+    assert feeds[quiet].refresh_interval_seconds == 1500
+    assert (feeds[broken].consecutive_failures, feeds[broken].refresh_interval_seconds) == (2, 4000)
+    assert feeds[busy].next_fetch_at >= before + timedelta(seconds=500)
+
+    # Nothing is due until the next_fetch_at just written
+    assert await scheduler.due_feeds() == []
+    stats = scheduler.stats()
+    assert (stats["enqueued"], stats["refreshed"], stats["failed"]) == (3, 2, 1)
@@ -0,0 +1,108 @@
+import time
+import pytest
+from feedparser import FeedParserDict
+from sqlalchemy import event
+from app.db.models import Article, Feed
+from app.services import feed_service
+from app.services.feed_service import FeedService
+from app.services.index_version import IndexVersionReader
+from app.services.job_queue import JobQueue, JobWorker
+from app.services.jobs import REFRESH_FEED, RefreshFeedJob, enqueue_feed_refresh
+from app.services.rss_fetcher import FetchResult
+
+def entry(n: int) -> FeedParserDict:
+    return FeedParserDict(
+        title=f"Title {n}",
+        link=f"http://example.com/{n}",
+        summary=f"Summary {n}",
+        published_parsed=time.gmtime(1700000000 + n),
+    )
+
+class FakeFetcher:
+    def __init__(self, entries):
+        self.entries = entries
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        return FetchResult(url, entries=self.entries, etag='"v1"')
+
+class RecordingVectorService:
+    def __init__(self):
+        self.documents = []
+
+    def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+    def add_documents(self, documents, embeddings=None):
+        self.documents.extend(documents)
+
+def seed_feed(db_session) -> int:
+    feed = Feed(name="brazil", url="http://example.com/rss", category="News")
+    db_session.add(feed)
+    db_session.commit()
+    return feed.id
+
+async def run_refresh(async_session_factory, feed_id, fetcher, vectors) -> dict:
+    # The path the app runs: the scheduler or the API enqueues a job, a worker runs it
+    queue = JobQueue(async_session_factory)
+    worker = JobWorker(queue, {REFRESH_FEED: RefreshFeedJob(async_session_factory, fetcher, vectors)})
+    job = await enqueue_feed_refresh(queue, feed_id)
+    assert await worker.run_once() is True
+    return (await queue.get(job.id)).result
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("upsert", [True, False], ids=["on_conflict", "in_query"])
+async def test_refresh_inserts_and_embeds_only_new_articles(db_session, async_session_factory, monkeypatch, upsert):
+    if not upsert:
+        monkeypatch.setattr(feed_service, "UPSERT_INSERTS", {})
+    feed_id = seed_feed(db_session)
+    vectors = RecordingVectorService()
+
+    first = await run_refresh(async_session_factory, feed_id, FakeFetcher([entry(1), entry(2), entry(2)]), vectors)
+    assert first["new_articles"] == 2
+
+    statements = []
+    async with async_session_factory() as session:
+        feed = await session.get(Feed, feed_id)
+        listener = lambda *args: statements.append(args[2])
+        event.listen(session.bind.sync_engine, "before_cursor_execute", listener)
+        try:
+            service = FeedService(session, vector_service=vectors)
+            result = FetchResult(feed.url, entries=[entry(n) for n in range(1, 6)])
+            article_ids = await service.stage_fetch_result(feed, result)
+            await session.commit()
+        finally:
+            event.remove(session.bind.sync_engine, "before_cursor_execute", listener)
+        assert len(article_ids) == 3
+        # Dedupe/insert and the last_fetched update, whatever the feed size
+        assert len(statements) <= 3
+        assert await service.embed_articles(article_ids) == 3
+
+    assert sorted(doc.metadata["url"] for doc in vectors.documents) == [f"http://example.com/{n}" for n in range(1, 6)]
+    stored = {a.url: a.id for a in db_session.query(Article).all()}
+    assert {doc.metadata["url"]: doc.metadata["article_id"] for doc in vectors.documents} == stored
+
+@pytest.mark.asyncio
+async def test_feed_crud_does_not_open_the_vector_store(async_session_factory, monkeypatch):
+    def no_vector_store():
+        raise AssertionError("the vector store was opened")
+    monkeypatch.setattr(feed_service, "get_vector_service", no_vector_store)
+
+    async with async_session_factory() as session:
+        service = FeedService(session, FakeFetcher([]))
+        feed = await service.create_feed("brazil", "http://example.com/rss", "News")
+        assert [f.id for f in await service.get_feeds()] == [feed.id]
+        await service.delete_feed(feed.id)
+
+@pytest.mark.asyncio
+async def test_embedding_bumps_the_shared_index_version(db_session, async_session_factory):
+    feed_id = seed_feed(db_session)
+    # Stands in for another worker: it only sees the version through the database
+    reader = IndexVersionReader(async_session_factory, poll_seconds=3600)
+    assert await reader.current() == 0
+
+    fetcher, vectors = FakeFetcher([entry(1)]), RecordingVectorService()
+    await run_refresh(async_session_factory, feed_id, fetcher, vectors)
+    await run_refresh(async_session_factory, feed_id, fetcher, vectors)  # Nothing new: no bump
+
+    reader.expire()
+    assert await reader.current() == 1
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from app.db.models import ChatHistory, User
+from app.services.history_writer import HistoryWriter
+
+def _seed_user(db_session) -> int:
+    user = User(email="writer@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    return user.id
+
+@pytest.mark.asyncio
+async def test_stub_and_answer_are_written_as_one_insert(db_session, async_session_factory):
+    user_id = _seed_user(db_session)
+    writer = HistoryWriter(async_session_factory, max_batch=100, flush_interval_ms=1000, id_block_size=10)
+
+    first, second = await writer.allocate_id(), await writer.allocate_id()
+    assert second == first + 1
+    writer.insert(first, user_id, "q1", "")
+    writer.insert(second, user_id, "q2", "a2")
+    writer.update(first, answer="a1")
+    assert writer.owner_of(first) == user_id
+
+    await writer.flush()
+
+    rows = {row.id: row.answer for row in db_session.query(ChatHistory).all()}
+    assert rows == {first: "a1", second: "a2"}
+    assert writer.stats()["flushes"] == 1
+    assert writer.stats()["rows_written"] == 2
+    assert writer.owner_of(first) is None
+
+@pytest.mark.asyncio
+async def test_updates_to_flushed_rows_and_drain_on_stop(db_session, async_session_factory):
+    user_id = _seed_user(db_session)
+    writer = HistoryWriter(async_session_factory, max_batch=2, flush_interval_ms=60_000, id_block_size=10)
+    writer.start()
+
+    ids = [await writer.allocate_id() for _ in range(2)]
+    for history_id in ids:
+        writer.insert(history_id, user_id, "q", "")
+    # The size threshold wakes the flusher long before the interval
+    for _ in range(50):
+        if writer.stats()["rows_written"] == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert writer.stats()["rows_written"] == 2
+
+    writer.update(ids[0], answer="late answer")
+    await writer.stop()
+
+    db_session.expire_all()
+    assert db_session.get(ChatHistory, ids[0]).answer == "late answer"
+    assert writer.stats()["queued"] == 0
+
+@pytest.mark.asyncio
+async def test_bad_row_is_isolated_then_dropped(db_session, async_session_factory):
+    user_id = _seed_user(db_session)
+    taken = ChatHistory(user_id=user_id, question="existing", answer="a")
+    db_session.add(taken)
+    db_session.commit()
+    writer = HistoryWriter(async_session_factory, max_batch=100, flush_interval_ms=1000, id_block_size=10, max_row_attempts=2)
+
+    good = await writer.allocate_id()
+    writer.insert(good, user_id, "q", "a")
+    writer.insert(taken.id, user_id, "q", "a")  # Primary key already used: the batch fails
+
+    await writer.flush()
+    assert db_session.get(ChatHistory, good) is not None
+    assert writer.stats()["queued"] == 1 and writer.stats()["rows_written"] == 1
+
+    await writer.flush()
+    stats = writer.stats()
+    assert (stats["queued"], stats["dropped_rows"]) == (0, 1)
+    db_session.expire_all()
+    assert db_session.get(ChatHistory, taken.id).question == "existing"
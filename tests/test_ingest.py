@@ -0,0 +1,81 @@
+import pytest
+from feedparser import FeedParserDict
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from scripts import ingest_data
+from app.services.rss_fetcher import FetchResult
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class FakeFetcher:
+    def __init__(self, articles, error=None):
+        self.articles = articles
+        self.error = error
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        if self.error:
+            return FetchResult(url, error=self.error)
+        return FetchResult(url, entries=[FeedParserDict(title=url_, link=url_, summary=text) for url_, text in self.articles.items()])
+
+    async def aclose(self):
+        pass
+
+FEEDS = [{"name": "brazil", "url": "http://example.com/rss"}]
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(ingest_data, "get_embedding_function", lambda: fake)
+    return fake
+
+async def run(tmp_path, articles, dry_run=False):
+    return await ingest_data.ingest(
+        FEEDS, str(tmp_path), workers=0, batch_size=2, dry_run=dry_run, fetcher=FakeFetcher(articles)
+    )
+
+def stored_ids(tmp_path):
+    return sorted(Chroma(collection_name="brazil", persist_directory=str(tmp_path))._collection.get(include=[])["ids"])
+
+@pytest.mark.asyncio
+async def test_reingest_is_idempotent_and_removes_stale_chunks(tmp_path, embeddings):
+    long_text = " ".join(f"word{n}" for n in range(400))  # Several chunks
+    articles = {"http://example.com/a": long_text, "http://example.com/b": "Short article."}
+
+    dry = await run(tmp_path, articles, dry_run=True)
+    assert dry["new"] == dry["chunks"] > 2 and embeddings.embedded == 0
+    assert not (tmp_path / "chroma.sqlite3").exists()  # Nothing was created
+
+    first = await run(tmp_path, articles)
+    ids = stored_ids(tmp_path)
+    assert first["embedded"] == len(ids) == first["chunks"]
+    assert ingest_data.chunk_id("http://example.com/b", 0) in ids
+
+    # Same feed again: nothing is embedded or written
+    second = await run(tmp_path, articles)
+    assert (second["new"], second["changed"], second["embedded"]) == (0, 0, 0)
+    assert second["unchanged"] == first["chunks"]
+    assert stored_ids(tmp_path) == ids
+
+    # Article a shrank to one chunk: its other chunks go, b is untouched
+    articles["http://example.com/a"] = "Now a single chunk."
+    third = await run(tmp_path, articles)
+    assert (third["changed"], third["unchanged"], third["stale"]) == (1, 1, first["chunks"] - 2)
+    assert stored_ids(tmp_path) == sorted(
+        [ingest_data.chunk_id("http://example.com/a", 0), ingest_data.chunk_id("http://example.com/b", 0)]
+    )
+
+@pytest.mark.asyncio
+async def test_failed_feed_is_counted(tmp_path, embeddings):
+    totals = await ingest_data.ingest(
+        FEEDS, str(tmp_path), workers=0, fetcher=FakeFetcher({}, error="HTTP 500")
+    )
+    assert totals["failed_feeds"] == 1 and totals["embedded"] == 0
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from langchain_core.documents import Document
+from app.services.ingest_pipeline import IngestPipeline, clean_text
+
+class Recorder:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.batches = []
+        self.written = []
+
+    async def embed(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    async def write(self, chunks, vectors):
+        await asyncio.sleep(self.delay)
+        self.written.extend(chunks)
+
+def test_clean_text_strips_markup_and_keeps_paragraphs():
+    assert clean_text("<p>Caf&eacute;   prices\t rise</p>\n\n\n<p>Second</p>") == "Café prices rise\n\nSecond"
+
+@pytest.mark.asyncio
+async def test_chunks_are_deduplicated_and_embedded_in_batches():
+    recorder = Recorder()
+    long_text = " ".join(f"word{n}" for n in range(100))
+    documents = [
+        Document(id="a", page_content=long_text, metadata={"url": "a"}),
+        Document(id="b", page_content="Same story.", metadata={"url": "b"}),
+        Document(id="c", page_content="<b>Same</b> story.", metadata={"url": "c"}),  # Same text as b
+        Document(id="a", page_content=long_text, metadata={"url": "a"}),  # Listed twice
+    ]
+    pipeline = IngestPipeline(recorder.embed, recorder.write, chunk_size=200, chunk_overlap=0, batch_size=2, group_size=2)
+    totals = await pipeline.run(documents)
+
+    ids = [chunk.id for chunk in recorder.written]
+    a_chunks = [id_ for id_ in ids if id_.startswith("a-")]
+    assert len(a_chunks) > 1 and ids[:len(a_chunks)] == [f"a-{i}" for i in range(len(a_chunks))]
+    assert "b-0" in ids and "c-0" not in ids
+    assert recorder.written[-1].metadata == {"url": "b", "chunk": 0}
+    assert all(len(batch) <= 2 for batch in recorder.batches)
+    assert (totals["documents"], totals["embedded"]) == (4, len(ids))
+    assert totals["duplicates"] == totals["chunks"] - len(ids) == len(a_chunks) + 1
+
+@pytest.mark.asyncio
+async def test_slow_writes_hold_back_the_source():
+    recorder = Recorder(delay=0.002)
+    state = {"read": 0, "max_ahead": 0}
+
+    async def documents():
+        for n in range(200):
+            state["max_ahead"] = max(state["max_ahead"], state["read"] - len(recorder.written))
+            state["read"] += 1
+            yield Document(id=str(n), page_content=f"Article number {n}.", metadata={})
+
+    pipeline = IngestPipeline(recorder.embed, recorder.write, batch_size=2, queue_size=1, group_size=2)
+    totals = await pipeline.run(documents())
+    assert totals["embedded"] == 200
+    # Bounded by the queues and batches between the stages, not by the input size
+    assert state["max_ahead"] <= 16
+
+@pytest.mark.asyncio
+async def test_stage_failure_stops_the_pipeline():
+    async def failing_embed(texts):
+        raise RuntimeError("embedding backend down")
+
+    async def write(chunks, vectors):
+        raise AssertionError("nothing should be written")
+
+    def documents():
+        # Endless: the run only ends because the error cancels every stage
+        n = 0
+        while True:
+            n += 1
+            yield Document(id=str(n), page_content=f"Article {n}", metadata={})
+
+    with pytest.raises(RuntimeError, match="embedding backend down"):
+        await asyncio.wait_for(IngestPipeline(failing_embed, write, queue_size=1).run(documents()), 5)
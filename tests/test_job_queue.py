@@ -0,0 +1,165 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from feedparser import FeedParserDict
+from sqlalchemy import update
+from app.core.security import create_access_token, get_password_hash
+from app.db.models import Article, Feed, Job, User
+from app.services.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobLeaseLost, JobQueue, JobWorker
+from app.services.jobs import REFRESH_FEED, RefreshFeedJob, enqueue_feed_refresh
+from app.services.rss_fetcher import FetchResult
+
+class FakeFetcher:
+    def __init__(self, count: int = 5):
+        self.count = count
+        self.calls = 0
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        self.calls += 1
+        return FetchResult(url, entries=[
+            FeedParserDict(title=f"Title {n}", link=f"{url}/{n}", summary="Summary", published_parsed=time.gmtime(1700000000))
+            for n in range(self.count)
+        ])
+
+class FlakyVectorService:
+    """Fails the first `failures` calls, then records what it embeds."""
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.documents = []
+
+    def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+    def add_documents(self, documents, embeddings=None):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("embedding backend down")
+        self.documents.extend(documents)
+
+def add_feed(db_session) -> int:
+    feed = Feed(name="brazil", url="http://example.com/rss", category="News")
+    db_session.add(feed)
+    db_session.commit()
+    return feed.id
+
+async def make_due(async_session_factory, job_id: int):
+    # Skip the retry backoff
+    async with async_session_factory() as session:
+        await session.execute(update(Job).where(Job.id == job_id).values(run_at=datetime.utcnow()))
+        await session.commit()
+
+@pytest.mark.asyncio
+async def test_claim_retry_backoff_and_exhaustion(async_session_factory):
+    queue = JobQueue(async_session_factory, max_attempts=2, retry_base_seconds=60)
+    job = await queue.enqueue("noop", {"n": 1})
+
+    claimed = await queue.claim("w1")
+    assert (claimed.id, claimed.attempts, claimed.locked_by) == (job.id, 1, "w1")
+    assert await queue.claim("w2") is None
+
+    assert await queue.fail(claimed, "boom") is True
+    retried = await queue.get(job.id)
+    assert retried.status == QUEUED and retried.run_at > datetime.utcnow() + timedelta(seconds=50)
+    assert await queue.claim("w1") is None  # Backing off
+
+    await make_due(async_session_factory, job.id)
+    claimed = await queue.claim("w1")
+    assert claimed.attempts == 2
+    assert await queue.fail(claimed, "boom again") is False
+    failed = await queue.get(job.id)
+    assert (failed.status, failed.error) == (FAILED, "boom again")
+
+@pytest.mark.asyncio
+async def test_dedupe_and_expired_lease(async_session_factory):
+    queue = JobQueue(async_session_factory, lease_seconds=60)
+    first = await queue.enqueue("noop", {}, dedupe_key="k")
+    assert (await queue.enqueue("noop", {}, dedupe_key="k")).id == first.id
+
+    slow = await queue.claim("slow-worker")
+    assert await queue.requeue_expired() == 0
+    async with async_session_factory() as session:
+        stale = datetime.utcnow() - timedelta(seconds=120)
+        await session.execute(update(Job).where(Job.id == first.id).values(locked_at=stale))
+        await session.commit()
+    assert await queue.requeue_expired() == 1
+    owner = await queue.claim("w2")
+    assert owner.locked_by == "w2"
+
+    # The worker whose lease expired can no longer touch the job
+    for late_write in (queue.checkpoint(slow, {"stale": True}), queue.succeed(slow), queue.fail(slow, "late")):
+        with pytest.raises(JobLeaseLost):
+            await late_write
+    await queue.release(slow)
+    current = await queue.get(first.id)
+    assert (current.status, current.locked_by, current.progress) == (RUNNING, "w2", None)
+    await queue.succeed(owner, {"ok": True})
+    assert (await queue.get(first.id)).status == SUCCEEDED
+
+@pytest.mark.asyncio
+async def test_concurrent_enqueue_returns_the_pending_job(async_session_factory, monkeypatch):
+    queue = JobQueue(async_session_factory)
+    first = await queue.enqueue("noop", {}, dedupe_key="k")
+
+    # Both enqueues passed the pending-job check before either inserted
+    pending = JobQueue._pending
+    calls = []
+    async def racing_pending(session, dedupe_key):
+        calls.append(dedupe_key)
+        return None if len(calls) == 1 else await pending(session, dedupe_key)
+    monkeypatch.setattr(JobQueue, "_pending", staticmethod(racing_pending))
+
+    assert (await queue.enqueue("noop", {}, dedupe_key="k")).id == first.id
+    assert await queue.counts() == {QUEUED: 1}
+
+@pytest.mark.asyncio
+async def test_refresh_job_resumes_embedding_after_failure(db_session, async_session_factory):
+    feed_id = add_feed(db_session)
+    queue = JobQueue(async_session_factory)
+    fetcher, vectors = FakeFetcher(count=5), FlakyVectorService(failures=1)
+    handler = RefreshFeedJob(async_session_factory, fetcher, vectors, embed_batch_size=2)
+    worker = JobWorker(queue, {REFRESH_FEED: handler})
+
+    job = await enqueue_feed_refresh(queue, feed_id)
+    assert await worker.run_once() is True
+    failed_once = await queue.get(job.id)
+    assert failed_once.status == QUEUED
+    assert failed_once.progress["new_articles"] == 5 and failed_once.progress["embedded"] == 0
+    # The articles were committed with the checkpoint
+    assert db_session.query(Article).count() == 5
+
+    await make_due(async_session_factory, job.id)
+    assert await worker.run_once() is True
+    done = await queue.get(job.id)
+    assert done.status == SUCCEEDED
+    assert done.result == {"feed_id": feed_id, "new_articles": 5, "embedded": 5}
+    # Resumed at embedding: fetched once, every article embedded once, with stable ids
+    assert fetcher.calls == 1
+    stored = sorted(a.id for a in db_session.query(Article).all())
+    assert sorted(doc.id for doc in vectors.documents) == [f"article-{i}-0" for i in stored]
+    assert worker.stats()["succeeded"] == 1 and worker.stats()["retried"] == 1
+
+@pytest.mark.asyncio
+async def test_missing_feed_fails_without_retry(async_session_factory):
+    queue = JobQueue(async_session_factory)
+    worker = JobWorker(queue, {REFRESH_FEED: RefreshFeedJob(async_session_factory, FakeFetcher(), FlakyVectorService())})
+    job = await enqueue_feed_refresh(queue, 999)
+    await worker.run_once()
+    failed = await queue.get(job.id)
+    assert (failed.status, failed.attempts) == (FAILED, 1)
+    assert "not found" in failed.error
+
+def test_refresh_endpoint_returns_job(client, db_session):
+    db_session.add(User(email="jobs@example.com", hashed_password=get_password_hash("pass")))
+    feed_id = add_feed(db_session)
+    auth_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'jobs@example.com'})}"}
+    response = client.post(f"/api/feeds/{feed_id}/refresh", headers=auth_headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert (job["kind"], job["status"]) == (REFRESH_FEED, QUEUED)
+
+    # Refreshing again while it is queued returns the same job
+    assert client.post(f"/api/feeds/{feed_id}/refresh", headers=auth_headers).json()["id"] == job["id"]
+    status = client.get(f"/api/jobs/{job['id']}", headers=auth_headers)
+    assert status.status_code == 200 and status.json()["attempts"] == 0
+    assert client.get("/api/jobs", headers=auth_headers).json() == {QUEUED: 1}
+    assert client.post("/api/feeds/999/refresh", headers=auth_headers).status_code == 404
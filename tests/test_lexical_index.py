@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.db.models import Article, Feed
+from app.services import lexical_index
+from app.services.lexical_index import BM25Index, tokenize
+
+def test_tokenize_drops_stopwords_and_keeps_accents():
+    assert tokenize("What did Lula say in São Paulo?") == ["did", "lula", "say", "são", "paulo"]
+
+def test_search_ranks_named_entity_matches_first():
+    index = BM25Index()
+    index.add(1, "Lula meets Macron in Paris to discuss trade")
+    index.add(2, "Heavy rain floods Porto Alegre")
+    index.add(3, "Trade talks continue in Brussels")
+
+    hits = index.search("Lula trade", k=2)
+
+    assert [doc_id for doc_id, _ in hits] == [1, 3]
+    assert index.search("Tokyo") == []
+
+def test_add_is_idempotent():
+    index = BM25Index()
+    index.add(1, "Lula")
+    index.add(1, "Lula")
+    assert len(index) == 1
+    assert index.search("lula")[0][0] == 1
+
+def test_build_indexes_existing_articles(db_session):
+    feed = Feed(name="brazil", url="http://example.com/rss")
+    db_session.add(feed)
+    db_session.flush()
+    db_session.add(Article(title="Bolsonaro trial", content="Court hearing", url="http://x/1", feed_id=feed.id))
+    db_session.commit()
+
+    index = BM25Index()
+    index.build(db_session)
+
+    assert index.built
+    assert index.search("bolsonaro")[0][0] == 1
+
+@pytest.mark.asyncio
+async def test_newer_index_version_picks_up_articles_from_other_workers(db_session, monkeypatch):
+    monkeypatch.setattr(lexical_index, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+    feed = Feed(name="brazil", url="http://example.com/rss")
+    db_session.add(feed)
+    db_session.flush()
+    db_session.add(Article(title="Bolsonaro trial", content="Court hearing", url="http://x/1", feed_id=feed.id))
+    db_session.commit()
+
+    index = BM25Index()
+    assert [doc_id for doc_id, _ in await index.asearch("bolsonaro", version=1)] == [1]
+
+    # Committed and embedded by another process, which bumped the version
+    db_session.add(Article(title="Lula visits Paris", content="State visit", url="http://x/2", feed_id=feed.id))
+    db_session.commit()
+    assert await index.asearch("lula", version=1) == []
+    assert [doc_id for doc_id, _ in await index.asearch("lula", version=2)] == [2]
+    assert len(index) == 2 and index.version == 2
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+import pytest
+from app.db import onnx_embeddings
+from app.db.onnx_embeddings import (
+    EMBEDDING_CONFIG_FILE,
+    NORMALIZE_MODULE,
+    POOLING_MODULE,
+    QUANTIZED_MODEL_FILE,
+    TRANSFORMER_MODULE,
+    OnnxEmbeddings,
+    export_onnx_model,
+    pool,
+    read_sentence_transformers_config,
+)
+
+def write_model_config(path, modules, pooling, max_seq_length=256):
+    # The files sentence-transformers models ship next to the weights
+    (path / "modules.json").write_text(json.dumps([
+        {"idx": i, "name": str(i), "path": module_path, "type": module_type}
+        for i, (module_path, module_type) in enumerate(modules)
+    ]))
+    (path / "sentence_bert_config.json").write_text(json.dumps({"max_seq_length": max_seq_length, "do_lower_case": False}))
+    (path / "1_Pooling").mkdir()
+    (path / "1_Pooling" / "config.json").write_text(json.dumps({
+        "word_embedding_dimension": 4,
+        **{key: key == pooling for key in (
+            "pooling_mode_cls_token", "pooling_mode_mean_tokens", "pooling_mode_max_tokens",
+            "pooling_mode_mean_sqrt_len_tokens", "pooling_mode_weightedmean_tokens", "pooling_mode_lasttoken",
+        )},
+    }))
+
+def fake_export(target_dir, config=None):
+    open(os.path.join(target_dir, QUANTIZED_MODEL_FILE), "wb").write(b"model")
+    with open(os.path.join(target_dir, EMBEDDING_CONFIG_FILE), "w") as f:
+        json.dump(config or {"pooling": "mean", "max_length": 256, "do_lower_case": False, "normalize": True}, f)
+
+def test_failed_export_leaves_nothing_behind(tmp_path, monkeypatch):
+    def crash(model_id, target_dir):
+        open(os.path.join(target_dir, QUANTIZED_MODEL_FILE), "wb").write(b"half a model")
+        raise RuntimeError("killed")
+    monkeypatch.setattr(onnx_embeddings, "_export", crash)
+
+    with pytest.raises(RuntimeError):
+        export_onnx_model("all-MiniLM-L6-v2", str(tmp_path))
+
+    assert [name for name in os.listdir(tmp_path) if not name.endswith(".lock")] == []
+
+def test_concurrent_exports_run_once(tmp_path, monkeypatch):
+    calls = []
+
+    def export(model_id, target_dir):
+        calls.append(model_id)
+        time.sleep(0.05)
+        fake_export(target_dir)
+    monkeypatch.setattr(onnx_embeddings, "_export", export)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(export_onnx_model("all-MiniLM-L6-v2", str(tmp_path))))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["sentence-transformers/all-MiniLM-L6-v2"]
+    model_dir = tmp_path / "sentence-transformers__all-MiniLM-L6-v2"
+    assert set(results) == {str(model_dir)}
+    assert (model_dir / QUANTIZED_MODEL_FILE).read_bytes() == b"model"
+
+def test_export_without_embedding_config_is_redone(tmp_path, monkeypatch):
+    model_dir = tmp_path / "sentence-transformers__all-MiniLM-L6-v2"
+    model_dir.mkdir()
+    (model_dir / QUANTIZED_MODEL_FILE).write_bytes(b"old export, pooling unknown")
+    monkeypatch.setattr(onnx_embeddings, "_export", lambda model_id, target_dir: fake_export(target_dir))
+
+    export_onnx_model("all-MiniLM-L6-v2", str(tmp_path))
+
+    assert (model_dir / QUANTIZED_MODEL_FILE).read_bytes() == b"model"
+    assert (model_dir / EMBEDDING_CONFIG_FILE).exists()
+
+def test_reads_minilm_style_config(tmp_path):
+    write_model_config(
+        tmp_path,
+        [("", TRANSFORMER_MODULE), ("1_Pooling", POOLING_MODULE), ("2_Normalize", NORMALIZE_MODULE)],
+        "pooling_mode_mean_tokens",
+    )
+    assert read_sentence_transformers_config(str(tmp_path)) == {
+        "pooling": "mean", "max_length": 256, "do_lower_case": False, "normalize": True,
+    }
+
+def test_reads_cls_pooling_without_normalization(tmp_path):
+    write_model_config(tmp_path, [("", TRANSFORMER_MODULE), ("1_Pooling", POOLING_MODULE)], "pooling_mode_cls_token", 512)
+    config = read_sentence_transformers_config(str(tmp_path))
+    assert (config["pooling"], config["max_length"], config["normalize"]) == ("cls", 512, False)
+
+@pytest.mark.parametrize("modules, pooling", [
+    ([("", TRANSFORMER_MODULE), ("1_Pooling", POOLING_MODULE), ("2_Dense", "sentence_transformers.models.Dense")],
+     "pooling_mode_mean_tokens"),
+    ([("", TRANSFORMER_MODULE), ("1_Pooling", POOLING_MODULE)], "pooling_mode_lasttoken"),
+], ids=["dense_module", "lasttoken_pooling"])
+def test_unsupported_models_are_rejected(tmp_path, modules, pooling):
+    write_model_config(tmp_path, modules, pooling)
+    with pytest.raises(ValueError):
+        read_sentence_transformers_config(str(tmp_path))
+
+def test_plain_transformers_model_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="modules.json"):
+        read_sentence_transformers_config(str(tmp_path))
+
+@pytest.mark.parametrize("mode", ["mean", "cls", "max"])
+def test_pooling_ignores_padding(mode):
+    rng = np.random.default_rng(0)
+    lengths = [3, 5]
+    hidden = rng.normal(size=(2, 5, 4)).astype(np.float32)
+    hidden[0, 3:] = 1000.0  # Padding states must not leak into the vector
+    mask = np.asarray([[1] * n + [0] * (5 - n) for n in lengths])
+
+    reference = {
+        "mean": lambda h: h.mean(axis=0),
+        "cls": lambda h: h[0],
+        "max": lambda h: h.max(axis=0),
+    }[mode]
+    expected = np.stack([reference(hidden[i, :n]) for i, n in enumerate(lengths)])
+    assert np.allclose(pool(hidden, mask, mode), expected, atol=1e-6)
+
+class FakeTokenizer:
+    model_max_length = 512
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        self.calls.append((list(texts), max_length))
+        return {"input_ids": np.ones((len(texts), 2), dtype=np.int64), "attention_mask": np.ones((len(texts), 2), dtype=np.int64)}
+
+class FakeSession:
+    def get_inputs(self):
+        return [type("Input", (), {"name": name}) for name in ("input_ids", "attention_mask")]
+
+    def run(self, outputs, feed):
+        return [np.full((feed["input_ids"].shape[0], 2, 2), [3.0, 4.0], dtype=np.float32)]
+
+@pytest.mark.parametrize("normalize, expected", [(True, [0.6, 0.8]), (False, [3.0, 4.0])])
+def test_embeddings_follow_the_recorded_config(tmp_path, monkeypatch, normalize, expected):
+    fake_export(str(tmp_path), {"pooling": "mean", "max_length": None, "do_lower_case": True, "normalize": normalize})
+    tokenizer = FakeTokenizer()
+    monkeypatch.setattr("transformers.AutoTokenizer.from_pretrained", lambda model_dir: tokenizer)
+    monkeypatch.setattr(onnx_embeddings.ort, "InferenceSession", lambda *args, **kwargs: FakeSession())
+
+    embeddings = OnnxEmbeddings(str(tmp_path))
+
+    assert np.allclose(embeddings.embed_query("Lula in PARIS"), expected)
+    # Lower-cased like the model's tokenizer pipeline; no max_seq_length: the tokenizer's limit
+    assert tokenizer.calls == [(["lula in paris"], 512)]
@@ -0,0 +1,54 @@
+import time
+from fastapi.testclient import TestClient
+from app.core.security import create_access_token, get_password_hash
+from app.db.models import User
+from app.services.principal_cache import PrincipalCache, UserPrincipal, get_principal_cache
+
+def test_entries_expire_with_ttl_and_token():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+    principal = UserPrincipal(id=1, email="a@example.com")
+
+    cache.put("token", principal, token_expires_at=time.time() + 60)
+    assert cache.get("token") == principal
+    # A token that is already expired is never cached
+    cache.put("expired", principal, token_expires_at=time.time() - 1)
+    assert cache.get("expired") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_lru_eviction_and_user_invalidation():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    alice, bob = UserPrincipal(id=1, email="alice@x"), UserPrincipal(id=2, email="bob@x")
+    cache.put("a1", alice)
+    cache.put("b1", bob)
+    cache.get("a1")
+    cache.put("a2", alice)  # Evicts b1, the least recently used
+
+    assert cache.get("b1") is None
+    assert cache.stats()["evictions"] == 1
+
+    cache.invalidate_user(alice.id)
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.stats()["entries"] == 0
+
+def test_repeat_requests_skip_the_db_until_password_change(client: TestClient, db_session):
+    user = User(email="cached@example.com", hashed_password=get_password_hash("pass"))
+    db_session.add(user)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'cached@example.com'})}"}
+    cache = get_principal_cache()
+    before = cache.stats()
+
+    for _ in range(3):
+        assert client.get("/api/chat/history", headers=headers).status_code == 200
+    assert cache.stats()["misses"] - before["misses"] == 1
+    assert cache.stats()["hits"] - before["hits"] == 2
+
+    # The ORM hook drops the user's tokens, the next request goes back to the DB
+    user.hashed_password = get_password_hash("new-pass")
+    db_session.commit()
+    assert cache.stats()["entries"] == 0
+
+    db_session.delete(user)
+    db_session.commit()
+    assert client.get("/api/chat/history", headers=headers).status_code == 401
@@ -0,0 +1,37 @@
+import asyncio
+import pytest
+from app.services.query_embedder import MicroBatchEmbedder
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_batch():
+    embeddings = FakeEmbeddings()
+    embedder = MicroBatchEmbedder(embeddings, max_batch_size=32, max_wait_ms=20)
+
+    vectors = await asyncio.gather(
+        embedder.aembed_query("a"), embedder.aembed_query("bb"), embedder.aembed_query("a")
+    )
+
+    assert vectors == [[1.0], [2.0], [1.0]]
+    assert embeddings.calls == [["a", "bb"]]
+    stats = embedder.stats()
+    assert stats["batches"] == 1
+    assert stats["max_batch_size"] == 3
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting():
+    embeddings = FakeEmbeddings()
+    embedder = MicroBatchEmbedder(embeddings, max_batch_size=2, max_wait_ms=10_000)
+
+    vectors = await asyncio.wait_for(
+        asyncio.gather(embedder.aembed_query("a"), embedder.aembed_query("bb")), timeout=1
+    )
+
+    assert vectors == [[1.0], [2.0]]
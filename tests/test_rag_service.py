@@ -1,71 +1,130 @@
 import pytest
-from unittest.mock import MagicMock, patch, AsyncMock
-from app.services.rag_service import RAGService
+import numpy as np
+from unittest.mock import MagicMock, AsyncMock
+from app.services.region_router import RegionRouter
+
+FEEDS = [
+    {"name": "brazil_news", "region": "brazil", "url": "http://example.com/brazil"},
+    {"name": "europe_news", "region": "europe", "url": "http://example.com/europe"},
+]
+
+def make_router(centroids, margin_threshold=0.05):
+    # One mocked VectorService per collection, each returning a fixed centroid
+    def factory(collection_name):
+        vector_service = MagicMock()
+        centroid = centroids.get(collection_name)
+        vector_service.get_centroid.return_value = (
+            np.asarray(centroid, dtype=np.float32) if centroid is not None else None
+        )
+        return vector_service
+
+    router = RegionRouter(
+        llm=MagicMock(),
+        router_prompt_template="router {question}",
+        feeds=FEEDS,
+        margin_threshold=margin_threshold,
+        vector_service_factory=factory,
+    )
+    router.routing_chain = MagicMock()
+    router.routing_chain.ainvoke = AsyncMock(return_value="europe")
+    return router
+
+@pytest.mark.asyncio
+async def test_route_brazil_by_centroid():
+    router = make_router({"brazil_news": [1.0, 0.0], "europe_news": [0.0, 1.0]})
+
+    decision = await router.route("News about Rio?", [0.9, 0.1])
+
+    assert decision.collections == ["brazil_news"]
+    assert decision.method == "centroid"
+    assert decision.margin > 0.05
+    # The LLM is not called when the centroid margin is clear
+    router.routing_chain.ainvoke.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_route_europe_by_centroid():
+    router = make_router({"brazil_news": [1.0, 0.0], "europe_news": [0.0, 1.0]})
+
+    decision = await router.route("News about Paris?", [0.1, 0.9])
+
+    assert decision.collections == ["europe_news"]
+
+@pytest.mark.asyncio
+async def test_low_margin_falls_back_to_llm():
+    router = make_router({"brazil_news": [1.0, 0.0], "europe_news": [0.0, 1.0]})
+
+    decision = await router.route("Trade deal news?", [0.7, 0.7])
+
+    assert decision.collections == ["europe_news"]
+    assert decision.method == "llm"
+    router.routing_chain.ainvoke.assert_awaited_once_with({"question": "Trade deal news?"})
 
 @pytest.mark.asyncio
-async def test_decide_retriever_brazil():
-    # Mock the dependencies
-    with patch("app.services.rag_service.ChatGroq") as MockGroq, \
-         patch("app.services.rag_service.get_retriever") as mock_get_retriever, \
-         patch("app.services.rag_service.settings") as mock_settings:
-        
-        # Setup mocks
-        mock_llm = MagicMock()
-        MockGroq.return_value = mock_llm
-        
-        mock_settings.get_prompts.return_value = {
-            "router_prompt_template": "router",
-            "final_prompt_template": "final"
-        }
-        
-        # Create service instance
-        service = RAGService()
-        
-        # Mock the routing chain result
-        service.routing_chain = MagicMock()
-        service.routing_chain.ainvoke = AsyncMock(return_value="brazil")
-        
-        # Test
-        retriever = await service.decide_retriever({"question": "News about Rio?"})
-        
-        # Assert
-        assert retriever == service.brazil_retriever
+async def test_unknown_llm_label_searches_all_candidates():
+    router = make_router({"brazil_news": [1.0, 0.0], "europe_news": [0.0, 1.0]})
+    router.routing_chain.ainvoke = AsyncMock(return_value="unknown")
+
+    decision = await router.route("Random question", [0.7, 0.7])
+
+    assert sorted(decision.collections) == ["brazil_news", "europe_news"]
+    assert decision.method == "ambiguous"
+
+@pytest.mark.asyncio
+async def test_empty_collections_use_default():
+    router = make_router({})
+
+    decision = await router.route("Anything", [1.0, 0.0])
+
+    assert decision.collections == []
+    assert decision.method == "default"
+    assert router.stats()["methods"] == {"default": 1}
+    assert router.stats()["recent_decisions"] == [
+        {"collections": [], "method": "default", "margin": 0.0, "scores": {}}
+    ]
 
 @pytest.mark.asyncio
-async def test_decide_retriever_europe():
-    with patch("app.services.rag_service.ChatGroq") as MockGroq, \
-         patch("app.services.rag_service.get_retriever") as mock_get_retriever, \
-         patch("app.services.rag_service.settings") as mock_settings:
-        
-        mock_settings.get_prompts.return_value = {
-            "router_prompt_template": "router",
-            "final_prompt_template": "final"
-        }
-
-        service = RAGService()
-        service.routing_chain = MagicMock()
-        service.routing_chain.ainvoke = AsyncMock(return_value="europe")
-        
-        retriever = await service.decide_retriever({"question": "News about Paris?"})
-        
-        assert retriever == service.europe_retriever
+async def test_empty_centroids_are_not_cached():
+    router = make_router({})
+    await router.get_centroids()  # Warmup before the first ingest
+
+    # ingest_data.py filled the collections in the meantime
+    router.vector_services["brazil_news"].get_centroid.return_value = np.asarray([1.0, 0.0], dtype=np.float32)
+    router.vector_services["europe_news"].get_centroid.return_value = np.asarray([0.0, 1.0], dtype=np.float32)
+
+    decision = await router.route("News about Rio?", [0.9, 0.1])
+    assert decision.collections == ["brazil_news"]
 
 @pytest.mark.asyncio
-async def test_decide_retriever_default():
-    with patch("app.services.rag_service.ChatGroq") as MockGroq, \
-         patch("app.services.rag_service.get_retriever") as mock_get_retriever, \
-         patch("app.services.rag_service.settings") as mock_settings:
-        
-        mock_settings.get_prompts.return_value = {
-            "router_prompt_template": "router",
-            "final_prompt_template": "final"
-        }
-
-        service = RAGService()
-        service.routing_chain = MagicMock()
-        service.routing_chain.ainvoke = AsyncMock(return_value="unknown")
-        
-        # Should default to Brazil
-        retriever = await service.decide_retriever({"question": "Random question"})
-        
-        assert retriever == service.brazil_retriever
+async def test_centroids_are_recomputed_after_the_ttl(monkeypatch):
+    router = make_router({"brazil_news": [1.0, 0.0], "europe_news": [0.0, 1.0]})
+    router.centroid_ttl_seconds = 60
+    monkeypatch.setattr("app.services.region_router.time.monotonic", lambda: 1000.0)
+    await router.get_centroids()
+
+    router.vector_services["brazil_news"].get_centroid.return_value = np.asarray([0.0, 1.0], dtype=np.float32)
+    router.vector_services["europe_news"].get_centroid.return_value = np.asarray([1.0, 0.0], dtype=np.float32)
+    assert (await router.route("News about Rio?", [0.9, 0.1])).collections == ["brazil_news"]
+
+    monkeypatch.setattr("app.services.region_router.time.monotonic", lambda: 1060.0)
+    assert (await router.route("News about Rio?", [0.9, 0.1])).collections == ["europe_news"]
+
+def test_flight_key_separates_conversations():
+    from app.services.rag_service import RAGService
+    from app.services.vector_service import RetrievalOptions
+
+    plain = RAGService._flight_key("What did he say?", RetrievalOptions())
+    first = RAGService._flight_key("What did he say?", RetrievalOptions(), "Talked about Lula.")
+    second = RAGService._flight_key("what did he say", RetrievalOptions(), "Talked about Macron.")
+
+    assert plain == "what did he say"
+    assert len({plain, first, second}) == 3
+    assert first == RAGService._flight_key("what did he say", RetrievalOptions(), "Talked about Lula.")
+
+def test_answer_cache_only_holds_default_retrieval(monkeypatch):
+    from app.services.rag_service import RAGService, settings
+    from app.services.vector_service import RetrievalOptions
+
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+    assert RAGService._cacheable(RetrievalOptions())
+    assert not RAGService._cacheable(RetrievalOptions(max_collections=1))
+    assert not RAGService._cacheable(RetrievalOptions(timeout_ms=50))
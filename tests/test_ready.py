@@ -0,0 +1,30 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+from fastapi.testclient import TestClient
+from app.services import warmup
+
+def test_ready_when_warmup_disabled(client: TestClient):
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+def test_not_ready_until_warmup_finishes(client: TestClient):
+    with patch.object(warmup.readiness, "ready", False):
+        response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+@pytest.mark.asyncio
+async def test_warm_up_retries_then_marks_ready():
+    service = MagicMock()
+    service.warm_up = AsyncMock(side_effect=[RuntimeError("chroma locked"), None])
+    state = warmup.Readiness()
+
+    with patch("app.services.warmup.get_rag_service", return_value=service), \
+         patch("app.services.warmup.readiness", state), \
+         patch("app.services.warmup.asyncio.sleep", new=AsyncMock()):
+        await warmup.warm_up()
+
+    assert state.ready
+    assert state.error is None
+    assert service.warm_up.await_count == 2
@@ -0,0 +1,52 @@
+import time
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from app.services.reranker import CrossEncoderReranker
+from app.services.vector_service import RetrievedChunk
+
+def make_chunk(chunk_id, text):
+    return RetrievedChunk(
+        id=chunk_id,
+        document=Document(page_content=text, metadata={}),
+        embedding=np.ones(2, dtype=np.float32),
+        score=0.5,
+    )
+
+class FakeModel:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.calls.append(len(pairs))
+        time.sleep(self.delay)
+        return [float(len(text)) for _, text in pairs]
+
+def make_reranker(model, budget_ms=1000):
+    reranker = CrossEncoderReranker(model_name="fake", top_n=2, budget_ms=budget_ms, cache_size=100)
+    reranker._model = model
+    return reranker
+
+@pytest.mark.asyncio
+async def test_rerank_keeps_top_n_in_one_batch_and_caches_scores():
+    model = FakeModel()
+    reranker = make_reranker(model)
+    chunks = [make_chunk("a", "x"), make_chunk("b", "xxx"), make_chunk("c", "xx")]
+
+    ranked = await reranker.rerank("Lula", chunks)
+    await reranker.rerank("lula", chunks)
+
+    assert [chunk.id for chunk in ranked] == ["b", "c"]
+    assert model.calls == [3]
+    assert reranker.stats()["cache_hits"] == 3
+
+@pytest.mark.asyncio
+async def test_rerank_is_skipped_when_budget_is_exhausted():
+    reranker = make_reranker(FakeModel(delay=0.2), budget_ms=20)
+    chunks = [make_chunk("a", "x"), make_chunk("b", "xxx")]
+
+    ranked = await reranker.rerank("Lula", chunks)
+
+    assert ranked == chunks
+    assert reranker.stats()["skipped"] == 1
@@ -0,0 +1,98 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.db.models import Feed
+from app.services.job_queue import JobQueue, JobWorker
+from app.services.jobs import REFRESH_FEED, RefreshFeedJob, enqueue_feed_refresh
+from app.services.rss_fetcher import RSSFetcher
+
+RSS = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Stub</title>
+<item><title>Lula visits Paris</title><link>http://stub/1</link><description>Trade talks</description></item>
+<item><title>Floods in Porto Alegre</title><link>http://stub/2</link><description>Rain</description></item>
+</channel></rss>"""
+
+class StubFeedHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        StubFeedHandler.requests.append(dict(self.headers))
+        if self.path == "/broken":
+            self.send_response(500)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Last-Modified", "Tue, 01 Oct 2024 10:00:00 GMT")
+        self.end_headers()
+        self.wfile.write(RSS)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    StubFeedHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubFeedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.mark.asyncio
+async def test_conditional_get_skips_unchanged_feed(stub_server):
+    fetcher = RSSFetcher(timeout_seconds=5)
+
+    first = await fetcher.fetch(f"{stub_server}/rss")
+    assert [e.title for e in first.entries] == ["Lula visits Paris", "Floods in Porto Alegre"]
+    assert first.etag == '"v1"'
+
+    second = await fetcher.fetch(f"{stub_server}/rss", first.etag, first.last_modified)
+    assert second.not_modified and second.entries == []
+    assert StubFeedHandler.requests[1]["If-None-Match"] == '"v1"'
+    assert StubFeedHandler.requests[1]["If-Modified-Since"] == "Tue, 01 Oct 2024 10:00:00 GMT"
+
+    broken = await fetcher.fetch(f"{stub_server}/broken")
+    ok = await fetcher.fetch(f"{stub_server}/rss")
+    assert broken.error and not ok.error
+    assert fetcher.stats() == {"fetched": 2, "not_modified": 1, "errors": 1}
+    await fetcher.aclose()
+
+class RecordingVectorService:
+    def __init__(self):
+        self.documents = []
+
+    def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+    def add_documents(self, documents, embeddings=None):
+        self.documents.extend(documents)
+
+@pytest.mark.asyncio
+async def test_refresh_job_stores_validators_and_skips_304(stub_server, db_session, async_session_factory):
+    feed = Feed(name="stub", url=f"{stub_server}/rss", category="News")
+    db_session.add(feed)
+    db_session.commit()
+    fetcher = RSSFetcher(timeout_seconds=5)
+    vectors = RecordingVectorService()
+    queue = JobQueue(async_session_factory)
+    worker = JobWorker(queue, {REFRESH_FEED: RefreshFeedJob(async_session_factory, fetcher, vectors)})
+
+    counts = []
+    for _ in range(2):
+        job = await enqueue_feed_refresh(queue, feed.id)
+        await worker.run_once()
+        counts.append((await queue.get(job.id)).result["new_articles"])
+
+    assert counts == [2, 0]
+    assert len(vectors.documents) == 2
+    assert fetcher.stats()["not_modified"] == 1
+    db_session.expire_all()
+    feed = db_session.query(Feed).one()
+    assert feed.etag == '"v1"' and feed.last_fetched is not None
+    await fetcher.aclose()
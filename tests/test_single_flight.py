@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from app.services.single_flight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def answer():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"answer": "shared"}
+
+    results = await asyncio.gather(*(flight.do("q", answer) for _ in range(5)))
+
+    assert calls == 1
+    assert all(r == {"answer": "shared"} for r in results)
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("groq down")
+
+    results = await asyncio.gather(flight.do("q", fail), flight.do("q", fail), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_stream_fans_out_to_late_subscribers():
+    flight = SingleFlight()
+    calls = 0
+
+    async def tokens():
+        nonlocal calls
+        calls += 1
+        for token in ["Lula ", "visits ", "Paris"]:
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def collect(delay):
+        await asyncio.sleep(delay)
+        return [token async for token in flight.stream("q", tokens)]
+
+    first, late = await asyncio.gather(collect(0), collect(0.015))
+
+    assert calls == 1
+    assert first == late == ["Lula ", "visits ", "Paris"]
+
+@pytest.mark.asyncio
+async def test_upstream_is_cancelled_when_last_subscriber_leaves():
+    flight = SingleFlight()
+    closed = asyncio.Event()
+
+    async def tokens():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield "token"
+        finally:
+            closed.set()
+
+    stream = flight.stream("q", tokens)
+    assert await stream.__anext__() == "token"
+    await stream.aclose()
+
+    await asyncio.wait_for(closed.wait(), timeout=1)
+    assert flight.stats()["in_flight"] == 0
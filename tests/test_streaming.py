@@ -0,0 +1,16 @@
+from unittest.mock import patch
+from app.api.streaming import TokenCoalescer, format_sse
+
+def test_format_sse_frame():
+    assert format_sse("token", {"text": "Olá"}) == 'event: token\ndata: {"text": "Olá"}\n\n'
+
+def test_coalescer_releases_by_size_and_time():
+    with patch("app.api.streaming.time.monotonic", return_value=100.0):
+        coalescer = TokenCoalescer(max_chars=10, max_ms=50)
+        assert coalescer.add("first") == "first"  # Nothing sent yet: release at once
+        assert coalescer.add("ab") is None
+        assert coalescer.add("cdefghij") == "abcdefghij"  # Size threshold
+        assert coalescer.add("k") is None
+    with patch("app.api.streaming.time.monotonic", return_value=100.06):
+        assert coalescer.add("l") == "kl"  # Time threshold
+    assert coalescer.flush() == ""
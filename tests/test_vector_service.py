@@ -0,0 +1,84 @@
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+from langchain_core.documents import Document
+from app.services.vector_service import RetrievedChunk, VectorService, asearch_collections, reciprocal_rank_fusion
+
+def make_chunk(chunk_id, score=0.5):
+    return RetrievedChunk(
+        id=chunk_id,
+        document=Document(page_content=chunk_id, metadata={}),
+        embedding=np.ones(2, dtype=np.float32),
+        score=score,
+    )
+
+def make_collection(name, chunks, delay=0.0):
+    vector_service = MagicMock()
+    vector_service.collection_name = name
+
+    async def search(embedding, k):
+        await asyncio.sleep(delay)
+        return chunks
+
+    vector_service.asearch_by_vector = search
+    return vector_service
+
+def test_rrf_rewards_chunks_ranked_in_several_lists():
+    a, b, c = make_chunk("a"), make_chunk("b"), make_chunk("c")
+
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], rrf_k=60)
+
+    assert [chunk.id for chunk in fused] == ["b", "a", "c"]
+
+@pytest.mark.asyncio
+async def test_slow_collection_is_dropped_at_deadline():
+    fast = make_collection("brazil_news", [make_chunk("a")])
+    slow = make_collection("europe_news", [make_chunk("b")], delay=1.0)
+
+    rankings = await asearch_collections([fast, slow], [1.0, 0.0], k=4, timeout_ms=50)
+
+    assert [[chunk.id for chunk in ranking] for ranking in rankings] == [["a"], []]
+
+class FakeCollection:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.reads = []
+
+    def count(self):
+        return len(self.embeddings)
+
+    def get(self, include, limit, offset):
+        self.reads.append((offset, limit))
+        return {"embeddings": self.embeddings[offset:offset + limit]}
+
+def make_vector_service(embeddings) -> VectorService:
+    # Skips __init__: no Chroma client or embedding model
+    vector_service = VectorService.__new__(VectorService)
+    vector_service.vector_db = MagicMock(_collection=FakeCollection(embeddings))
+    return vector_service
+
+def test_centroid_is_summed_page_by_page():
+    embeddings = np.random.default_rng(0).normal(size=(25, 4)).astype(np.float32)
+    vector_service = make_vector_service(embeddings)
+
+    centroid = vector_service.get_centroid(page_size=10)
+
+    expected = embeddings.mean(axis=0)
+    assert np.allclose(centroid, expected / np.linalg.norm(expected), atol=1e-6)
+    assert vector_service.vector_db._collection.reads == [(0, 8), (8, 8), (16, 9)]
+
+def test_large_collection_centroid_is_sampled():
+    embeddings = np.tile(np.asarray([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32), (500, 1))
+    vector_service = make_vector_service(embeddings)
+
+    centroid = vector_service.get_centroid(sample_size=100, page_size=10)
+
+    reads = vector_service.vector_db._collection.reads
+    assert sum(limit for _, limit in reads) == 100
+    # Spread over the whole collection, not its first 100 chunks
+    assert reads[-1][0] == 900
+    assert np.allclose(centroid, [np.sqrt(0.5), np.sqrt(0.5)])
+
+def test_empty_collection_has_no_centroid():
+    assert make_vector_service([]).get_centroid() is None